@@ -1,5 +1,4 @@
 import os
-import requests
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
@@ -7,6 +6,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import TripSerializer
+from .ors import get_client
 
 load_dotenv()
 
@@ -33,13 +33,7 @@ def geocode_address(address):
     Geocodes an address using the ORS geocoding API.
     Returns coordinates in [lng, lat] format.
     """
-    geocode_url = "https://api.openrouteservice.org/geocode/search"
-    params = {
-        "api_key": ORS_API_KEY,
-        "text": address,
-        "size": 1
-    }
-    response = requests.get(geocode_url, params=params)
+    response = get_client().geocode(address)
     if response.status_code == 200:
         data = response.json()
         if data.get("features"):
@@ -51,15 +45,7 @@ def get_directions(route_coords):
     Retrieves a driving route from the ORS directions API.
     Returns the full directions data, including summary information.
     """
-    directions_url = "https://api.openrouteservice.org/v2/directions/driving-car"
-    headers = {
-        "Authorization": ORS_API_KEY,
-        "Content-Type": "application/json"
-    }
-    body = {
-        "coordinates": route_coords
-    }
-    dir_resp = requests.post(directions_url, json=body, headers=headers)
+    dir_resp = get_client().directions(route_coords)
     if dir_resp.status_code != 200:
         raise Exception("Directions API error: " + dir_resp.text)
     return dir_resp.json()
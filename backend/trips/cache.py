@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.utils import timezone
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with an optional time-to-live.
+
+    Entries beyond max_entries are evicted least-recently-used first;
+    entries older than ttl seconds are treated as misses and dropped.
+    Hit, miss and eviction counters are kept for monitoring.
+    """
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, stored_at = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def prune_table(model, ttl=None, max_entries=None):
+    """
+    Drops rows of a cache table (a model with created_at/last_used_at)
+    that are older than ttl seconds, then trims it to max_entries by
+    deleting the least recently used rows.
+    """
+    if ttl is not None:
+        model.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=ttl)).delete()
+    if max_entries is not None:
+        excess = model.objects.count() - max_entries
+        if excess > 0:
+            stale_ids = list(model.objects.order_by("last_used_at").values_list("id", flat=True)[:excess])
+            model.objects.filter(id__in=stale_ids).delete()
@@ -0,0 +1,93 @@
+"""
+Single-flight coalescing of identical in-flight lookups.
+
+When several callers ask for the same key at the same time, only the first
+(the leader) runs the lookup; the others wait for its result (or error)
+instead of sending a duplicate request. Threads use do() and coroutines
+ado(); both share one registry of concurrent.futures.Future objects, so a
+coroutine can wait on a lookup a thread started and vice versa. Nothing is
+cached: once the leader finishes, the next caller starts a new flight.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class _LeaderCancelled(Exception):
+    """Set on a flight whose async leader was cancelled; its waiters start over."""
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Returns (future, is_leader) for key, registering a new flight when none is in progress."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._flights[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def _land(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def do(self, key, func, *args):
+        """Returns func(*args), sharing the call with any concurrent do()/ado() for the same key."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = func(*args)
+            except BaseException as exc:
+                self._land(key, future)
+                future.set_exception(exc)
+                raise
+            self._land(key, future)
+            future.set_result(result)
+            return result
+
+    async def ado(self, key, func, *args):
+        """Async counterpart of do(): returns await func(*args)."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    # shield: a cancelled waiter must not cancel the shared flight.
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except _LeaderCancelled:
+                    continue
+            try:
+                result = await func(*args)
+            except asyncio.CancelledError:
+                self._land(key, future)
+                future.set_exception(_LeaderCancelled(key))
+                raise
+            except BaseException as exc:
+                self._land(key, future)
+                future.set_exception(exc)
+                raise
+            self._land(key, future)
+            future.set_result(result)
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,138 @@
+"""
+ELD grid ("log form") construction.
+
+A day is 96 fifteen-minute slots. Internally each day is a bytearray of 96
+status codes (see ELD_STATUSES) and can be rendered either as the expanded
+form the frontend draws (96 status strings per day) or as a compact form of
+run-length segments.
+"""
+import re
+
+from .hos import _CLOCK
+
+SLOTS_PER_DAY = 96
+MINUTES_PER_SLOT = 15
+
+# Duty statuses in code order; a day's timeline stores the index into this tuple.
+ELD_STATUSES = ("Off Duty", "Sleeper Berth", "Driving", "On Duty", "Cycle Limit Reached")
+STATUS_CODES = {name: code for code, name in enumerate(ELD_STATUSES)}
+OFF_DUTY = STATUS_CODES["Off Duty"]
+
+# Event times are "HH:MM" labels produced by trips.hos; look their slot up
+# instead of parsing them.
+_SLOT_BY_LABEL = {label: minute // MINUTES_PER_SLOT for minute, label in enumerate(_CLOCK)}
+# A full day of each code, sliced to fill a range of slots.
+_FILL = [bytes((code,)) * SLOTS_PER_DAY for code in range(len(ELD_STATUSES))]
+_RUN = re.compile(rb"(.)\1*", re.DOTALL)
+
+
+def time_to_slot(t_str):
+    slot_index = _SLOT_BY_LABEL.get(t_str)
+    if slot_index is None:
+        hh, mm = map(int, t_str.split(":"))
+        slot_index = (hh * 60 + mm) // MINUTES_PER_SLOT
+    return max(0, min(slot_index, SLOTS_PER_DAY - 1))
+
+
+def status_code(status):
+    code = STATUS_CODES.get(status)
+    if code is None:
+        raise Exception(f"Unknown duty status: {status}")
+    return code
+
+
+def day_timeline(events):
+    """
+    Returns the day's 96 slot codes as a bytearray. Later events overwrite
+    earlier ones and an event shorter than a slot still fills its start slot.
+    """
+    timeline = bytearray(SLOTS_PER_DAY)  # all OFF_DUTY
+    for event in events:
+        try:
+            start_slot = _SLOT_BY_LABEL[event["start"]]
+            end_slot = _SLOT_BY_LABEL[event["end"]]
+            code = STATUS_CODES[event["status"]]
+        except KeyError:
+            start_slot = time_to_slot(event["start"])
+            end_slot = time_to_slot(event["end"])
+            code = status_code(event["status"])
+        if end_slot <= start_slot:
+            end_slot = start_slot + 1
+        timeline[start_slot:end_slot] = _FILL[code][:end_slot - start_slot]
+    return timeline
+
+
+def timeline_runs(timeline):
+    """Run-length encodes slot codes as [code, start_slot, end_slot] segments (end exclusive)."""
+    return [[timeline[match.start()], match.start(), match.end()] for match in _RUN.finditer(timeline)]
+
+
+def runs_to_timeline(runs):
+    timeline = bytearray(SLOTS_PER_DAY)
+    for code, start_slot, end_slot in runs:
+        timeline[start_slot:end_slot] = _FILL[code][:end_slot - start_slot]
+    return timeline
+
+
+def expand_timeline(timeline):
+    """Slot codes -> the 96 status strings of the expanded form."""
+    return [ELD_STATUSES[code] for code in timeline]
+
+
+def _form_day(day_index, timeline, compact):
+    if compact:
+        return {"dayIndex": day_index, "runs": timeline_runs(timeline)}
+    return {"dayIndex": day_index, "timeline": expand_timeline(timeline)}
+
+
+def build_eld_log_form(daily_logs, compact=False):
+    """
+    Builds the ELD grid for each day of daily_logs.
+
+    Expanded (default): [{"dayIndex": 0, "timeline": ["Off Duty", ...96]}]
+    Compact: [{"dayIndex": 0, "runs": [[code, start_slot, end_slot], ...]}]
+    where code indexes ELD_STATUSES.
+    """
+    return [_form_day(day_log["dayIndex"], day_timeline(day_log["events"]), compact) for day_log in daily_logs]
+
+
+_DAY_RECORD = 2 + SLOTS_PER_DAY
+
+
+def pack_eld(daily_logs):
+    """
+    Stored ELD encoding (TripDetail.eld): per day, the dayIndex as 2 bytes
+    big-endian followed by the 96 slot codes.
+    """
+    packed = bytearray()
+    for day_log in daily_logs or []:
+        packed += day_log["dayIndex"].to_bytes(2, "big")
+        packed += day_timeline(day_log["events"])
+    return bytes(packed)
+
+
+def unpack_eld(packed):
+    """Yields (day_index, timeline) pairs from pack_eld output."""
+    packed = bytes(packed)
+    for offset in range(0, len(packed), _DAY_RECORD):
+        yield int.from_bytes(packed[offset:offset + 2], "big"), packed[offset + 2:offset + _DAY_RECORD]
+
+
+def eld_form_from_packed(packed, compact=False):
+    """build_eld_log_form output from a stored encoding, without looking at the events."""
+    return [_form_day(day_index, timeline, compact) for day_index, timeline in unpack_eld(packed)]
+
+
+def eld_form_response(packed, eld_format=None):
+    """
+    Returns the response fields for a trip's stored ELD encoding in the
+    requested format: "compact" adds the status legend next to the
+    run-length form, anything else gives the expanded form the frontend
+    uses.
+    """
+    if eld_format == "compact":
+        return {
+            "eldStatuses": list(ELD_STATUSES),
+            "eldFormData": eld_form_from_packed(packed, compact=True),
+        }
+    return {"eldFormData": eld_form_from_packed(packed)}
@@ -0,0 +1,236 @@
+"""
+Local stand-in for the OpenRouteService API, for tests and benchmarks.
+
+FakeORSServer answers the three endpoints the ORS clients use (geocode
+search, directions, matrix) with payloads shaped like the real ones:
+addresses geocode to stable pseudo-random points in the continental US,
+and routes follow great-circle legs scaled by a road factor, with an
+encoded polyline geometry. Latency, jitter and an error rate (429/503
+responses) are configurable, and fail_next() scripts specific failures. Point ORS_BASE_URL at server.url to use it.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .geo import haversine_meters
+from .polyline import encode_polyline
+
+# Road distance / great-circle distance, and average road speed.
+ROAD_FACTOR = 1.2
+ROAD_SPEED_MPS = 24.6
+# Geometry points per route leg.
+POINTS_PER_LEG = 50
+
+# Continental US bounding box (lng/lat) used for geocoded points.
+_MIN_LNG, _MAX_LNG = -123.0, -71.0
+_MIN_LAT, _MAX_LAT = 26.0, 48.0
+
+
+def road_meters(a, b):
+    return haversine_meters(a, b) * ROAD_FACTOR
+
+
+def fake_coordinates(text):
+    """Stable [lng, lat] for an address string."""
+    digest = hashlib.sha1(" ".join(text.lower().split()).encode()).digest()
+    x = int.from_bytes(digest[:4], "big") / 2**32
+    y = int.from_bytes(digest[4:8], "big") / 2**32
+    return [round(_MIN_LNG + x * (_MAX_LNG - _MIN_LNG), 6), round(_MIN_LAT + y * (_MAX_LAT - _MIN_LAT), 6)]
+
+
+def geocode_payload(text, size=1):
+    lng, lat = fake_coordinates(text)
+    features = [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lng, lat]},
+        "properties": {
+            "label": text,
+            "name": text.split(",")[0],
+            "layer": "locality",
+            "source": "fake",
+            "country_code": "US",
+            "confidence": 1,
+        },
+        "bbox": [lng - 0.05, lat - 0.05, lng + 0.05, lat + 0.05],
+    }]
+    return {
+        "geocoding": {"version": "0.2", "query": {"text": text, "size": size}},
+        "type": "FeatureCollection",
+        "features": features[:size],
+        "bbox": [lng, lat, lng, lat],
+    }
+
+
+def directions_payload(coordinates, profile):
+    geometry = [coordinates[0]]
+    segments = []
+    way_points = [0]
+    for start, end in zip(coordinates, coordinates[1:]):
+        for step in range(1, POINTS_PER_LEG + 1):
+            t = step / POINTS_PER_LEG
+            geometry.append([start[0] + (end[0] - start[0]) * t, start[1] + (end[1] - start[1]) * t])
+        way_points.append(len(geometry) - 1)
+        distance = road_meters(start, end)
+        segments.append({"distance": round(distance, 1), "duration": round(distance / ROAD_SPEED_MPS, 1), "steps": []})
+
+    distance = sum(segment["distance"] for segment in segments)
+    lngs = [point[0] for point in coordinates]
+    lats = [point[1] for point in coordinates]
+    return {
+        "bbox": [min(lngs), min(lats), max(lngs), max(lats)],
+        "routes": [{
+            "summary": {"distance": round(distance, 1), "duration": round(distance / ROAD_SPEED_MPS, 1)},
+            "segments": segments,
+            "bbox": [min(lngs), min(lats), max(lngs), max(lats)],
+            "geometry": encode_polyline(geometry),
+            "way_points": way_points,
+        }],
+        "metadata": {"service": "routing", "query": {"coordinates": coordinates, "profile": profile}},
+    }
+
+
+def matrix_payload(locations, sources, destinations):
+    sources = range(len(locations)) if sources is None else sources
+    destinations = range(len(locations)) if destinations is None else destinations
+    distances = [[round(road_meters(locations[i], locations[j]), 1) for j in destinations] for i in sources]
+    return {
+        "distances": distances,
+        "durations": [[round(d / ROAD_SPEED_MPS, 1) for d in row] for row in distances],
+        "sources": [{"location": locations[i]} for i in sources],
+        "destinations": [{"location": locations[j]} for j in destinations],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status_code, payload, headers=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self, endpoint, build_payload):
+        fake = self.server.fake
+        fake.delay()
+        failure = fake.failure()
+        fake.record(endpoint, failure is not None)
+        if failure is not None:
+            self._send(failure, {"error": {"code": failure, "message": "Injected failure"}},
+                       [("Retry-After", str(fake.retry_after))])
+            return
+        try:
+            payload = build_payload()
+        except (KeyError, IndexError, TypeError, ValueError) as exc:
+            self._send(400, {"error": {"code": 2000, "message": f"Invalid request: {exc}"}})
+            return
+        self._send(200, payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/geocode/search":
+            self._send(404, {"error": "Not found"})
+            return
+        query = parse_qs(url.query)
+        self._respond("geocode", lambda: geocode_payload(query["text"][0], int(query.get("size", ["1"])[0])))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if url.path.startswith("/v2/directions/"):
+            profile = url.path.rsplit("/", 1)[-1]
+            self._respond("directions", lambda: directions_payload(body["coordinates"], profile))
+        elif url.path.startswith("/v2/matrix/"):
+            self._respond("matrix", lambda: matrix_payload(
+                body["locations"], body.get("sources"), body.get("destinations")
+            ))
+        else:
+            self._send(404, {"error": "Not found"})
+
+
+class FakeORSServer:
+    """
+    Threaded fake ORS HTTP server.
+
+    latency/jitter: seconds added to every response (latency +/- jitter).
+    error_rate: fraction of requests answered with 429 or 503.
+    retry_after: Retry-After header (seconds) sent with injected failures.
+    counts/errors hold per-endpoint request and injected-error counters.
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = 0
+        self._scripted = deque()
+        self.counts = {}
+        self.errors = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-ors", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                seconds = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            time.sleep(max(0.0, seconds))
+
+    def fail_next(self, count, status_code=503):
+        """Answers the next count requests (any endpoint) with status_code."""
+        with self._lock:
+            self._scripted.extend([status_code] * count)
+
+    def failure(self):
+        with self._lock:
+            if self._scripted:
+                return self._scripted.popleft()
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            return self._random.choice((429, 503))
+
+    def record(self, endpoint, failed):
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
@@ -0,0 +1,220 @@
+"""
+Fleet-wide ELD grids for compliance audits.
+
+FleetEldGrid turns the daily logs of many trips into one (days x 96) uint8
+matrix of ELD status codes (see trips.eld) with NumPy range fills, or
+stacks the grids stored in TripDetail.eld, and offers the audit reductions
+on top of it. Requires numpy.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # Only needed by FleetEldGrid.
+    np = None
+
+from .eld import (
+    ELD_STATUSES, MINUTES_PER_SLOT, OFF_DUTY, SLOTS_PER_DAY, STATUS_CODES,
+    _SLOT_BY_LABEL, status_code, time_to_slot, unpack_eld,
+)
+from .hos import DRIVING_LIMIT, ONDUTY_LIMIT
+
+DRIVING = STATUS_CODES["Driving"]
+CYCLE_LIMIT_REACHED = STATUS_CODES["Cycle Limit Reached"]
+# Statuses that count as on-duty time.
+ON_DUTY_CODES = tuple(code for code, name in enumerate(ELD_STATUSES) if name not in ("Off Duty", "Sleeper Berth"))
+
+_DRIVING_LIMIT_SLOTS = int(DRIVING_LIMIT * 60 // MINUTES_PER_SLOT)
+_ONDUTY_LIMIT_SLOTS = int(ONDUTY_LIMIT * 60 // MINUTES_PER_SLOT)
+
+
+def build_grid(days):
+    """
+    Builds the (len(days) x 96) status code matrix for a list of days'
+    events, with the same slot rules as trips.eld.day_timeline: later
+    events overwrite earlier ones, and an event shorter than a slot fills
+    its start slot.
+    """
+    if np is None:
+        raise ImportError("Fleet ELD grids require the numpy package.")
+    rows = []
+    starts = []
+    ends = []
+    codes = []
+    for row, events in enumerate(days):
+        for event in events:
+            try:
+                start_slot = _SLOT_BY_LABEL[event["start"]]
+                end_slot = _SLOT_BY_LABEL[event["end"]]
+                code = STATUS_CODES[event["status"]]
+            except KeyError:
+                start_slot = time_to_slot(event["start"])
+                end_slot = time_to_slot(event["end"])
+                code = status_code(event["status"])
+            rows.append(row)
+            starts.append(start_slot)
+            ends.append(end_slot)
+            codes.append(code)
+
+    grid = np.full((len(days), SLOTS_PER_DAY), OFF_DUTY, dtype=np.uint8)
+    if not codes:
+        return grid
+    rows = np.array(rows, dtype=np.int64)
+    starts = np.array(starts, dtype=np.int64)
+    ends = np.maximum(np.array(ends, dtype=np.int64), starts + 1)
+    codes = np.array(codes, dtype=np.uint8)
+
+    # Expand every event into the flat indices of the slots it covers, then
+    # keep the last (highest numbered) event written to each slot.
+    lengths = ends - starts
+    event_of_slot = np.repeat(np.arange(len(codes)), lengths)
+    offsets = np.arange(len(event_of_slot)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    slots = rows[event_of_slot] * SLOTS_PER_DAY + starts[event_of_slot] + offsets
+    last_event = np.full(grid.size, -1, dtype=np.int64)
+    np.maximum.at(last_event, slots, event_of_slot)
+
+    covered = last_event >= 0
+    grid.reshape(-1)[covered] = codes[last_event[covered]]
+    return grid
+
+
+class FleetEldGrid:
+    """
+    ELD grid for a set of trips. Row i of grid is one day of one trip;
+    trip_ids, driver_ids and dates give the trip, driver and calendar date
+    of each row. A trip's first log day is the date it was created.
+    """
+    def __init__(self, grid, trip_ids, driver_ids, dates):
+        self.grid = grid
+        self.trip_ids = trip_ids
+        self.driver_ids = driver_ids
+        self.dates = dates
+
+    @classmethod
+    def from_trips(cls, trips):
+        """trips is an iterable of (trip_id, driver_id, start_date, daily_logs)."""
+        days = []
+        trip_ids = []
+        driver_ids = []
+        dates = []
+        for trip_id, driver_id, start_date, daily_logs in trips:
+            if not daily_logs:
+                continue
+            first_day = daily_logs[0]["dayIndex"]
+            for day in daily_logs:
+                days.append(day["events"])
+                trip_ids.append(trip_id)
+                driver_ids.append(driver_id)
+                dates.append(start_date + timedelta(days=day["dayIndex"] - first_day))
+        return cls(
+            build_grid(days),
+            np.array(trip_ids, dtype=np.int64),
+            np.array(driver_ids, dtype=np.int64),
+            np.array(dates, dtype="datetime64[D]"),
+        )
+
+    @classmethod
+    def from_packed(cls, trips):
+        """
+        trips is an iterable of (trip_id, driver_id, start_date, packed),
+        where packed is the trip's ELD grid in the encoding of
+        trips.eld.pack_eld; its rows are used as they are.
+        """
+        if np is None:
+            raise ImportError("Fleet ELD grids require the numpy package.")
+        timelines = bytearray()
+        trip_ids = []
+        driver_ids = []
+        dates = []
+        for trip_id, driver_id, start_date, packed in trips:
+            first_day = None
+            for day_index, timeline in unpack_eld(packed or b""):
+                if first_day is None:
+                    first_day = day_index
+                timelines += timeline
+                trip_ids.append(trip_id)
+                driver_ids.append(driver_id)
+                dates.append(start_date + timedelta(days=day_index - first_day))
+        return cls(
+            np.frombuffer(timelines, dtype=np.uint8).reshape(len(trip_ids), SLOTS_PER_DAY),
+            np.array(trip_ids, dtype=np.int64),
+            np.array(driver_ids, dtype=np.int64),
+            np.array(dates, dtype="datetime64[D]"),
+        )
+
+    @classmethod
+    def from_queryset(cls, trips):
+        """
+        Builds the grid for a Trip queryset from the ELD grids stored in
+        TripDetail. Days are local dates, as in the duty ledger.
+        """
+        rows = trips.values_list("id", "driver_id", "created_at", "detail__eld").iterator(chunk_size=2000)
+        return cls.from_packed(
+            (trip_id, driver_id, timezone.localdate(created_at), packed)
+            for trip_id, driver_id, created_at, packed in rows
+        )
+
+    def __len__(self):
+        return len(self.grid)
+
+    def on_duty_minutes(self):
+        """On-duty minutes of each row."""
+        return np.isin(self.grid, ON_DUTY_CODES).sum(axis=1) * MINUTES_PER_SLOT
+
+    def driver_days(self):
+        """
+        Merges rows of the same driver and date (several trips on one day)
+        into one grid row, where a later trip's non-off-duty slots win.
+        Returns (driver_ids, dates, grid) sorted by driver and date.
+        """
+        order = np.lexsort((np.arange(len(self)), self.dates, self.driver_ids))
+        driver_ids = self.driver_ids[order]
+        dates = self.dates[order]
+        grid = self.grid[order]
+        if not len(grid):
+            return driver_ids, dates, grid
+
+        group_start = np.ones(len(grid), dtype=bool)
+        group_start[1:] = (driver_ids[1:] != driver_ids[:-1]) | (dates[1:] != dates[:-1])
+        starts = np.flatnonzero(group_start)
+
+        # For every slot of a group, the last row that is not off duty there.
+        row_index = np.where(grid != OFF_DUTY, np.arange(len(grid))[:, None], -1)
+        last_row = np.maximum.reduceat(row_index, starts, axis=0)
+        merged = np.where(
+            last_row >= 0,
+            grid[np.maximum(last_row, 0), np.arange(SLOTS_PER_DAY)],
+            OFF_DUTY,
+        ).astype(np.uint8)
+        return driver_ids[starts], dates[starts], merged
+
+    def driver_on_duty_minutes(self):
+        """Returns {(driver_id, date): on-duty minutes} over the merged driver days."""
+        driver_ids, dates, grid = self.driver_days()
+        minutes = np.isin(grid, ON_DUTY_CODES).sum(axis=1) * MINUTES_PER_SLOT
+        return {
+            (int(driver_id), date.item()): int(total)
+            for driver_id, date, total in zip(driver_ids, dates, minutes)
+        }
+
+    def violation_mask(self):
+        """
+        Boolean (driver days x 96) matrix of slots in violation: driving
+        beyond 11 hours of driving in the day, driving after the 14th hour
+        since the day's first on-duty slot, or a "Cycle Limit Reached" slot.
+        """
+        _, _, grid = self.driver_days()
+        driving = grid == DRIVING
+        over_driving = driving & (np.cumsum(driving, axis=1) > _DRIVING_LIMIT_SLOTS)
+
+        on_duty = np.isin(grid, ON_DUTY_CODES)
+        first_on_duty = np.where(on_duty.any(axis=1), on_duty.argmax(axis=1), SLOTS_PER_DAY)
+        over_window = driving & (np.arange(SLOTS_PER_DAY) >= (first_on_duty + _ONDUTY_LIMIT_SLOTS)[:, None])
+
+        return over_driving | over_window | (grid == CYCLE_LIMIT_REACHED)
+
+    def violations_per_slot(self):
+        """Number of driver days in violation at each of the 96 slots."""
+        return self.violation_mask().sum(axis=0)
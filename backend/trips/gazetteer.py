@@ -0,0 +1,252 @@
+"""
+Local gazetteer geocoder and address autocomplete.
+
+The index holds the imported GazetteerEntry places and facilities plus
+every address ORS has geocoded for us (GeocodeCacheEntry), in memory:
+
+- exact lookups by normalized name, used by trips.views as the first
+  choice before calling ORS;
+- a sorted key list for prefix matches and a trigram index for typo
+  tolerant matches, behind /api/geocode/autocomplete/.
+
+Each process loads the index on first use and rebuilds it in the
+background every GAZETTEER["REFRESH_SECONDS"]; addresses geocoded by ORS
+in the meantime are added as they come in (and replayed into an index
+that was being rebuilt when they arrived).
+"""
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_cache_control
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .geocoding import normalize_address
+from .models import GazetteerEntry, GeocodeCacheEntry
+
+# Kind reported for addresses that come from the geocode cache.
+GEOCODED = "geocoded"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Word trigrams of text, each word padded like pg_trgm ("  word ")."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class GazetteerIndex:
+    """
+    In-memory index over (label, key, longitude, latitude, weight, kind)
+    entries, where key is the normalized label.
+    """
+    def __init__(self, entries=()):
+        self.entries = []
+        self.by_key = {}
+        self.keys = []
+        self.postings = {}
+        self._lock = threading.Lock()
+        postings = {}
+        for entry in entries:
+            entry_id = self._append(entry)
+            if entry_id is not None:
+                for gram in trigrams(entry[1]):
+                    postings.setdefault(gram, []).append(entry_id)
+        self.keys.sort()
+        self.postings = {gram: array("i", ids) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _append(self, entry):
+        # The first entry for a key wins: imported places are loaded first.
+        key = entry[1]
+        if not key or key in self.by_key:
+            return None
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self.by_key[key] = entry_id
+        self.keys.append((key, entry_id))
+        return entry_id
+
+    def add(self, label, longitude, latitude, weight=0, kind=GEOCODED):
+        """Adds one entry to a live index (used for freshly geocoded addresses)."""
+        with self._lock:
+            key = normalize_address(label)
+            if key in self.by_key:
+                return
+            entry_id = len(self.entries)
+            self.entries.append((label, key, longitude, latitude, weight, kind))
+            self.by_key[key] = entry_id
+            insort(self.keys, (key, entry_id))
+            for gram in trigrams(key):
+                self.postings.setdefault(gram, array("i")).append(entry_id)
+
+    def lookup(self, address):
+        """[lng, lat] for an exact (normalized) name match, or None."""
+        entry_id = self.by_key.get(normalize_address(address))
+        if entry_id is None:
+            return None
+        entry = self.entries[entry_id]
+        return [entry[2], entry[3]]
+
+    def suggest(self, query, limit=10, min_similarity=0.5):
+        """
+        Best matches for a partially typed query, as (entry, score) pairs.
+        Names starting with the query come first (score 1.0); the rest are
+        ranked by the share of the query's trigrams they contain, which
+        tolerates typos. Ties go to the higher weight.
+        """
+        key = normalize_address(query)
+        if not key:
+            return []
+        # Keys starting with the query form one run of the sorted key list;
+        # keep the heaviest entries of that run.
+        start = bisect_left(self.keys, (key,))
+        end = bisect_left(self.keys, (key + "\uffff",), start)
+        prefixed = heapq.nlargest(limit, (entry_id for _, entry_id in self.keys[start:end]),
+                                  key=lambda entry_id: self.entries[entry_id][4])
+        scores = dict.fromkeys(prefixed, 1.0)
+
+        grams = trigrams(key)
+        if grams:
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.postings.get(gram, ()))
+            for entry_id, shared in counts.items():
+                score = shared / len(grams)
+                if score >= min_similarity and entry_id not in scores:
+                    scores[entry_id] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -self.entries[item[0]][4], item[0]))
+        return [(self.entries[entry_id], score) for entry_id, score in ranked[:limit]]
+
+
+def load_entries():
+    """Index entries from the database: imported places first, then geocoded addresses."""
+    for name, normalized, longitude, latitude, weight, kind in GazetteerEntry.objects.values_list(
+        "name", "normalized", "longitude", "latitude", "weight", "kind"
+    ).iterator(chunk_size=5000):
+        yield name, normalized, longitude, latitude, weight, kind
+    for address, label, longitude, latitude in GeocodeCacheEntry.objects.values_list(
+        "address", "label", "longitude", "latitude"
+    ).iterator(chunk_size=5000):
+        yield label or address, address, longitude, latitude, 0, GEOCODED
+
+
+class Gazetteer:
+    """
+    Process-wide holder of the GazetteerIndex: built on first use, then
+    rebuilt in a background thread once it is older than refresh_seconds,
+    while the old index keeps answering.
+    """
+    def __init__(self, refresh_seconds=300):
+        self.refresh_seconds = refresh_seconds
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Addresses added while an index is being built, replayed into it.
+        self._added_during_build = None
+        self._add_lock = threading.Lock()
+
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._build()
+        elif time.monotonic() - self._loaded_at > self.refresh_seconds and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name="gazetteer-refresh", daemon=True).start()
+        return self._index
+
+    def _build(self):
+        # Callers hold self._lock, so only one build runs at a time.
+        with self._add_lock:
+            self._added_during_build = []
+        index = GazetteerIndex(load_entries())
+        with self._add_lock:
+            for address, coords in self._added_during_build:
+                index.add(address, coords[0], coords[1])
+            self._added_during_build = None
+            self._index, self._loaded_at = index, time.monotonic()
+
+    def _refresh(self):
+        try:
+            with self._lock:
+                self._build()
+        finally:
+            self._refreshing = False
+            connection.close()
+
+    def reload(self):
+        """Rebuilds the index now (e.g. after an import)."""
+        with self._lock:
+            self._build()
+
+    def clear(self):
+        """Drops the index; the next lookup rebuilds it."""
+        self._index = None
+
+    def lookup(self, address):
+        if not settings.GAZETTEER["ENABLED"]:
+            return None
+        return self.index().lookup(address)
+
+    def add(self, address, coords):
+        """Makes a newly geocoded address available without waiting for the next refresh."""
+        if not settings.GAZETTEER["ENABLED"]:
+            return
+        label = " ".join(address.split())
+        with self._add_lock:
+            if self._index is not None:
+                self._index.add(label, coords[0], coords[1])
+            if self._added_during_build is not None:
+                self._added_during_build.append((label, coords))
+
+    def suggest(self, query, limit=None):
+        return self.index().suggest(
+            query,
+            limit=limit or settings.GAZETTEER["MAX_RESULTS"],
+            min_similarity=settings.GAZETTEER["MIN_SIMILARITY"],
+        )
+
+
+gazetteer = Gazetteer(refresh_seconds=settings.GAZETTEER["REFRESH_SECONDS"])
+
+
+class GeocodeAutocompleteView(APIView):
+    """
+    GET /api/geocode/autocomplete/?q=<text>&limit=<n>
+    Address suggestions from the local gazetteer, best first:
+    {"results": [{"label": ..., "coordinates": [lng, lat], "kind": ..., "score": ...}]}.
+    Queries shorter than two characters get no suggestions.
+    """
+    MIN_QUERY_LENGTH = 2
+
+    def get(self, request, format=None):
+        query = request.query_params.get("q", "").strip()
+        try:
+            limit = min(int(request.query_params.get("limit", settings.GAZETTEER["MAX_RESULTS"])), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=400)
+        results = []
+        if len(query) >= self.MIN_QUERY_LENGTH and settings.GAZETTEER["ENABLED"]:
+            results = [
+                {"label": label, "coordinates": [longitude, latitude], "kind": kind, "score": round(score, 3)}
+                for (label, _, longitude, latitude, _, kind), score in gazetteer.suggest(query, max(limit, 1))
+            ]
+        response = Response({"results": results})
+        patch_cache_control(response, max_age=60)
+        return response
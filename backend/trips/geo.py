@@ -0,0 +1,100 @@
+import math
+from array import array
+from bisect import bisect_left
+
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_MILE = 1609.34
+
+
+def haversine_meters(a, b):
+    """Great-circle distance in meters between two [lng, lat] points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
+class RouteLine:
+    """
+    A route geometry ([lng, lat] vertices) with the cumulative distance in
+    miles at each vertex, so that any mile marker along the route maps to a
+    coordinate by binary search and linear interpolation.
+
+    When total_miles (the routing engine's distance) is given, the
+    cumulative distances are scaled to it, so that the planner's last mile
+    lands on the last vertex.
+    """
+    def __init__(self, points, total_miles=None):
+        if not points:
+            raise ValueError("A route line needs at least one point.")
+        self.points = points
+        cumulative = array("d", [0.0])
+        meters = 0.0
+        for a, b in zip(points, points[1:]):
+            meters += haversine_meters(a, b)
+            cumulative.append(meters)
+        length = meters / METERS_PER_MILE
+        scale = total_miles / length if total_miles and length else 1.0
+        self.cumulative = array("d", (m / METERS_PER_MILE * scale for m in cumulative))
+        self.miles = self.cumulative[-1]
+        self._simplified = None
+
+    def point_at(self, mile):
+        """[lng, lat] of the point mile miles from the start (clamped to the ends)."""
+        cumulative = self.cumulative
+        if mile <= 0:
+            return list(self.points[0])
+        if mile >= cumulative[-1]:
+            return list(self.points[-1])
+        # cumulative[i - 1] < mile <= cumulative[i]
+        i = bisect_left(cumulative, mile)
+        start = cumulative[i - 1]
+        t = (mile - start) / (cumulative[i] - start)
+        a, b = self.points[i - 1], self.points[i]
+        return [round(a[0] + (b[0] - a[0]) * t, 5), round(a[1] + (b[1] - a[1]) * t, 5)]
+
+    def simplified(self, tolerance):
+        """simplify_points(points, tolerance), computed once per line and tolerance."""
+        if self._simplified is None or self._simplified[0] != tolerance:
+            self._simplified = (tolerance, simplify_points(self.points, tolerance))
+        return self._simplified[1]
+
+
+def simplify_points(points, tolerance):
+    """
+    Douglas-Peucker simplification of a [lng, lat] polyline: keeps both
+    ends and every vertex needed to stay within tolerance (in degrees) of
+    the original line.
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    keep = bytearray(len(points))
+    keep[0] = keep[-1] = 1
+    max_squared = tolerance * tolerance
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_squared = dx * dx + dy * dy
+        farthest, farthest_squared = None, max_squared
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            # Distance to the segment, not the infinite line through it.
+            dot = px * dx + py * dy
+            if dot <= 0 or not length_squared:
+                squared = px * px + py * py
+            elif dot >= length_squared:
+                ex, ey = px - dx, py - dy
+                squared = ex * ex + ey * ey
+            else:
+                cross = px * dy - py * dx
+                squared = cross * cross / length_squared
+            if squared > farthest_squared:
+                farthest, farthest_squared = i, squared
+        if farthest is not None:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
@@ -0,0 +1,114 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import LRUCache, prune_table
+from .models import GeocodeCacheEntry
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_ADDRESS_MAX_LENGTH = GeocodeCacheEntry._meta.get_field("address").max_length
+
+
+def normalize_address(address):
+    """
+    Normalizes a free-text address into a cache key so that trivial
+    differences in case, spacing and trailing punctuation hit the same entry.
+    """
+    address = _WHITESPACE_RE.sub(" ", (address or "").strip().lower())
+    return address.strip(" ,.;")
+
+
+class GeocodeCache:
+    """
+    Two-tier cache for geocoding results.
+
+    Tier 1 is an in-process LRU (fast, per worker); tier 2 is the
+    GeocodeCacheEntry table (shared by all workers and restarts).
+    Both tiers honor the same TTL; the database tier is pruned back to
+    db_max_entries (least recently used first) every prune_interval writes.
+    """
+    def __init__(self, max_entries=1024, db_max_entries=50000, ttl=30 * 24 * 3600,
+                 prune_interval=100):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.db_max_entries = db_max_entries
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.db_hits = 0
+        self.db_misses = 0
+        self._writes = 0
+
+    def get(self, address):
+        key = normalize_address(address)
+        coords = self.memory.get(key)
+        if coords is not None:
+            return coords
+
+        entry = GeocodeCacheEntry.objects.filter(address=key).first()
+        if entry is None:
+            self.db_misses += 1
+            return None
+        if self.ttl is not None and entry.created_at < timezone.now() - timedelta(seconds=self.ttl):
+            entry.delete()
+            self.db_misses += 1
+            return None
+
+        GeocodeCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=timezone.now())
+        self.db_hits += 1
+        coords = [entry.longitude, entry.latitude]
+        self.memory.set(key, coords)
+        return coords
+
+    def recall(self, address):
+        """Looks address up in the in-process tier only."""
+        return self.memory.get(normalize_address(address))
+
+    def remember(self, address, coords):
+        """Stores coords in the in-process tier only (no database access)."""
+        self.memory.set(normalize_address(address), [coords[0], coords[1]])
+
+    def set(self, address, coords):
+        key = normalize_address(address)
+        coords = [coords[0], coords[1]]
+        self.memory.set(key, coords)
+        if len(key) > _ADDRESS_MAX_LENGTH:
+            return
+        GeocodeCacheEntry.objects.update_or_create(
+            address=key,
+            defaults={
+                "label": " ".join(address.split())[:_ADDRESS_MAX_LENGTH],
+                "longitude": coords[0],
+                "latitude": coords[1],
+                "created_at": timezone.now(),
+            },
+        )
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self.prune()
+
+    def prune(self):
+        """Drops expired rows and trims the table to db_max_entries."""
+        prune_table(GeocodeCacheEntry, ttl=self.ttl, max_entries=self.db_max_entries)
+
+    def clear(self):
+        self.memory.clear()
+        GeocodeCacheEntry.objects.all().delete()
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {
+            "memory": memory,
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "hits": memory["hits"] + self.db_hits,
+            "misses": self.db_misses,
+        }
+
+
+_config = getattr(settings, "GEOCODE_CACHE", {})
+geocode_cache = GeocodeCache(
+    max_entries=_config.get("MAX_ENTRIES", 1024),
+    db_max_entries=_config.get("DB_MAX_ENTRIES", 50000),
+    ttl=_config.get("TTL", 30 * 24 * 3600),
+)
@@ -0,0 +1,164 @@
+"""
+Read endpoints for dashboards: trip history, the driver list and single
+trips with their stored ELD grid.
+
+The lists use keyset (cursor) pagination over indexed columns, so fetching a
+page costs the same however deep into a driver's history it is, and the
+trips' TripDetail rows are only joined in when ?include asks for them.
+"""
+import zlib
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+from .eld import eld_form_response
+from .models import Driver, Trip, TripDetail
+from .serializers import HEAVY_TRIP_FIELDS, DriverSerializer, TripHistorySerializer, TripSerializer
+
+
+class TripCursorPagination(CursorPagination):
+    # Backed by the (driver, created_at) and (created_at) indexes on Trip.
+    ordering = "-created_at"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class DriverCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+def parse_datetime_param(value, name, end_of_day=False):
+    """Accepts an ISO datetime or date; a bare date covers the whole day when end_of_day is set."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Expected an ISO 8601 date or datetime."})
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class TripHistoryView(generics.ListAPIView):
+    """
+    GET /api/trips/?driver=<id>&since=<date>&until=<date>&include=route,logs,fuel_stops
+    (also /api/drivers/<id>/trips/). Newest trips first, paginated with
+    ?cursor=...; dates are ISO 8601 and both bounds are inclusive.
+    """
+    serializer_class = TripHistorySerializer
+    pagination_class = TripCursorPagination
+
+    def include_fields(self):
+        requested = {name.strip() for name in self.request.query_params.get("include", "").split(",") if name.strip()}
+        unknown = requested - set(HEAVY_TRIP_FIELDS)
+        if unknown:
+            raise ValidationError({"include": f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        return requested
+
+    def get_queryset(self):
+        params = self.request.query_params
+        trips = Trip.objects.all()
+        if self.include_fields():
+            trips = trips.select_related("detail")
+
+        driver_id = self.kwargs.get("driver_id", params.get("driver"))
+        if driver_id is not None:
+            if not str(driver_id).isdigit():
+                raise ValidationError({"driver": "Expected a driver id."})
+            trips = trips.filter(driver_id=driver_id)
+        if params.get("since"):
+            trips = trips.filter(created_at__gte=parse_datetime_param(params["since"], "since"))
+        if params.get("until"):
+            trips = trips.filter(created_at__lte=parse_datetime_param(params["until"], "until", end_of_day=True))
+        return trips
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs["include"] = self.include_fields()
+        return super().get_serializer(*args, **kwargs)
+
+
+class DriverListView(generics.ListAPIView):
+    """GET /api/drivers/: all drivers by id, paginated with ?cursor=..."""
+    serializer_class = DriverSerializer
+    pagination_class = DriverCursorPagination
+    queryset = Driver.objects.only("id", "name", "current_cycle_hours_used", "cycle_start_date")
+
+
+def _conditional(request, etag, build_data):
+    """
+    Answers 304 when If-None-Match matches etag, otherwise build_data()
+    with the ETag. Trips do not change once saved, so clients only need
+    to revalidate.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(build_data())
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _eld_format(request):
+    """The ?eld= format as eld_form_response reads it: "compact" or "expanded"."""
+    return "compact" if request.query_params.get("eld") == "compact" else "expanded"
+
+
+def _etag(trip_id, kind, eld_format, *blobs):
+    checksum = 0
+    for blob in blobs:
+        checksum = zlib.crc32(blob, checksum)
+    return f'"trip-{trip_id}-{kind}-{eld_format}-{checksum:08x}"'
+
+
+class TripDetailView(APIView):
+    """
+    GET /api/trips/<id>/: the trip as returned by CalculateTripView,
+    including its ELD grid (?eld=compact for the run-length form), read
+    with one query and served with an ETag.
+    """
+    def get(self, request, trip_id, format=None):
+        trip = Trip.objects.select_related("detail").filter(pk=trip_id).first()
+        if trip is None:
+            return Response({"error": "Trip not found."}, status=status.HTTP_404_NOT_FOUND)
+        eld_format = _eld_format(request)
+        try:
+            etag = _etag(trip.pk, "detail", eld_format, bytes(trip.detail.payload), trip.eld)
+        except TripDetail.DoesNotExist:
+            etag = _etag(trip.pk, "detail", eld_format)
+
+        def build_data():
+            data = dict(TripSerializer(trip).data)
+            data.update(eld_form_response(trip.eld, eld_format))
+            return data
+
+        return _conditional(request, etag, build_data)
+
+
+class TripEldView(APIView):
+    """
+    GET /api/trips/<id>/eld/: just the trip's log sheet, from the ELD grid
+    stored at save time. Costs one single-row read and no recomputation.
+    """
+    def get(self, request, trip_id, format=None):
+        packed = TripDetail.objects.filter(trip_id=trip_id).values_list("eld", flat=True).first()
+        if packed is None:
+            return Response({"error": "Trip not found."}, status=status.HTTP_404_NOT_FOUND)
+        packed = bytes(packed)
+        eld_format = _eld_format(request)
+        return _conditional(
+            request,
+            _etag(trip_id, "eld", eld_format, packed),
+            lambda: {"id": trip_id, **eld_form_response(packed, eld_format)},
+        )
@@ -0,0 +1,218 @@
+from datetime import timedelta
+
+# Constants for HOS rules and cycle limits
+MAX_CYCLE_HOURS = 70.0        # Maximum allowed cycle hours per cycle
+PICKUP_DURATION = 1.0         # 1-hour pickup event
+DROPOFF_DURATION = 1.0        # 1-hour dropoff event
+DRIVING_LIMIT = 11.0          # Maximum 11 hours driving per day
+ONDUTY_LIMIT = 14.0           # Maximum 14 hours on-duty per day
+BREAK_AFTER_DRIVING = 8.0     # 30-minute break after 8 hours driving
+BREAK_DURATION = 0.5          # 0.5 hours (30 minutes)
+REST_DURATION = 10.0          # 10-hour mandatory off-duty rest
+FUEL_MILE_INTERVAL = 1000.0   # Fueling stop every 1000 miles
+FUEL_DURATION = 0.25          # 15-minute fueling stop
+AVERAGE_SPEED = 50.0          # Average speed in mph
+
+# "HH:MM" label for every minute of the day, indexed by minute.
+_CLOCK = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)]
+_US_PER_HOUR = 3600 * 10**6
+_US_PER_MINUTE = 60 * 10**6
+_DAY_START_US = 6 * _US_PER_HOUR
+
+
+def _hours_to_us(hours):
+    # Rounds exactly like timedelta(hours=hours), which the reference uses.
+    delta = timedelta(hours=hours)
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+_PICKUP_US = _hours_to_us(PICKUP_DURATION)
+_DROPOFF_US = _hours_to_us(DROPOFF_DURATION)
+_FUEL_US = _hours_to_us(FUEL_DURATION)
+_BREAK_US = _hours_to_us(BREAK_DURATION)
+_REST_US = _hours_to_us(REST_DURATION)
+
+
+def clock_label(time_us):
+    """Formats a time in microseconds since day 1 00:00 as its "HH:MM" clock label."""
+    return _CLOCK[time_us // _US_PER_MINUTE % 1440]
+
+
+def run_hos(total_driving_hours, cycle_used, make_event, make_day, make_fuel_stop):
+    """
+    Closed-form HOS engine behind simulate_hos and trips.planner.
+
+    Produces the same timeline as trips.hos_reference.simulate_hos_stepwise (1-hour pickup,
+    30-minute breaks once 8 hours have been driven, fueling stops every
+    1000 miles, 10-hour rest at the 11/14-hour limits, "Cycle Limit
+    Reached" when the cycle runs out, 1-hour dropoff), but instead of
+    stepping hour by hour it jumps over every run of full driving hours
+    that cannot trigger a stop, and contiguous driving is reported as a
+    single "Driving" event. Time is tracked as integer microseconds since
+    day 1 00:00.
+
+    Output objects are built by the callbacks:
+      make_event(status, start_us, end_us, description)
+      make_day(day_index, events)
+      make_fuel_stop(mile)
+    Returns (fuel_stops, days).
+    """
+    days = []
+    day_index = 1
+    events = []
+    now = _DAY_START_US
+    on_duty_hours = 0.0
+    driving_hours_today = 0.0
+    remaining_driving = total_driving_hours
+    remaining_cycle_hours = MAX_CYCLE_HOURS - cycle_used
+    cumulative_miles = 0.0
+    next_fuel_mile = FUEL_MILE_INTERVAL
+    fuel_stops = []
+
+    # Open driving event: start time and accumulated hours, or None.
+    drive_start = None
+    drive_hours = 0.0
+
+    def add_event(status, start, end, description):
+        events.append(make_event(status, start, end, description))
+
+    def close_drive():
+        nonlocal drive_start
+        if drive_start is not None:
+            add_event("Driving", drive_start, now, f"Driving segment for {drive_hours:.1f} hour(s)")
+            drive_start = None
+
+    def end_day(status, end, description):
+        nonlocal events, day_index
+        add_event(status, now, end, description)
+        days.append(make_day(day_index, events))
+        day_index += 1
+        events = []
+
+    add_event("On Duty", now, now + _PICKUP_US, "Pickup")
+    now += _PICKUP_US
+    on_duty_hours += PICKUP_DURATION
+
+    while remaining_driving > 0:
+        daily_available = min(DRIVING_LIMIT - driving_hours_today, ONDUTY_LIMIT - on_duty_hours)
+        available_cycle_hours = remaining_cycle_hours - on_duty_hours
+
+        if available_cycle_hours <= 0 or daily_available <= 0:
+            close_drive()
+            end_day("Cycle Limit Reached", now, "Driver has reached the maximum cycle hours.")
+            break
+
+        if drive_start is None:
+            drive_start = now
+            drive_hours = 0.0
+
+        # Whole hours that are certain to be full 1-hour steps with no stop
+        # after them. Every bound keeps one step of margin so the step that
+        # reaches a boundary goes through the exact single-step path below.
+        jump = min(
+            int(remaining_driving) - 1,
+            int(BREAK_AFTER_DRIVING - driving_hours_today) - 1,
+            int(ONDUTY_LIMIT - on_duty_hours) - 1,
+            int(available_cycle_hours) - 1,
+            int((next_fuel_mile - cumulative_miles) / AVERAGE_SPEED) - 1,
+        )
+        if jump > 0:
+            hours = float(jump)
+            drive_hours += hours
+            driving_hours_today += hours
+            on_duty_hours += hours
+            remaining_driving -= hours
+            cumulative_miles += AVERAGE_SPEED * hours
+            now += jump * _US_PER_HOUR
+            continue
+
+        drive_segment = min(1.0, remaining_driving, daily_available, available_cycle_hours)
+        drive_hours += drive_segment
+        driving_hours_today += drive_segment
+        on_duty_hours += drive_segment
+        remaining_driving -= drive_segment
+        cumulative_miles += AVERAGE_SPEED * drive_segment
+        now += _US_PER_HOUR if drive_segment == 1.0 else _hours_to_us(drive_segment)
+
+        if cumulative_miles >= next_fuel_mile:
+            close_drive()
+            add_event("On Duty", now, now + _FUEL_US, "Fueling Stop")
+            fuel_stops.append(make_fuel_stop(next_fuel_mile))
+            on_duty_hours += FUEL_DURATION
+            now += _FUEL_US
+            next_fuel_mile += FUEL_MILE_INTERVAL
+
+        if driving_hours_today >= BREAK_AFTER_DRIVING and remaining_driving > 0:
+            close_drive()
+            add_event("On Duty", now, now + _BREAK_US, "30-minute Break")
+            on_duty_hours += BREAK_DURATION
+            now += _BREAK_US
+
+        if driving_hours_today >= DRIVING_LIMIT or on_duty_hours >= ONDUTY_LIMIT:
+            close_drive()
+            end_day("Off Duty", now + _REST_US, "End of day rest")
+            now = _DAY_START_US + (day_index - 1) * 24 * _US_PER_HOUR
+            on_duty_hours = 0.0
+            driving_hours_today = 0.0
+
+    if remaining_driving <= 0:
+        close_drive()
+        end_day("On Duty", now + _DROPOFF_US, "Dropoff")
+
+    return fuel_stops, days
+
+
+def _log_event(status, start_us, end_us, description):
+    return {
+        "status": status,
+        "start": clock_label(start_us),
+        "end": clock_label(end_us),
+        "description": description
+    }
+
+
+def _log_day(day_index, events):
+    return {
+        "dayIndex": day_index,
+        "events": events
+    }
+
+
+def _log_fuel_stop(mile):
+    return {
+        "mile": mile,
+        "location": f"Fuel Stop at mile {mile}"
+    }
+
+
+def simulate_hos(total_driving_hours, cycle_used):
+    """
+    Simulates HOS events for a trip needing total_driving_hours of driving
+    by a driver who has already used cycle_used hours of the 70-hour cycle,
+    using the closed-form engine (run_hos).
+    Returns (fuel_stops, daily_logs) in the same format as
+    trips.hos_reference.simulate_hos_stepwise.
+    """
+    return run_hos(total_driving_hours, cycle_used, _log_event, _log_day, _log_fuel_stop)
+
+
+def _event_hours(event):
+    start_h, start_m = int(event["start"][:2]), int(event["start"][3:5])
+    end_h, end_m = int(event["end"][:2]), int(event["end"][3:5])
+    minutes = (end_h * 60 + end_m) - (start_h * 60 + start_m)
+    if minutes < 0:
+        minutes += 24 * 60
+    return minutes / 60.0
+
+
+def daily_duty_hours(daily_logs):
+    """Returns the on-duty hours (every status except "Off Duty") of each day in daily_logs."""
+    return [
+        sum(_event_hours(event) for event in day["events"] if event["status"] != "Off Duty")
+        for day in daily_logs
+    ]
+
+
+def duty_hours(daily_logs):
+    """Returns the total on-duty hours recorded in daily_logs."""
+    return sum(daily_duty_hours(daily_logs))
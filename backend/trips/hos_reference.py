@@ -0,0 +1,165 @@
+"""
+Reference HOS simulation, kept as the oracle that trips.hos.simulate_hos is
+checked against (trips.tests) and as the baseline of `manage.py
+benchmark_trips`. Nothing in the request path imports it.
+"""
+from datetime import datetime, timedelta
+
+from .hos import (
+    AVERAGE_SPEED, BREAK_AFTER_DRIVING, BREAK_DURATION, DRIVING_LIMIT, DROPOFF_DURATION, FUEL_MILE_INTERVAL,
+    MAX_CYCLE_HOURS, ONDUTY_LIMIT, PICKUP_DURATION, REST_DURATION,
+)
+
+
+def format_time(time_obj):
+    # Same output as strftime("%H:%M"), without the strftime overhead.
+    return f"{time_obj.hour:02d}:{time_obj.minute:02d}"
+
+
+def simulate_hos_stepwise(total_driving_hours, cycle_used):
+    """
+    Reference HOS simulation that advances driving in steps of at most one
+    hour. This is the original real_simulate_trip loop.
+    Returns (fuel_stops, daily_logs).
+    """
+    daily_logs = []
+    day_index = 1
+    current_day_events = []
+    day_start = datetime.strptime("06:00", "%H:%M")
+    current_time = day_start
+    on_duty_hours = 0.0
+    driving_hours_today = 0.0
+    remaining_driving = total_driving_hours
+    remaining_cycle_hours = MAX_CYCLE_HOURS - cycle_used
+    cumulative_miles = 0.0
+    next_fuel_mile = FUEL_MILE_INTERVAL
+    fuel_stops = []
+
+    # --- Add Pickup Event (1 hour) ---
+    pickup_event = {
+        "status": "On Duty",
+        "start": format_time(current_time),
+        "end": format_time(current_time + timedelta(hours=PICKUP_DURATION)),
+        "description": "Pickup"
+    }
+    current_day_events.append(pickup_event)
+    current_time += timedelta(hours=PICKUP_DURATION)
+    on_duty_hours += PICKUP_DURATION
+
+    # --- Simulate Driving with HOS and Cycle Limit Integration ---
+    while remaining_driving > 0:
+        daily_available = min(DRIVING_LIMIT - driving_hours_today, ONDUTY_LIMIT - on_duty_hours)
+        available_cycle_hours = remaining_cycle_hours - on_duty_hours
+
+        if available_cycle_hours <= 0 or daily_available <= 0:
+            cycle_event = {
+                "status": "Cycle Limit Reached",
+                "start": format_time(current_time),
+                "end": format_time(current_time),
+                "description": "Driver has reached the maximum cycle hours."
+            }
+            current_day_events.append(cycle_event)
+            daily_logs.append({
+                "dayIndex": day_index,
+                "events": current_day_events
+            })
+            break
+
+        drive_segment = min(1.0, remaining_driving, daily_available, available_cycle_hours)
+        if drive_segment <= 0:
+            off_duty_event = {
+                "status": "Off Duty",
+                "start": format_time(current_time),
+                "end": format_time(current_time + timedelta(hours=REST_DURATION)),
+                "description": "End of day rest"
+            }
+            current_day_events.append(off_duty_event)
+            daily_logs.append({
+                "dayIndex": day_index,
+                "events": current_day_events
+            })
+            day_index += 1
+            current_day_events = []
+            current_time = day_start + timedelta(days=day_index - 1)
+            on_duty_hours = 0.0
+            driving_hours_today = 0.0
+            continue
+
+        start_time = current_time
+        end_time = current_time + timedelta(hours=drive_segment)
+        driving_event = {
+            "status": "Driving",
+            "start": format_time(start_time),
+            "end": format_time(end_time),
+            "description": f"Driving segment for {drive_segment:.1f} hour(s)"
+        }
+        current_day_events.append(driving_event)
+        driving_hours_today += drive_segment
+        on_duty_hours += drive_segment
+        remaining_driving -= drive_segment
+        current_time = end_time
+
+        segment_miles = AVERAGE_SPEED * drive_segment
+        cumulative_miles += segment_miles
+
+        if cumulative_miles >= next_fuel_mile:
+            fuel_event = {
+                "status": "On Duty",
+                "start": format_time(current_time),
+                "end": format_time(current_time + timedelta(minutes=15)),
+                "description": "Fueling Stop"
+            }
+            current_day_events.append(fuel_event)
+            fuel_stops.append({
+                "mile": next_fuel_mile,
+                "location": f"Fuel Stop at mile {next_fuel_mile}"
+            })
+            on_duty_hours += 0.25
+            current_time += timedelta(minutes=15)
+            next_fuel_mile += FUEL_MILE_INTERVAL
+
+        if driving_hours_today >= BREAK_AFTER_DRIVING and remaining_driving > 0:
+            break_event = {
+                "status": "On Duty",
+                "start": format_time(current_time),
+                "end": format_time(current_time + timedelta(minutes=30)),
+                "description": "30-minute Break"
+            }
+            current_day_events.append(break_event)
+            on_duty_hours += BREAK_DURATION
+            current_time += timedelta(minutes=30)
+
+        if driving_hours_today >= DRIVING_LIMIT or on_duty_hours >= ONDUTY_LIMIT:
+            off_duty_event = {
+                "status": "Off Duty",
+                "start": format_time(current_time),
+                "end": format_time(current_time + timedelta(hours=REST_DURATION)),
+                "description": "End of day rest"
+            }
+            current_day_events.append(off_duty_event)
+            daily_logs.append({
+                "dayIndex": day_index,
+                "events": current_day_events
+            })
+            day_index += 1
+            current_day_events = []
+            current_time = day_start + timedelta(days=day_index - 1)
+            on_duty_hours = 0.0
+            driving_hours_today = 0.0
+
+    if remaining_driving <= 0:
+        dropoff_event = {
+            "status": "On Duty",
+            "start": format_time(current_time),
+            "end": format_time(current_time + timedelta(hours=DROPOFF_DURATION)),
+            "description": "Dropoff"
+        }
+        current_day_events.append(dropoff_event)
+        on_duty_hours += DROPOFF_DURATION
+        daily_logs.append({
+            "dayIndex": day_index,
+            "events": current_day_events
+        })
+
+
+    return fuel_stops, daily_logs
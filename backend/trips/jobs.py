@@ -0,0 +1,172 @@
+"""
+Database-backed job queue for trip calculations.
+
+Jobs are TripJob rows, so the queue needs no broker and is shared by every
+process using the database. A JobRunner runs a handler for queued jobs on
+a pool of worker threads: workers claim the oldest queued job with a
+conditional UPDATE (only one worker can move it from "queued" to
+"running"), wake up immediately for jobs submitted in the same process and
+poll for jobs submitted elsewhere. Jobs left running by a dead process are
+requeued by a periodic sweep, so a job can run more than once; handlers
+save their result through commit_job_trip, which keeps only the first.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Trip, TripJob
+
+logger = logging.getLogger(__name__)
+
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or None when the queue is empty."""
+    while True:
+        job_id = (
+            TripJob.objects.filter(status=TripJob.QUEUED).order_by("id").values_list("id", flat=True).first()
+        )
+        if job_id is None:
+            return None
+        claimed = TripJob.objects.filter(pk=job_id, status=TripJob.QUEUED).update(
+            status=TripJob.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            return TripJob.objects.get(pk=job_id)
+
+
+def requeue_stale_jobs(timeout):
+    """Puts jobs left running for more than timeout seconds (e.g. by a killed process) back in the queue."""
+    return TripJob.objects.filter(
+        status=TripJob.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status=TripJob.QUEUED, started_at=None)
+
+
+def commit_job_trip(job, commit):
+    """
+    Runs commit() and records the trip it returns on the job, in one
+    transaction. If an earlier run of the job (one that was requeued as
+    stale while still working) already recorded a trip, returns that trip
+    without calling commit().
+    """
+    with transaction.atomic():
+        trip_id = (
+            TripJob.objects.select_for_update().filter(pk=job.pk).values_list("trip_id", flat=True).first()
+        )
+        if trip_id is not None:
+            return Trip.objects.get(pk=trip_id)
+        trip = commit()
+        TripJob.objects.filter(pk=job.pk).update(trip=trip)
+        return trip
+
+
+def finish_job(job, status_code, result, trip=None):
+    job.status = TripJob.SUCCEEDED if status_code < 400 else TripJob.FAILED
+    job.status_code = status_code
+    job.result = result
+    job.trip = trip
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "status_code", "result", "trip", "finished_at"])
+
+
+class JobRunner:
+    """
+    Runs handler(job) for queued TripJobs on `workers` threads. The handler
+    returns (status_code, result, trip); an exception fails the job with a
+    500. Threads are started on the first submit() or by start(). Stale
+    jobs are requeued on start and then every sweep_interval seconds
+    (stale_timeout / 2 by default).
+    """
+    def __init__(self, handler, workers=2, poll_interval=1.0, stale_timeout=300, sweep_interval=None):
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.sweep_interval = stale_timeout / 2 if sweep_interval is None else sweep_interval
+        self._swept_at = None
+        self._sweep_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._pending = 0
+        self._threads = []
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def submit(self, request_data, eld_format=""):
+        job = TripJob.objects.create(request=request_data, eld_format=eld_format or "")
+        if self.workers:
+            self.start()
+            with self._wakeup:
+                self._pending += 1
+                self._wakeup.notify()
+        return job
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            self.sweep_stale()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"trip-job-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Lets the workers finish their current job and exit."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            with self._wakeup:
+                self._stopping = True
+                self._wakeup.notify_all()
+        for thread in threads:
+            thread.join()
+
+    def sweep_stale(self):
+        """Requeues stale jobs unless this runner did so less than sweep_interval seconds ago."""
+        with self._sweep_lock:
+            now = time.monotonic()
+            if self._swept_at is not None and now - self._swept_at < self.sweep_interval:
+                return 0
+            self._swept_at = now
+        requeued = requeue_stale_jobs(self.stale_timeout)
+        if requeued:
+            logger.warning("Requeued %d stale trip job(s)", requeued)
+        return requeued
+
+    def run_pending(self):
+        """Runs queued jobs in the calling thread until the queue is empty; returns how many ran."""
+        self.sweep_stale()
+        count = 0
+        while True:
+            job = claim_next_job()
+            if job is None:
+                return count
+            self.run(job)
+            count += 1
+
+    def run(self, job):
+        try:
+            status_code, result, trip = self.handler(job)
+        except Exception:
+            logger.exception("Trip job %s failed", job.pk)
+            status_code, result, trip = 500, {"error": "Internal error while calculating the trip."}, None
+        finish_job(job, status_code, result, trip)
+
+    def _work(self):
+        try:
+            while not self._stopping:
+                close_old_connections()
+                self.sweep_stale()
+                job = claim_next_job()
+                if job is not None:
+                    self.run(job)
+                    continue
+                with self._wakeup:
+                    if not self._pending and not self._stopping:
+                        self._wakeup.wait(self.poll_interval)
+                    self._pending = max(0, self._pending - 1)
+        finally:
+            connection.close()
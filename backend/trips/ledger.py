@@ -0,0 +1,82 @@
+"""
+Rolling 70-hour/8-day duty ledger.
+
+Each driver has one DutyLedgerEntry per calendar day holding the on-duty
+minutes logged that day. Hours used in the current cycle are the sum of
+the rows in the 8-day window, read through the (driver, date) index, so
+past hours roll off as the window moves. A trip's first log day is the
+day it is planned on.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .hos import daily_duty_hours
+from .models import DutyLedgerEntry
+
+CYCLE_DAYS = 8
+
+
+def _window(on_date):
+    # Later days are included: hours already booked by multi-day trips still count.
+    return {"date__gt": (on_date or timezone.localdate()) - timedelta(days=CYCLE_DAYS)}
+
+
+def cycle_hours_used(driver_id, on_date=None):
+    """Hours the driver has used in the 8-day window ending on on_date (default today)."""
+    total = DutyLedgerEntry.objects.filter(driver_id=driver_id, **_window(on_date)).aggregate(
+        total=Sum("on_duty_minutes")
+    )["total"]
+    return (total or 0) / 60.0
+
+
+def cycle_hours_by_driver(driver_ids, on_date=None):
+    """cycle_hours_used for several drivers in one query; returns {driver_id: hours}."""
+    totals = (
+        DutyLedgerEntry.objects.filter(driver_id__in=driver_ids, **_window(on_date))
+        .values("driver_id")
+        .annotate(total=Sum("on_duty_minutes"))
+    )
+    hours = {driver_id: 0.0 for driver_id in driver_ids}
+    hours.update({row["driver_id"]: row["total"] / 60.0 for row in totals})
+    return hours
+
+
+def duty_minutes_by_date(daily_logs, start_date=None):
+    """Returns {date: on-duty minutes} for a trip whose first log day is start_date (default today)."""
+    start_date = start_date or timezone.localdate()
+    if not daily_logs:
+        return {}
+    first_day = daily_logs[0]["dayIndex"]
+    minutes = {}
+    for day, hours in zip(daily_logs, daily_duty_hours(daily_logs)):
+        date = start_date + timedelta(days=day["dayIndex"] - first_day)
+        minutes[date] = minutes.get(date, 0) + round(hours * 60)
+    return minutes
+
+
+def record_duty_minutes(minutes_by_driver_date):
+    """Adds {(driver_id, date): minutes} to the ledger."""
+    with transaction.atomic():
+        for (driver_id, date), minutes in minutes_by_driver_date.items():
+            if not minutes:
+                continue
+            entries = DutyLedgerEntry.objects.filter(driver_id=driver_id, date=date)
+            if entries.update(on_duty_minutes=F("on_duty_minutes") + minutes):
+                continue
+            try:
+                with transaction.atomic():
+                    DutyLedgerEntry.objects.create(driver_id=driver_id, date=date, on_duty_minutes=minutes)
+            except IntegrityError:
+                # Another request created the row first.
+                entries.update(on_duty_minutes=F("on_duty_minutes") + minutes)
+
+
+def record_trip_duty(driver_id, daily_logs, start_date=None):
+    """Adds a trip's daily on-duty minutes to the driver's ledger."""
+    record_duty_minutes({
+        (driver_id, date): minutes
+        for date, minutes in duty_minutes_by_date(daily_logs, start_date).items()
+    })
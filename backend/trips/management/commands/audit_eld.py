@@ -0,0 +1,32 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from trips.fleet import FleetEldGrid
+from trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the ELD grids of stored trips and prints per-driver on-duty minutes and violations per slot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Only audit trips created in the last DAYS days.")
+        parser.add_argument("--driver", type=int, help="Only audit this driver's trips.")
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.filter(created_at__gte=timezone.now() - timedelta(days=options["days"]))
+        if options["driver"] is not None:
+            trips = trips.filter(driver_id=options["driver"])
+
+        fleet = FleetEldGrid.from_queryset(trips.order_by("created_at", "id"))
+        on_duty = {}
+        for (driver_id, date), minutes in sorted(fleet.driver_on_duty_minutes().items()):
+            on_duty.setdefault(str(driver_id), {})[date.isoformat()] = minutes
+
+        self.stdout.write(json.dumps({
+            "trip_days": len(fleet),
+            "on_duty_minutes": on_duty,
+            "violations_per_slot": fleet.violations_per_slot().tolist(),
+        }))
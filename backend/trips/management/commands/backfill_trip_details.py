@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from trips.models import Trip, TripDetail
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the route, logs and fuel_stops JSON columns of trips saved before TripDetail existed "
+        "into TripDetail rows and fills in the trip summary columns. Run it after the detail table and "
+        "summary columns are added and before the old JSON columns are dropped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Trips written per transaction.")
+
+    def handle(self, *args, **options):
+        table = Trip._meta.db_table
+        with connection.cursor() as cursor:
+            columns = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+        legacy = [field for field in Trip.ARTIFACT_FIELDS if field in columns]
+        if not legacy:
+            self.stdout.write(f"{table} has no {', '.join(Trip.ARTIFACT_FIELDS)} columns; nothing to backfill.")
+            return
+
+        quote = connection.ops.quote_name
+        query = (
+            f"SELECT t.id, {', '.join('t.' + quote(field) for field in legacy)} FROM {quote(table)} t "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {quote(TripDetail._meta.db_table)} d WHERE d.trip_id = t.id) "
+            f"AND t.id > %s ORDER BY t.id LIMIT %s"
+        )
+        count, last_id = 0, 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(query, [last_id, options["batch_size"]])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            trips = []
+            for trip_id, *values in rows:
+                trip = Trip(pk=trip_id)
+                # JSON columns come back as text on SQLite and decoded on PostgreSQL.
+                trip._artifacts = {
+                    field: json.loads(value) if isinstance(value, str) else value
+                    for field, value in zip(legacy, values)
+                }
+                trip.summarize()
+                trips.append(trip)
+            with transaction.atomic():
+                TripDetail.objects.bulk_create([trip.build_detail() for trip in trips], ignore_conflicts=True)
+                Trip.objects.bulk_update(trips, ["days", "on_duty_hours", "fuel_stop_count"])
+            count += len(trips)
+            last_id = rows[-1][0]
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {count} trip detail(s)."))
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from trips.geocoding import geocode_cache
+from trips.models import Driver
+from trips.polyline import encode_polyline
+from trips.routing import DIRECTIONS_PROFILE, route_cache
+from trips.views import CalculateTripView
+
+# Synthetic lane whose geocodes and route are seeded into the caches, so
+# the benchmarked requests never reach ORS and only the database is measured.
+LANE = {
+    "Benchmark Origin, KS": [-97.3301, 37.6872],
+    "Benchmark Pickup, KS": [-96.7073, 38.8403],
+    "Benchmark Dropoff, NE": [-96.0419, 41.2565],
+}
+LANE_METERS = 80467  # 50 miles
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures CalculateTripView write throughput on the configured database: "
+        "concurrent trip requests for a few drivers, with ORS answered from the caches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--drivers", type=int, default=8, help="Drivers the requests are spread over.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark drivers and trips.")
+
+    def handle(self, *args, **options):
+        for address, coords in LANE.items():
+            geocode_cache.set(address, coords)
+        # Trip requests look the route up with its geometry; a summary without one would miss.
+        route_cache.set(list(LANE.values()), DIRECTIONS_PROFILE, {
+            "distance": LANE_METERS, "duration": 3600, "geometry": encode_polyline(list(LANE.values())),
+        })
+        drivers = [Driver.objects.create(name=f"Benchmark driver {n}") for n in range(options["drivers"])]
+
+        view = CalculateTripView.as_view()
+        factory = APIRequestFactory()
+        origin, pickup, dropoff = LANE
+        latencies = []
+        errors = []
+        counter = iter(range(options["requests"]))
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        number = next(counter, None)
+                    if number is None:
+                        return
+                    request = factory.post("/api/calculate-trip/", {
+                        "driverId": drivers[number % len(drivers)].id,
+                        "currentLocation": origin,
+                        "pickupLocation": pickup,
+                        "dropoffLocation": dropoff,
+                    }, format="json")
+                    started = time.perf_counter()
+                    response = view(request)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        if response.status_code != 201:
+                            errors.append({"status": response.status_code, "body": response.data})
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+        if not options["keep"]:
+            Driver.objects.filter(pk__in=[driver.pk for driver in drivers]).delete()
+
+        latencies.sort()
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else 0.0
+
+        self.stdout.write(json.dumps({
+            "backend": connection.vendor,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "drivers": options["drivers"],
+            "seconds": round(seconds, 3),
+            "trips_per_second": round(len(latencies) / seconds, 1) if seconds else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "errors": len(errors),
+            "error_samples": errors[:3],
+        }, indent=2))
@@ -0,0 +1,248 @@
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+import uuid
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; max RSS is then omitted.
+    resource = None
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from trips.eld import build_eld_log_form, pack_eld
+from trips.fake_ors import FakeORSServer, fake_coordinates
+from trips.geocoding import normalize_address
+from trips.hos import AVERAGE_SPEED, simulate_hos
+from trips.hos_reference import simulate_hos_stepwise
+from trips.models import Driver, GeocodeCacheEntry, RouteCacheEntry
+from trips.planner import plan_trip
+from trips.routing import DIRECTIONS_PROFILE, route_cache
+from trips.views import CalculateTripView, directions_flights, geocode_flights
+
+# Trip lengths (miles) and cycle hours already used for the HOS/ELD
+# microbenchmarks: a short haul, a multi-day trip and one that runs into
+# the 70-hour cycle limit.
+MICRO_SCENARIOS = {
+    "short": (250, 10.0),
+    "long": (2500, 20.0),
+    "cycle_limit": (4000, 40.0),
+}
+# Timing rounds per microbenchmark; the fastest round is reported.
+MICRO_ROUNDS = 5
+# Timings that got slower (or throughput that dropped) by more than this
+# fraction against --baseline are reported as regressions.
+REGRESSION_TOLERANCE = 0.10
+
+
+def _percentile(ordered, p):
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2) if ordered else 0.0
+
+
+def _max_rss_kib():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _microbenchmark(func):
+    """Returns the best per-call time over MICRO_ROUNDS rounds and the peak traced allocation of one call."""
+    timer = timeit.Timer(func)
+    calls, _ = timer.autorange()
+    best = min(timer.repeat(repeat=MICRO_ROUNDS, number=calls)) / calls
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"calls_per_round": calls, "per_call_us": round(best * 10**6, 2), "peak_kib": round(peak / 1024, 1)}
+
+
+def run_microbenchmarks():
+    results = {}
+    for name, (miles, cycle_used) in MICRO_SCENARIOS.items():
+        hours = miles / AVERAGE_SPEED
+        _, daily_logs = simulate_hos(hours, cycle_used)
+        results[f"hos.simulate_hos_stepwise[{name}]"] = _microbenchmark(lambda: simulate_hos_stepwise(hours, cycle_used))
+        results[f"hos.simulate_hos[{name}]"] = _microbenchmark(lambda: simulate_hos(hours, cycle_used))
+        results[f"planner.plan_trip[{name}]"] = _microbenchmark(lambda: plan_trip(miles, cycle_used))
+        results[f"eld.build_eld_log_form[{name}]"] = _microbenchmark(lambda: build_eld_log_form(daily_logs))
+        results[f"eld.build_eld_log_form_compact[{name}]"] = _microbenchmark(
+            lambda: build_eld_log_form(daily_logs, compact=True)
+        )
+        results[f"eld.pack_eld[{name}]"] = _microbenchmark(lambda: pack_eld(daily_logs))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks trip planning: HOS and ELD microbenchmarks, and /api/calculate-trip/ throughput, "
+        "latency percentiles and memory against an in-process fake ORS server. Results are written as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--drivers", type=int, default=8, help="Drivers the requests are spread over.")
+        parser.add_argument("--ors-latency", type=float, default=0.05, help="Fake ORS latency in seconds.")
+        parser.add_argument("--ors-jitter", type=float, default=0.02)
+        parser.add_argument("--ors-error-rate", type=float, default=0.0)
+        parser.add_argument("--ors-rate-limit", type=int, default=0,
+                            help="Requests per minute per ORS endpoint through the shared limiter (0: off).")
+        parser.add_argument("--warm", action="store_true",
+                            help="Reuse one lane, so requests after the first are served from the caches.")
+        parser.add_argument("--skip-micro", action="store_true")
+        parser.add_argument("--skip-load", action="store_true")
+        parser.add_argument("--output", help="Result file (default: benchmarks/<timestamp>.json).")
+        parser.add_argument("--baseline", help="Earlier result file to compare against.")
+
+    def handle(self, *args, **options):
+        results = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "database": connection.vendor,
+            },
+        }
+        if not options["skip_micro"]:
+            results["micro"] = run_microbenchmarks()
+        if not options["skip_load"]:
+            results["load"] = self.run_load(options)
+
+        output = Path(options["output"] or Path(settings.BASE_DIR) / "benchmarks" /
+                      f"{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options["baseline"]:
+            self.compare(json.loads(Path(options["baseline"]).read_text()), results)
+
+    def run_load(self, options):
+        run = uuid.uuid4().hex[:8]
+        drivers = [Driver.objects.create(name=f"Benchmark driver {run}-{n}") for n in range(options["drivers"])]
+
+        def stops(number):
+            lane = 0 if options["warm"] else number
+            return [f"Benchmark {run} {lane} {stop}" for stop in ("Origin", "Pickup", "Dropoff")]
+
+        view = CalculateTripView.as_view()
+        factory = APIRequestFactory()
+        latencies = []
+        status_counts = {}
+        counter = iter(range(options["requests"]))
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        number = next(counter, None)
+                    if number is None:
+                        return
+                    current, pickup, dropoff = stops(number)
+                    request = factory.post("/api/calculate-trip/", {
+                        "driverId": drivers[number % len(drivers)].id,
+                        "currentLocation": current,
+                        "pickupLocation": pickup,
+                        "dropoffLocation": dropoff,
+                    }, format="json")
+                    started = time.perf_counter()
+                    response = view(request)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+            finally:
+                connection.close()
+
+        server = FakeORSServer(
+            latency=options["ors_latency"],
+            jitter=options["ors_jitter"],
+            error_rate=options["ors_error_rate"],
+        )
+        rate = options["ors_rate_limit"]
+        rss_before = _max_rss_kib()
+        with server, tempfile.TemporaryDirectory() as directory, override_settings(
+            ORS_BASE_URL=server.url,
+            ORS_RATE_LIMIT_PATH=os.path.join(directory, "ratelimit.sqlite3"),
+            ORS_RATE_LIMITS={"geocode": rate, "directions": rate, "matrix": rate},
+        ):
+            threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - started
+
+        lanes = {tuple(stops(number)) for number in range(options["requests"])}
+        GeocodeCacheEntry.objects.filter(address__startswith=normalize_address(f"Benchmark {run} ")).delete()
+        RouteCacheEntry.objects.filter(key__in=[
+            route_cache.key([fake_coordinates(address) for address in lane], DIRECTIONS_PROFILE) for lane in lanes
+        ]).delete()
+        Driver.objects.filter(pk__in=[driver.pk for driver in drivers]).delete()
+
+        latencies.sort()
+        return {
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "warm": options["warm"],
+            "ors_latency_ms": options["ors_latency"] * 1000,
+            "ors_error_rate": options["ors_error_rate"],
+            "ors_rate_limit": rate,
+            "seconds": round(seconds, 3),
+            "requests_per_second": round(len(latencies) / seconds, 1) if seconds else 0.0,
+            "p50_ms": _percentile(latencies, 0.50),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+            "status_counts": {str(code): count for code, count in sorted(status_counts.items())},
+            "ors_requests": server.counts,
+            "ors_injected_errors": server.errors,
+            "coalesced": {"geocode": geocode_flights.stats(), "directions": directions_flights.stats()},
+            "max_rss_kib_before": rss_before,
+            "max_rss_kib_after": _max_rss_kib(),
+        }
+
+    def compare(self, baseline, results):
+        """Prints the change of every timing against the baseline; slower than REGRESSION_TOLERANCE is flagged."""
+        rows = []
+        for name, micro in results.get("micro", {}).items():
+            if name in baseline.get("micro", {}):
+                rows.append((name, baseline["micro"][name]["per_call_us"], micro["per_call_us"], False))
+        if "load" in results and "load" in baseline:
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                rows.append((f"load.{metric}", baseline["load"][metric], results["load"][metric], False))
+            rows.append(("load.requests_per_second", baseline["load"]["requests_per_second"],
+                         results["load"]["requests_per_second"], True))
+
+        regressions = 0
+        for name, before, after, higher_is_better in rows:
+            if not before:
+                continue
+            change = (after - before) / before
+            line = f"{name}: {before} -> {after} ({change:+.1%})"
+            if (-change if higher_is_better else change) > REGRESSION_TOLERANCE:
+                regressions += 1
+                self.stdout.write(self.style.WARNING(f"REGRESSION {line}"))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(f"{regressions} regression(s) beyond {REGRESSION_TOLERANCE:.0%}.")
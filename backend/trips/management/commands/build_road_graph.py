@@ -0,0 +1,41 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.roadgraph import build_road_graph, open_extract, read_osm
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the offline routing graph (ROAD_GRAPH_PATH) from an OSM XML extract (.osm, .osm.gz or "
+        ".osm.bz2). Convert .pbf extracts first, e.g. `osmium cat region.osm.pbf -o region.osm.bz2`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("extract", help="Path to the OSM XML extract.")
+        parser.add_argument("--output", help="Graph file to write (default: ROAD_GRAPH_PATH).")
+
+    def handle(self, *args, **options):
+        output = str(options["output"] or settings.ROAD_GRAPH_PATH)
+        started = time.monotonic()
+        try:
+            with open_extract(options["extract"]) as source:
+                coords, ways = read_osm(source)
+        except (OSError, SyntaxError) as exc:
+            raise CommandError(f"Cannot read {options['extract']}: {exc}")
+        self.stdout.write(f"Read {len(coords)} nodes and {len(ways)} drivable ways.")
+
+        # Write next to the target and swap it in, so running workers that
+        # have the old file mapped keep a consistent view of it.
+        partial = f"{output}.partial"
+        try:
+            nodes, edges = build_road_graph(coords, ways, partial)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        os.replace(partial, output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output}: {nodes} nodes, {edges} edges ({os.path.getsize(output) / 2**20:.1f} MiB) "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,58 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trips.geocoding import normalize_address
+from trips.models import GazetteerEntry
+
+# Rows inserted per bulk_create call.
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports places or facilities into the local gazetteer from a CSV file with a header row and the "
+        "columns name, latitude, longitude and optionally kind (place/facility) and weight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import.")
+        parser.add_argument("--kind", choices=[GazetteerEntry.PLACE, GazetteerEntry.FACILITY],
+                            default=GazetteerEntry.PLACE, help="Kind for rows without a kind column.")
+        parser.add_argument("--replace", action="store_true", help="Delete existing entries of the imported kinds first.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as source:
+                entries = [self.entry(row, options["kind"], number) for number, row in enumerate(csv.DictReader(source), 2)]
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        with transaction.atomic():
+            if options["replace"]:
+                GazetteerEntry.objects.filter(kind__in={entry.kind for entry in entries}).delete()
+            GazetteerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(entries)} gazetteer entries; running workers pick them up within "
+            f"GAZETTEER['REFRESH_SECONDS']."
+        ))
+
+    def entry(self, row, default_kind, number):
+        try:
+            kind = (row.get("kind") or default_kind).strip().lower()
+            if kind not in (GazetteerEntry.PLACE, GazetteerEntry.FACILITY):
+                raise ValueError(f"unknown kind {kind!r}")
+            name = row["name"].strip()
+            if not name:
+                raise ValueError("empty name")
+            return GazetteerEntry(
+                name=name,
+                normalized=normalize_address(name),
+                kind=kind,
+                longitude=float(row["longitude"]),
+                latitude=float(row["latitude"]),
+                weight=int(row.get("weight") or 0),
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            raise CommandError(f"Line {number}: invalid row ({exc}).")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from trips.routing import route_cache
+
+
+class Command(BaseCommand):
+    help = "Invalidates cached directions summaries (all, per profile, or older than N hours)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profile", help="Only invalidate routes for this ORS profile, e.g. driving-hgv.")
+        parser.add_argument("--older-than", type=float, metavar="HOURS",
+                            help="Only invalidate routes cached more than HOURS ago.")
+
+    def handle(self, *args, **options):
+        older_than = options["older_than"]
+        deleted = route_cache.invalidate(
+            profile=options["profile"],
+            older_than=older_than * 3600 if older_than is not None else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Invalidated {deleted} cached route(s)."))
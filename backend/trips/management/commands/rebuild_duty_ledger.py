@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from trips.ledger import duty_minutes_by_date, record_duty_minutes
+from trips.models import DutyLedgerEntry, Trip, unpack_json
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-driver daily duty ledger from the logs of stored trips."
+
+    def handle(self, *args, **options):
+        minutes = {}
+        trips = Trip.objects.values_list("driver_id", "created_at", "detail__payload").iterator(chunk_size=2000)
+        for driver_id, created_at, payload in trips:
+            logs = unpack_json(payload)["logs"] if payload else None
+            for date, day_minutes in duty_minutes_by_date(logs, timezone.localdate(created_at)).items():
+                minutes[(driver_id, date)] = minutes.get((driver_id, date), 0) + day_minutes
+
+        with transaction.atomic():
+            DutyLedgerEntry.objects.all().delete()
+            record_duty_minutes(minutes)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(minutes)} ledger day(s)."))
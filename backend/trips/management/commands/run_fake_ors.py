@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from trips.fake_ors import FakeORSServer
+
+
+class Command(BaseCommand):
+    help = "Serves a local fake OpenRouteService API (point ORS_BASE_URL at it) for development and load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8800)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds around --latency.")
+        parser.add_argument("--error-rate", type=float, default=0.0,
+                            help="Fraction of requests answered with 429 or 503.")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        server = FakeORSServer(
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        self.stdout.write(f"Fake ORS listening on {server.url}; press Ctrl+C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+            self.stdout.write(f"Requests: {server.counts} errors: {server.errors}")
@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trips.views import job_runner
+
+
+class Command(BaseCommand):
+    help = "Runs queued trip jobs on a pool of worker threads (for TRIP_JOB_WORKERS=0 web processes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=max(settings.TRIP_JOB_WORKERS, 1),
+                            help="Number of worker threads.")
+        parser.add_argument("--once", action="store_true", help="Run the queued jobs and exit.")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            count = job_runner.run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} job(s)."))
+            return
+
+        job_runner.workers = options["workers"]
+        job_runner.start()
+        self.stdout.write(f"Running trip jobs with {job_runner.workers} worker(s); press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            job_runner.stop()
@@ -0,0 +1,148 @@
+from django.conf import settings
+
+from .ors import get_client, ors_executor
+from .routing import DIRECTIONS_PROFILE, route_cache
+
+
+def _chunk_sizes(origin_count, destination_count, max_locations, max_elements):
+    """
+    Picks the largest origin/destination chunk sizes such that one request
+    has at most max_locations locations and max_elements cells.
+    """
+    destinations = max(1, min(destination_count, max_locations // 2))
+    origins = max(1, min(origin_count, max_locations - destinations, max_elements // destinations))
+    destinations = max(1, min(destination_count, max_locations - origins, max_elements // origins))
+    return origins, destinations
+
+
+class MatrixDistanceService:
+    """
+    Distance/duration lookups for many origin -> destination pairs using the
+    ORS matrix endpoint instead of one directions call per pair.
+
+    Cells are cached in the route cache as two-point routes, so they are
+    shared with get_route_summary and survive restarts. Uncached cells are
+    requested in chunks that respect the provider limits
+    (ORS_MATRIX_MAX_LOCATIONS / ORS_MATRIX_MAX_ELEMENTS), with the chunks
+    sent concurrently on the shared ORS pool.
+    """
+    def __init__(self, profile=DIRECTIONS_PROFILE, max_locations=None, max_elements=None, cache=route_cache):
+        self.profile = profile
+        self.max_locations = max_locations or settings.ORS_MATRIX_MAX_LOCATIONS
+        self.max_elements = max_elements or settings.ORS_MATRIX_MAX_ELEMENTS
+        self.cache = cache
+        self.requests = 0
+
+    def lookup(self, origins, destinations):
+        """
+        Returns a len(origins) x len(destinations) grid where each cell is
+        {"distance": meters, "duration": seconds}, or None when ORS found no
+        route between the two points.
+        """
+        keys = [[self.cache.key([origin, destination], self.profile) for destination in destinations]
+                for origin in origins]
+        cells = self.cache.get_many({key for row in keys for key in row})
+
+        missing_origins = {}
+        missing_destinations = {}
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                if keys[i][j] not in cells:
+                    missing_origins.setdefault(tuple(origin), origin)
+                    missing_destinations.setdefault(tuple(destination), destination)
+        if missing_origins:
+            cells.update(self._fetch(list(missing_origins.values()), list(missing_destinations.values())))
+
+        return [[cells.get(key) for key in row] for row in keys]
+
+    def route_summary(self, route_coords):
+        """
+        Same contract as views.get_route_summary (without geometry): sums the
+        matrix cells of each consecutive leg of route_coords.
+        """
+        grid = self.lookup(route_coords[:-1], route_coords[1:])
+        distance = 0.0
+        duration = 0.0
+        for leg in range(len(route_coords) - 1):
+            cell = grid[leg][leg]
+            if cell is None:
+                raise Exception(f"Directions API error: no route between {route_coords[leg]} and {route_coords[leg + 1]}")
+            distance += cell["distance"]
+            duration += cell["duration"]
+        return {"distance": distance, "duration": duration}
+
+    def request_count(self, origin_count, destination_count):
+        """Upper bound on the matrix requests lookup() sends for an uncached origin x destination grid."""
+        origin_chunk, destination_chunk = _chunk_sizes(
+            origin_count, destination_count, self.max_locations, self.max_elements
+        )
+        return -(-origin_count // origin_chunk) * -(-destination_count // destination_chunk)
+
+    def lane_summaries(self, lanes):
+        """
+        route_summary() for many routes at once: {key: route_coords} in,
+        {key: summary or Exception} out. All legs go into one grid of their
+        distinct start and end points, so lanes sharing stops (a yard, a
+        distribution center) share cells and requests.
+        """
+        origins = list({tuple(point): point for coords in lanes.values() for point in coords[:-1]}.values())
+        destinations = list({tuple(point): point for coords in lanes.values() for point in coords[1:]}.values())
+        grid = self.lookup(origins, destinations)
+        row = {tuple(point): i for i, point in enumerate(origins)}
+        column = {tuple(point): j for j, point in enumerate(destinations)}
+
+        summaries = {}
+        for key, coords in lanes.items():
+            distance = 0.0
+            duration = 0.0
+            for start, end in zip(coords, coords[1:]):
+                cell = grid[row[tuple(start)]][column[tuple(end)]]
+                if cell is None:
+                    summaries[key] = Exception(f"Directions API error: no route between {start} and {end}")
+                    break
+                distance += cell["distance"]
+                duration += cell["duration"]
+            else:
+                summaries[key] = {"distance": distance, "duration": duration}
+        return summaries
+
+    def _fetch(self, origins, destinations):
+        origin_chunk, destination_chunk = _chunk_sizes(
+            len(origins), len(destinations), self.max_locations, self.max_elements
+        )
+        futures = [
+            ors_executor.submit(
+                self._fetch_chunk,
+                origins[i:i + origin_chunk],
+                destinations[j:j + destination_chunk],
+            )
+            for i in range(0, len(origins), origin_chunk)
+            for j in range(0, len(destinations), destination_chunk)
+        ]
+        cells = {}
+        for future in futures:
+            cells.update(future.result())
+        routable = {key: cell for key, cell in cells.items() if cell is not None}
+        if routable:
+            self.cache.set_many(self.profile, routable)
+        return routable
+
+    def _fetch_chunk(self, origins, destinations):
+        self.requests += 1
+        response = get_client().matrix(
+            origins + destinations,
+            sources=list(range(len(origins))),
+            destinations=list(range(len(origins), len(origins) + len(destinations))),
+            profile=self.profile,
+        )
+        if response.status_code != 200:
+            raise Exception("Matrix API error: " + response.text)
+        data = response.json()
+        cells = {}
+        for i, origin in enumerate(origins):
+            for j, destination in enumerate(destinations):
+                distance = data["distances"][i][j]
+                duration = data["durations"][i][j]
+                key = self.cache.key([origin, destination], self.profile)
+                cells[key] = None if distance is None else {"distance": distance, "duration": duration}
+        return cells
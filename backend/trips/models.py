@@ -16,12 +16,28 @@
 #         return f"Trip {self.id}: {self.pickup_location} to {self.dropoff_location}"
 
 
+import json
+import zlib
+
 from django.db import models
 
+from .eld import pack_eld
+from .hos import daily_duty_hours
+
+
+def pack_json(value):
+    """Compact JSON, zlib-compressed, for TripDetail.payload."""
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode(), 6)
+
+
+def unpack_json(payload):
+    return json.loads(zlib.decompress(payload))
+
+
 class Driver(models.Model):
     name = models.CharField(max_length=255)
     # Cumulative cycle hours used during the current 70-hour cycle.
-    current_cycle_hours_used = models.DecimalField(max_digits=4, decimal_places=2, default=0.0)
+    current_cycle_hours_used = models.DecimalField(max_digits=8, decimal_places=2, default=0.0)
     # When the current cycle started; helps determine the 8-day period.
     cycle_start_date = models.DateField(auto_now_add=True)
     # Optionally store aggregated weekly (70hr/8-day) logs.
@@ -30,6 +46,31 @@ class Driver(models.Model):
     def __str__(self):
         return self.name
 
+class TripQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Also fills in the summary columns and bulk-inserts the TripDetail rows."""
+        objs = list(objs)
+        for trip in objs:
+            trip.summarize()
+        created = super().bulk_create(objs, *args, **kwargs)
+        TripDetail.objects.bulk_create([trip.build_detail() for trip in created if trip._artifacts_changed])
+        for trip in created:
+            trip._artifacts_changed = False
+        return created
+
+
+def _artifact(name):
+    def get(trip):
+        return trip.artifacts.get(name)
+
+    def set(trip, value):
+        trip.artifacts[name] = value
+        trip._artifacts_changed = True
+        trip._eld = None
+
+    return property(get, set, doc=f"Trip.{name}, stored compressed in TripDetail and loaded on first access.")
+
+
 class Trip(models.Model):
     # Each trip is linked to a driver.
     driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name="trips")
@@ -37,14 +78,210 @@ class Trip(models.Model):
     pickup_location = models.CharField(max_length=255)
     dropoff_location = models.CharField(max_length=255)
     # This field captures the on-duty hours consumed during the trip.
-    cycle_hours_used = models.DecimalField(max_digits=4, decimal_places=2)
+    cycle_hours_used = models.DecimalField(max_digits=6, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    route = models.JSONField(blank=True, null=True)
-    logs = models.JSONField(blank=True, null=True)
     distance = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
-    fuel_stops = models.JSONField(blank=True, null=True)
+    # Summary of the logs, kept on the row for filtering without loading them.
+    days = models.PositiveSmallIntegerField(default=0)
+    on_duty_hours = models.FloatField(default=0)
+    fuel_stop_count = models.PositiveSmallIntegerField(default=0)
+
+    # The large JSON documents live in TripDetail.
+    ARTIFACT_FIELDS = ("route", "logs", "fuel_stops")
+    route = _artifact("route")
+    logs = _artifact("logs")
+    fuel_stops = _artifact("fuel_stops")
+
+    _artifacts = None
+    _artifacts_changed = False
+    _eld = None
+
+    objects = TripQuerySet.as_manager()
+
+    class Meta:
+        # Trip history pages: one driver's trips, or all trips, newest first.
+        indexes = [
+            models.Index(fields=["driver", "created_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    @property
+    def artifacts(self):
+        """{"route", "logs", "fuel_stops"}, read from TripDetail (or a prefetched detail) once."""
+        if self._artifacts is None:
+            self._artifacts = {}
+            if self.pk is not None:
+                try:
+                    self._artifacts = unpack_json(self.detail.payload)
+                except TripDetail.DoesNotExist:
+                    pass
+        return self._artifacts
+
+    def summarize(self):
+        logs = self.logs or []
+        self.days = len(logs)
+        self.on_duty_hours = round(sum(daily_duty_hours(logs)), 2)
+        self.fuel_stop_count = len(self.fuel_stops or [])
+
+    @property
+    def eld(self):
+        """The ELD grid in the stored encoding of trips.eld.pack_eld."""
+        if self._eld is None:
+            if self._artifacts_changed or self.pk is None:
+                self._eld = pack_eld(self.logs)
+            else:
+                try:
+                    self._eld = bytes(self.detail.eld)
+                except TripDetail.DoesNotExist:
+                    self._eld = b""
+        return self._eld
+
+    def build_detail(self):
+        self._eld = pack_eld(self.logs)
+        return TripDetail(trip=self, payload=pack_json(self.artifacts), eld=self._eld)
+
+    def save(self, *args, **kwargs):
+        changed = self._artifacts_changed
+        if changed:
+            self.summarize()
+        super().save(*args, **kwargs)
+        if changed:
+            detail = self.build_detail()
+            TripDetail.objects.update_or_create(trip=self, defaults={"payload": detail.payload, "eld": detail.eld})
+            self._artifacts_changed = False
 
     def __str__(self):
         return f"Trip {self.id}: {self.pickup_location} to {self.dropoff_location}"
 
+
+class TripDetail(models.Model):
+    """
+    Route, logs and fuel stops of a trip as zlib-compressed JSON (see
+    Trip.artifacts), plus its ELD grid, computed once at save time.
+    """
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name="detail")
+    payload = models.BinaryField()
+    # ELD grid in the encoding of trips.eld.pack_eld (98 bytes per day).
+    eld = models.BinaryField(default=b"")
+
+    def __str__(self):
+        return f"Trip {self.trip_id} detail ({len(self.payload)} bytes)"
+
+
+class DutyLedgerEntry(models.Model):
+    # One row per driver per calendar day; see trips.ledger.
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name="duty_ledger")
+    date = models.DateField()
+    # On-duty minutes (every status except "Off Duty") logged for that day.
+    on_duty_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Also the (driver, date) index behind the rolling-window sum.
+        constraints = [
+            models.UniqueConstraint(fields=["driver", "date"], name="unique_driver_duty_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_id} {self.date}: {self.on_duty_minutes} min"
+
+
+class TripJob(models.Model):
+    """A queued calculate-trip request, run by the workers in trips.jobs."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    # The calculate-trip request body plus the requested ELD format.
+    request = models.JSONField()
+    eld_format = models.CharField(max_length=16, blank=True, default="")
+    # Response body of the finished calculation and its HTTP status.
+    result = models.JSONField(blank=True, null=True)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    trip = models.ForeignKey(Trip, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        # Workers claim the oldest queued job.
+        indexes = [models.Index(fields=["status", "id"])]
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def __str__(self):
+        return f"TripJob {self.id}: {self.status}"
+
+
+class GeocodeCacheEntry(models.Model):
+    # Normalized address string (see trips.geocoding.normalize_address).
+    address = models.CharField(max_length=255, unique=True)
+    # The address as it was typed, shown by the autocomplete.
+    label = models.CharField(max_length=255, blank=True, default="")
+    longitude = models.FloatField()
+    latitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed on every database hit; used for TTL expiry and eviction.
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.address} -> ({self.longitude}, {self.latitude})"
+
+class GazetteerEntry(models.Model):
+    """
+    A named place or facility for the local geocoder (trips.gazetteer),
+    imported with `manage.py import_gazetteer`.
+    """
+    PLACE = "place"
+    FACILITY = "facility"
+    KIND_CHOICES = [(PLACE, "Place"), (FACILITY, "Facility")]
+
+    name = models.CharField(max_length=255)
+    # Normalized name (see trips.geocoding.normalize_address).
+    normalized = models.CharField(max_length=255, db_index=True)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=PLACE)
+    longitude = models.FloatField()
+    latitude = models.FloatField()
+    # Ranking among suggestions with the same match quality (e.g. population).
+    weight = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} -> ({self.longitude}, {self.latitude})"
+
+class RouteCacheEntry(models.Model):
+    # Profile plus quantized coordinates (see trips.routing.route_cache_key).
+    key = models.CharField(max_length=255, unique=True)
+    profile = models.CharField(max_length=32)
+    # Summary in ORS units: meters and seconds.
+    distance = models.FloatField()
+    duration = models.FloatField()
+    # Encoded polyline, only kept when the caller asked for geometry.
+    geometry = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.distance:.0f} m"
+
+class CacheGeneration(models.Model):
+    """
+    Generation counter of a shared cache. Invalidating the cache bumps it,
+    and every process drops its in-memory tier when it sees a new value
+    (see trips.routing.RouteCache).
+    """
+    name = models.CharField(max_length=64, unique=True)
+    value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
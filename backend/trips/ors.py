@@ -0,0 +1,393 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .ratelimit import RateLimitExceeded, TokenBucketLimiter
+
+try:
+    import httpx
+except ImportError:  # Only needed by AsyncORSClient.
+    httpx = None
+
+load_dotenv()
+
+# Responses worth retrying: rate limiting and transient server errors.
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Longest wait for a rate-limit slot in the current context; None means
+# ORS_RATE_LIMIT_MAX_WAIT. Set with rate_limit_max_wait().
+_rate_limit_max_wait = contextvars.ContextVar("ors_rate_limit_max_wait", default=None)
+
+
+@contextmanager
+def rate_limit_max_wait(seconds):
+    """
+    Lets ORS calls made inside the block (and lookups submitted from it to
+    ors_executor) queue up to seconds for a rate-limit slot. Batch and
+    background callers use it to be paced at the quota instead of being
+    answered ORSRateLimited as soon as the queue is longer than the
+    interactive limit.
+    """
+    token = _rate_limit_max_wait.set(seconds)
+    try:
+        yield
+    finally:
+        _rate_limit_max_wait.reset(token)
+
+
+class ORSError(Exception):
+    """Raised when an ORS request cannot be completed at all (network errors, exhausted retries)."""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ORSRateLimited(ORSError):
+    """Raised without calling ORS when the shared rate limit has no slot within the allowed wait."""
+    def __init__(self, message, retry_after):
+        super().__init__(message, status_code=503)
+        self.retry_after = retry_after
+
+
+class EndpointMetrics:
+    """Latency and outcome counters for one ORS endpoint."""
+    SAMPLE_SIZE = 1024
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.queued_seconds = 0.0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = deque(maxlen=self.SAMPLE_SIZE)
+
+    def record(self, seconds, ok, retried):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+        if retried:
+            self.retries += 1
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "queued_seconds": round(self.queued_seconds, 3),
+            "avg_ms": (self.total_seconds / self.count * 1000) if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class BaseORSClient:
+    """Configuration, request building, retry policy and metrics shared by the sync and async clients."""
+    def __init__(self, api_key, base_url="https://api.openrouteservice.org",
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=2,
+                 backoff_base=0.25, backoff_max=4.0, pool_size=10, rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def geocode_request(self, text, size=1):
+        params = {
+            "api_key": self.api_key,
+            "text": text,
+            "size": size,
+        }
+        return "geocode", "GET", "/geocode/search", {"params": params}
+
+    def directions_request(self, coordinates, profile="driving-car", **options):
+        body = {"coordinates": coordinates, **options}
+        return "directions", "POST", f"/v2/directions/{profile}", {"json": body, "headers": self._auth_headers()}
+
+    def matrix_request(self, locations, sources=None, destinations=None, profile="driving-car",
+                       metrics=("distance", "duration")):
+        body = {"locations": locations, "metrics": list(metrics), "units": "m"}
+        if sources is not None:
+            body["sources"] = sources
+        if destinations is not None:
+            body["destinations"] = destinations
+        return "matrix", "POST", f"/v2/matrix/{profile}", {"json": body, "headers": self._auth_headers()}
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {endpoint: m.snapshot() for endpoint, m in self._metrics.items()}
+
+    def _auth_headers(self):
+        return {
+            "Authorization": self.api_key,
+            "Content-Type": "application/json",
+        }
+
+    def _endpoint_metrics(self, endpoint):
+        metrics = self._metrics.get(endpoint)
+        if metrics is None:
+            metrics = self._metrics[endpoint] = EndpointMetrics()
+        return metrics
+
+    def _record(self, endpoint, seconds, ok, retried):
+        with self._metrics_lock:
+            self._endpoint_metrics(endpoint).record(seconds, ok, retried)
+
+    def _reserve(self, endpoint):
+        """
+        Reserves a slot for one attempt from the shared rate limiter and
+        returns the seconds to wait for it; raises ORSRateLimited when the
+        limiter is saturated (see rate_limit_max_wait).
+        """
+        if self.rate_limiter is None:
+            return 0.0
+        try:
+            wait = self.rate_limiter.reserve(endpoint, _rate_limit_max_wait.get())
+        except RateLimitExceeded as exc:
+            with self._metrics_lock:
+                self._endpoint_metrics(endpoint).rate_limited += 1
+            raise ORSRateLimited(
+                f"ORS {endpoint} rate limit reached; try again in {exc.retry_after:.0f}s.", exc.retry_after
+            )
+        if wait:
+            with self._metrics_lock:
+                self._endpoint_metrics(endpoint).queued_seconds += wait
+        return wait
+
+    def _backoff(self, attempt, response):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+class ORSClient(BaseORSClient):
+    """
+    Shared OpenRouteService client.
+
+    Uses one requests.Session with a keep-alive connection pool, so repeat
+    calls reuse TLS connections. Every call has (connect, read) timeouts;
+    429/5xx responses and connection errors are retried up to max_retries
+    times with full-jitter exponential backoff (Retry-After is honored).
+    Every attempt first takes a slot from the shared rate limiter, if any.
+    Per-endpoint latency metrics are available through metrics().
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, endpoint, method, path, **kwargs):
+        """
+        Performs an HTTP request against ORS and returns the final response.
+        Non-retryable responses (including 4xx) are returned as-is for the
+        caller to interpret; ORSError is raised only when no response could
+        be obtained.
+        """
+        url = f"{self.base_url}{path}"
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            wait = self._reserve(endpoint)
+            if wait:
+                time.sleep(wait)
+            started = time.monotonic()
+            try:
+                response = self.session.request(
+                    method, url, timeout=(self.connect_timeout, self.read_timeout), **kwargs
+                )
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                response = None
+                error = exc
+            retryable = response is None or response.status_code in RETRY_STATUS_CODES
+            self._record(endpoint, time.monotonic() - started, ok=not retryable, retried=attempt > 0)
+
+            if not retryable or attempt == self.max_retries:
+                break
+            time.sleep(self._backoff(attempt, response))
+
+        if response is None:
+            raise ORSError(f"ORS {endpoint} request failed: {error}")
+        return response
+
+    def geocode(self, text, size=1):
+        endpoint, method, path, kwargs = self.geocode_request(text, size)
+        return self.request(endpoint, method, path, **kwargs)
+
+    def directions(self, coordinates, profile="driving-car", **options):
+        endpoint, method, path, kwargs = self.directions_request(coordinates, profile, **options)
+        return self.request(endpoint, method, path, **kwargs)
+
+    def matrix(self, locations, sources=None, destinations=None, profile="driving-car",
+               metrics=("distance", "duration")):
+        endpoint, method, path, kwargs = self.matrix_request(locations, sources, destinations, profile, metrics)
+        return self.request(endpoint, method, path, **kwargs)
+
+
+class AsyncORSClient(BaseORSClient):
+    """
+    Non-blocking counterpart of ORSClient for async views, built on an
+    httpx.AsyncClient with the same pool size, timeouts and retry policy.
+    Responses expose status_code, text, headers and json() like requests'.
+    An instance is tied to the event loop it was created on; use
+    get_async_client().
+    """
+    def __init__(self, *args, **kwargs):
+        if httpx is None:
+            raise ImportError("AsyncORSClient requires the httpx package.")
+        super().__init__(*args, **kwargs)
+        self.session = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def request(self, endpoint, method, path, **kwargs):
+        url = f"{self.base_url}{path}"
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            # The limiter's SQLite transaction can block on a busy file; keep it off the loop.
+            wait = await asyncio.to_thread(self._reserve, endpoint)
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.monotonic()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+                error = None
+            except (httpx.TransportError, httpx.TimeoutException) as exc:
+                response = None
+                error = exc
+            retryable = response is None or response.status_code in RETRY_STATUS_CODES
+            self._record(endpoint, time.monotonic() - started, ok=not retryable, retried=attempt > 0)
+
+            if not retryable or attempt == self.max_retries:
+                break
+            await asyncio.sleep(self._backoff(attempt, response))
+
+        if response is None:
+            raise ORSError(f"ORS {endpoint} request failed: {error}")
+        return response
+
+    async def geocode(self, text, size=1):
+        endpoint, method, path, kwargs = self.geocode_request(text, size)
+        return await self.request(endpoint, method, path, **kwargs)
+
+    async def directions(self, coordinates, profile="driving-car", **options):
+        endpoint, method, path, kwargs = self.directions_request(coordinates, profile, **options)
+        return await self.request(endpoint, method, path, **kwargs)
+
+    async def matrix(self, locations, sources=None, destinations=None, profile="driving-car",
+                     metrics=("distance", "duration")):
+        endpoint, method, path, kwargs = self.matrix_request(locations, sources, destinations, profile, metrics)
+        return await self.request(endpoint, method, path, **kwargs)
+
+
+def _client_settings():
+    return {
+        "api_key": os.environ.get("ORS_API_KEY"),
+        "base_url": settings.ORS_BASE_URL,
+        "connect_timeout": settings.ORS_CONNECT_TIMEOUT,
+        "read_timeout": settings.ORS_READ_TIMEOUT,
+        "max_retries": settings.ORS_MAX_RETRIES,
+        "backoff_base": settings.ORS_BACKOFF_BASE,
+        "backoff_max": settings.ORS_BACKOFF_MAX,
+        "pool_size": settings.ORS_MAX_WORKERS,
+        "rate_limiter": get_rate_limiter(),
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Returns the limiter for ORS_RATE_LIMITS, or None when no endpoint is limited."""
+    global _rate_limiter
+    if _rate_limiter is None and any(settings.ORS_RATE_LIMITS.values()):
+        _rate_limiter = TokenBucketLimiter(
+            settings.ORS_RATE_LIMIT_PATH,
+            settings.ORS_RATE_LIMITS,
+            burst=settings.ORS_RATE_LIMIT_BURST,
+            max_wait=settings.ORS_RATE_LIMIT_MAX_WAIT,
+        )
+    return _rate_limiter
+
+
+def get_client():
+    """Returns the process-wide ORSClient, creating it from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ORSClient(**_client_settings())
+    return _client
+
+
+def get_async_client():
+    """Returns the AsyncORSClient for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncORSClient(**_client_settings())
+    return client
+
+
+@receiver(setting_changed)
+def _reset_clients(setting, **kwargs):
+    """Drops the cached clients when an ORS_* setting is overridden (e.g. pointing tests at FakeORSServer)."""
+    global _client, _rate_limiter
+    if setting.startswith("ORS_"):
+        with _client_lock:
+            _client = None
+            _rate_limiter = None
+        _async_clients.clear()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that runs each task in a copy of the submitter's context (e.g. rate_limit_max_wait)."""
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# Process-wide pool that bounds how many ORS lookups run at once.
+ors_executor = ContextThreadPoolExecutor(max_workers=settings.ORS_MAX_WORKERS, thread_name_prefix="ors")
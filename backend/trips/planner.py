@@ -0,0 +1,160 @@
+"""
+Network-free HOS trip planner.
+
+Takes a trip's distance (or driving time) and the driver's cycle state and
+returns typed events. It depends only on trips.hos and the standard
+library, so it can be imported without Django settings or an ORS key and
+used from what-if tools, benchmarks and tests as well as from the views.
+"""
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional
+
+from .hos import AVERAGE_SPEED, clock_label, run_hos
+
+_US_PER_MINUTE = 60 * 10**6
+
+
+class PlannedEvent(NamedTuple):
+    status: str
+    # Minutes since 00:00 of the trip's first day.
+    start_minute: int
+    end_minute: int
+    description: str
+
+    @property
+    def start(self):
+        return clock_label(self.start_minute * _US_PER_MINUTE)
+
+    @property
+    def end(self):
+        return clock_label(self.end_minute * _US_PER_MINUTE)
+
+    @property
+    def hours(self):
+        return (self.end_minute - self.start_minute) / 60.0
+
+    def as_log_event(self):
+        return {
+            "status": self.status,
+            "start": self.start,
+            "end": self.end,
+            "description": self.description
+        }
+
+
+class DayPlan(NamedTuple):
+    day_index: int
+    events: List[PlannedEvent]
+
+    @property
+    def on_duty_hours(self):
+        return sum(event.hours for event in self.events if event.status != "Off Duty")
+
+    def as_log_day(self):
+        return {
+            "dayIndex": self.day_index,
+            "events": [event.as_log_event() for event in self.events]
+        }
+
+
+class FuelStop(NamedTuple):
+    mile: float
+
+    @property
+    def location(self):
+        return f"Fuel Stop at mile {self.mile}"
+
+    def as_dict(self, route_line=None):
+        stop = {"mile": self.mile, "location": self.location}
+        if route_line is not None:
+            stop["coordinates"] = route_line.point_at(self.mile)
+        return stop
+
+
+@dataclass
+class TripPlan:
+    distance_miles: float
+    driving_hours: float
+    cycle_used: float
+    days: List[DayPlan]
+    fuel_stops: List[FuelStop]
+
+    @property
+    def completed(self):
+        """False when the driver ran out of hours before the dropoff."""
+        return not any(event.status == "Cycle Limit Reached" for event in self.days[-1].events)
+
+    @property
+    def on_duty_hours(self):
+        return sum(day.on_duty_hours for day in self.days)
+
+    def daily_logs(self, route_line=None, pickup=None):
+        """
+        The plan in the daily_logs format stored on Trip.logs. With a
+        route_line (trips.geo.RouteLine, or anything with point_at(mile)),
+        every non-driving event also gets the "coordinates" where it happens:
+        the mile reached after the driving logged before it. The plan logs
+        the pickup before any driving, so the "Pickup" event is placed at
+        the pickup stop's [lng, lat] instead when it is given.
+        """
+        if route_line is None:
+            return [day.as_log_day() for day in self.days]
+        # Events are logged to the minute; a completed plan is scaled over its
+        # logged driving so that the dropoff lands exactly on the last mile.
+        driving_minutes = self.driving_hours * 60
+        if self.completed:
+            driving_minutes = sum(event.end_minute - event.start_minute
+                                  for day in self.days for event in day.events if event.status == "Driving")
+        miles_per_minute = self.distance_miles / driving_minutes if driving_minutes else 0.0
+        driven_minutes = 0
+        logs = []
+        for day in self.days:
+            events = []
+            for event in day.events:
+                log_event = event.as_log_event()
+                if event.status == "Driving":
+                    driven_minutes += event.end_minute - event.start_minute
+                elif pickup is not None and event.description == "Pickup":
+                    log_event["coordinates"] = list(pickup)
+                else:
+                    log_event["coordinates"] = route_line.point_at(driven_minutes * miles_per_minute)
+                events.append(log_event)
+            logs.append({"dayIndex": day.day_index, "events": events})
+        return logs
+
+    def fuel_stop_dicts(self, route_line=None):
+        return [stop.as_dict(route_line) for stop in self.fuel_stops]
+
+
+def _make_event(status, start_us, end_us, description):
+    return PlannedEvent(status, start_us // _US_PER_MINUTE, end_us // _US_PER_MINUTE, description)
+
+
+def plan_trip(distance_miles, cycle_used=0.0, driving_hours: Optional[float] = None):
+    """
+    Plans the HOS events for one trip.
+
+    :param distance_miles: Trip distance in miles.
+    :param cycle_used: Hours already used in the driver's 70-hour cycle.
+    :param driving_hours: Driving time in hours; defaults to
+        distance_miles at AVERAGE_SPEED.
+    :return: TripPlan
+    """
+    if driving_hours is None:
+        driving_hours = distance_miles / AVERAGE_SPEED
+    fuel_stops, days = run_hos(driving_hours, cycle_used, _make_event, DayPlan, FuelStop)
+    return TripPlan(
+        distance_miles=distance_miles,
+        driving_hours=driving_hours,
+        cycle_used=cycle_used,
+        days=days,
+        fuel_stops=fuel_stops,
+    )
+
+
+def plan_trips(scenarios):
+    """
+    Plans many trips. scenarios is an iterable of (distance_miles, cycle_used)
+    pairs; returns the TripPlans in the same order.
+    """
+    return [plan_trip(distance_miles, cycle_used) for distance_miles, cycle_used in scenarios]
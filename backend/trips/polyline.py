@@ -0,0 +1,52 @@
+"""
+Encoded polyline format (precision 5), as used by ORS "geometry" strings.
+Points are (longitude, latitude) pairs like the rest of the ORS payloads;
+the encoding itself stores latitude first.
+"""
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_polyline(points, precision=5):
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lng = 0
+    for lng, lat in points:
+        lat = round(lat * factor)
+        lng = round(lng * factor)
+        encoded.append(_encode_value(lat - previous_lat))
+        encoded.append(_encode_value(lng - previous_lng))
+        previous_lat, previous_lng = lat, lng
+    return "".join(encoded)
+
+
+def decode_polyline(encoded, precision=5):
+    """Returns the [longitude, latitude] points of an encoded polyline."""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append([lng / factor, lat / factor])
+    return points
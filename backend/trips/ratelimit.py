@@ -0,0 +1,88 @@
+"""
+Token-bucket rate limiting shared by every process on a host.
+
+All web and job workers call ORS with the same API key, so the provider's
+per-minute quota has to be enforced across processes. Bucket state (tokens
+left, last refill time) lives in a small SQLite file and is updated under
+BEGIN IMMEDIATE, which serializes callers from every process.
+
+A caller reserves the next free slot: when the bucket is empty its token
+count goes negative and it is told how long to wait for its turn, so
+queued callers are released at exactly the configured rate. A caller whose
+turn is further away than max_wait is rejected with RateLimitExceeded
+instead of queueing.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    """The bucket is saturated: the next free slot is more than max_wait seconds away."""
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"Rate limit for {bucket} saturated; next slot in {retry_after:.1f}s.")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """
+    rates maps a bucket name to its rate in requests per minute; buckets
+    without a rate (or with 0) are not limited. Up to burst requests may be
+    sent back to back after an idle period.
+    """
+    def __init__(self, path, rates, burst=1, max_wait=5.0, busy_timeout=5.0):
+        self.path = str(path)
+        self.rates = {bucket: rate for bucket, rate in rates.items() if rate}
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def reserve(self, bucket, max_wait=None):
+        """
+        Takes a token from bucket and returns how many seconds the caller
+        must wait before sending its request (0.0 when a token was free).
+        Raises RateLimitExceeded when that wait would exceed max_wait.
+        """
+        rate = self.rates.get(bucket)
+        if rate is None:
+            return 0.0
+        per_second = rate / 60.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated FROM bucket WHERE name = ?", (bucket,)).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * per_second) - 1
+            wait = -tokens / per_second if tokens < 0 else 0.0
+            if wait > max_wait:
+                connection.execute("ROLLBACK")
+                raise RateLimitExceeded(bucket, wait)
+            connection.execute(
+                "INSERT INTO bucket (name, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (bucket, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
@@ -0,0 +1,450 @@
+"""
+Offline routing over a preprocessed road network.
+
+`manage.py build_road_graph` turns an OSM XML extract into a single graph
+file: node coordinates, the road network as CSR adjacency arrays (forward
+and reverse, with each edge's length in meters and travel time in seconds)
+and a grid index for snapping coordinates to the nearest node. RoadGraph
+memory-maps that file and answers fastest-route queries with bidirectional
+A* on travel time, so routing needs no network, no quota and no numpy.
+
+With ROUTING_PROVIDER = "offline", get_directions and get_route_summary
+(trips.views) use the graph at ROAD_GRAPH_PATH instead of ORS.
+"""
+import bz2
+import gzip
+import heapq
+import math
+import mmap
+import re
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .geo import EARTH_RADIUS_METERS
+from .polyline import encode_polyline
+
+# Default speeds (km/h) for the drivable OSM highway types; ways of other
+# types are left out of the graph. A way's maxspeed tag wins when present.
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 105, "motorway_link": 60,
+    "trunk": 90, "trunk_link": 50,
+    "primary": 80, "primary_link": 50,
+    "secondary": 70, "secondary_link": 45,
+    "tertiary": 60, "tertiary_link": 40,
+    "unclassified": 45, "residential": 35, "living_street": 10,
+    "service": 20, "road": 40,
+}
+# Highway types that are one-way unless tagged otherwise.
+IMPLIED_ONEWAY = frozenset({"motorway", "motorway_link"})
+# Size (degrees) of the snapping grid cells.
+CELL_DEGREES = 0.01
+
+_MAGIC = b"TRGRAPH2"
+# magic, node count, edge count, max speed (m/s), cell size (degrees), cell count
+_HEADER = struct.Struct("<8sQQddQ")
+_MAXSPEED_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(mph|km/h|kmh)?\s*$")
+_METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180
+
+
+class RouteNotFound(Exception):
+    """No offline route: a point is too far from the road graph, or the graph does not connect the points."""
+
+
+def parse_maxspeed(value):
+    """OSM maxspeed tag -> km/h, or None when it is missing or not numeric ("none", "signals", ...)."""
+    match = _MAXSPEED_RE.match(value or "")
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609344 if match.group(2) == "mph" else speed
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = math.radians(lat1), math.radians(lng1), math.radians(lat2), math.radians(lng2)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(min(1.0, h)))
+
+
+def _cell(lat, lng, cell_degrees):
+    return int((lat + 90) // cell_degrees), int((lng + 180) // cell_degrees)
+
+
+def _cell_key(row, col):
+    return row << 32 | col
+
+
+def open_extract(path):
+    """Opens an OSM XML extract, transparently decompressing .gz and .bz2 files."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_osm(source):
+    """
+    Reads the drivable ways of an OSM XML document.
+    Returns (coords, ways): coords maps node id -> (lat, lng), and ways is a
+    list of (node_ids, speed_mps, oneway) where oneway is 0 (both
+    directions), 1 (along the way) or -1 (against it).
+    """
+    coords = {}
+    ways = []
+    refs = []
+    tags = {}
+    for _, element in ET.iterparse(source, events=("end",)):
+        if element.tag == "node":
+            coords[int(element.get("id"))] = (float(element.get("lat")), float(element.get("lon")))
+        elif element.tag == "nd":
+            refs.append(int(element.get("ref")))
+        elif element.tag == "tag":
+            tags[element.get("k")] = element.get("v")
+        elif element.tag == "way":
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS_KMH and tags.get("access") not in ("no", "private") and len(refs) > 1:
+                speed = parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS_KMH[highway]
+                oneway = tags.get("oneway")
+                if oneway in ("yes", "true", "1"):
+                    direction = 1
+                elif oneway == "-1":
+                    direction = -1
+                elif oneway == "no":
+                    direction = 0
+                else:
+                    direction = 1 if highway in IMPLIED_ONEWAY or tags.get("junction") == "roundabout" else 0
+                ways.append((refs, speed / 3.6, direction))
+        if element.tag in ("node", "way", "relation"):
+            # nd/tag children belong to the element that just ended.
+            element.clear()
+            refs = []
+            tags = {}
+    return coords, ways
+
+
+def _largest_component(node_count, edges):
+    """Node ids of the largest weakly connected component."""
+    parent = list(range(node_count))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for u, v, _, _ in edges:
+        root_u, root_v = find(u), find(v)
+        if root_u != root_v:
+            parent[root_u] = root_v
+    sizes = {}
+    for node in range(node_count):
+        root = find(node)
+        sizes[root] = sizes.get(root, 0) + 1
+    largest = max(sizes, key=sizes.get)
+    return [node for node in range(node_count) if find(node) == largest]
+
+
+def _csr(node_count, edges, source_index, target_index):
+    """CSR arrays (offsets, targets, meters, seconds) of edges grouped by their source_index field."""
+    offsets = array("q", bytes(8 * (node_count + 1)))
+    for edge in edges:
+        offsets[edge[source_index] + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    fill = array("q", offsets)
+    targets = array("i", bytes(4 * len(edges)))
+    meters = array("f", bytes(4 * len(edges)))
+    seconds = array("f", bytes(4 * len(edges)))
+    for edge in edges:
+        slot = fill[edge[source_index]]
+        fill[edge[source_index]] += 1
+        targets[slot] = edge[target_index]
+        meters[slot] = edge[2]
+        seconds[slot] = edge[3]
+    return offsets, targets, meters, seconds
+
+
+def build_road_graph(coords, ways, path, cell_degrees=CELL_DEGREES):
+    """
+    Writes the graph file for read_osm output to path, keeping the largest
+    connected part of the network. Returns (node_count, edge_count).
+    """
+    index = {}
+    raw_edges = []
+    for refs, speed_mps, direction in ways:
+        refs = [ref for ref in refs if ref in coords]
+        for a, b in zip(refs, refs[1:]):
+            if a == b:
+                continue
+            u = index.setdefault(a, len(index))
+            v = index.setdefault(b, len(index))
+            meters = _haversine(*coords[a], *coords[b])
+            seconds = meters / speed_mps
+            if direction >= 0:
+                raw_edges.append((u, v, meters, seconds))
+            if direction <= 0:
+                raw_edges.append((v, u, meters, seconds))
+    if not raw_edges:
+        raise ValueError("The extract has no drivable roads.")
+
+    osm_ids = list(index)
+    kept = _largest_component(len(osm_ids), raw_edges)
+    renumber = {old: new for new, old in enumerate(kept)}
+    edges = [(renumber[u], renumber[v], meters, seconds) for u, v, meters, seconds in raw_edges
+             if u in renumber and v in renumber]
+    node_count = len(kept)
+
+    lat = array("d", (coords[osm_ids[old]][0] for old in kept))
+    lng = array("d", (coords[osm_ids[old]][1] for old in kept))
+    # The fastest edge bounds the A* heuristic; edges are straight segments,
+    # so no path is faster than the great-circle distance at this speed.
+    # (with a margin for the float32 rounding of the stored edges).
+    max_speed = max(meters / seconds for _, _, meters, seconds in edges if seconds > 0) * 1.001
+
+    cells = {}
+    for node in range(node_count):
+        cells.setdefault(_cell_key(*_cell(lat[node], lng[node], cell_degrees)), []).append(node)
+    cell_keys = array("q", sorted(cells))
+    cell_starts = array("q", [0])
+    cell_nodes = array("i")
+    for key in cell_keys:
+        cell_nodes.extend(cells[key])
+        cell_starts.append(len(cell_nodes))
+
+    # Earth-centered coordinates (meters) for the A* heuristic: the chord
+    # between two nodes is a cheap lower bound of the distance by road.
+    xyz = array("d")
+    for node in range(node_count):
+        phi, lam = math.radians(lat[node]), math.radians(lng[node])
+        xyz.extend((
+            EARTH_RADIUS_METERS * math.cos(phi) * math.cos(lam),
+            EARTH_RADIUS_METERS * math.cos(phi) * math.sin(lam),
+            EARTH_RADIUS_METERS * math.sin(phi),
+        ))
+
+    sections = [lat, lng, xyz]
+    sections.extend(_csr(node_count, edges, 0, 1))
+    sections.extend(_csr(node_count, edges, 1, 0))
+    sections.extend([cell_keys, cell_starts, cell_nodes])
+    with open(path, "wb") as graph_file:
+        graph_file.write(_HEADER.pack(_MAGIC, node_count, len(edges), max_speed, cell_degrees, len(cell_keys)))
+        for section in sections:
+            data = section.tobytes()
+            graph_file.write(data + bytes(-len(data) % 8))
+    return node_count, len(edges)
+
+
+class RoadGraph:
+    """
+    Read-only view of a graph file. The arrays are memoryviews over one
+    mmap, so opening is instant and the pages are shared by every worker
+    process on the host.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as graph_file:
+            self._mmap = mmap.mmap(graph_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.node_count, self.edge_count, self.max_speed, self.cell_degrees, cell_count = \
+            _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a road graph file.")
+
+        view = memoryview(self._mmap)
+        offset = _HEADER.size
+        n, m = self.node_count, self.edge_count
+
+        def section(fmt, length):
+            nonlocal offset
+            size = struct.calcsize(fmt) * length
+            data = view[offset:offset + size].cast(fmt)
+            offset += size + (-size % 8)
+            return data
+
+        self.lat = section("d", n)
+        self.lng = section("d", n)
+        self.xyz = section("d", 3 * n)
+        self.offsets, self.targets, self.meters, self.seconds = (
+            section("q", n + 1), section("i", m), section("f", m), section("f", m)
+        )
+        self.rev_offsets, self.rev_targets, self.rev_meters, self.rev_seconds = (
+            section("q", n + 1), section("i", m), section("f", m), section("f", m)
+        )
+        self.cell_keys = section("q", cell_count)
+        self.cell_starts = section("q", cell_count + 1)
+        self.cell_nodes = section("i", n)
+
+    def nearest_node(self, lng, lat, max_meters):
+        """Returns (node, meters) for the graph node closest to the point; raises RouteNotFound beyond max_meters."""
+        row, col = _cell(lat, lng, self.cell_degrees)
+        cell_meters = self.cell_degrees * _METERS_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(lat) + 1))))
+        best, best_meters = -1, math.inf
+        ring = 0
+        # Nodes in ring r are at least (r - 1) cells away.
+        while (ring - 1) * cell_meters <= min(best_meters, max_meters):
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    key = _cell_key(r, c)
+                    position = bisect_left(self.cell_keys, key)
+                    if position == len(self.cell_keys) or self.cell_keys[position] != key:
+                        continue
+                    for i in range(self.cell_starts[position], self.cell_starts[position + 1]):
+                        node = self.cell_nodes[i]
+                        meters = _haversine(lat, lng, self.lat[node], self.lng[node])
+                        if meters < best_meters:
+                            best, best_meters = node, meters
+            ring += 1
+        if best_meters > max_meters:
+            raise RouteNotFound(f"No road within {max_meters:.0f} m of {[lng, lat]}.")
+        return best, best_meters
+
+    def shortest_path(self, source, target):
+        """
+        Fastest path by bidirectional A*. Both searches use the averaged
+        potential p(v) = (h_target(v) - h_source(v)) / 2, where h is the
+        straight-line (chord) time at max_speed, which keeps them consistent
+        with each other; the search stops once the two queue minimums add up
+        to the best meeting cost. Returns (seconds, meters, nodes).
+        """
+        if source == target:
+            return 0.0, 0.0, [source]
+        xyz = self.xyz
+        scale = 0.5 / self.max_speed
+        sx, sy, sz = xyz[3 * source], xyz[3 * source + 1], xyz[3 * source + 2]
+        tx, ty, tz = xyz[3 * target], xyz[3 * target + 1], xyz[3 * target + 2]
+        sqrt = math.sqrt
+        heappush, heappop = heapq.heappush, heapq.heappop
+        inf = math.inf
+        potentials = {}
+
+        def potential(node):
+            x, y, z = xyz[3 * node], xyz[3 * node + 1], xyz[3 * node + 2]
+            value = potentials[node] = (
+                sqrt((x - tx) ** 2 + (y - ty) ** 2 + (z - tz) ** 2)
+                - sqrt((x - sx) ** 2 + (y - sy) ** 2 + (z - sz) ** 2)
+            ) * scale
+            return value
+
+        forward = ({source: 0.0}, {source: None}, [(potential(source), source)], set(), 1.0,
+                   self.offsets, self.targets, self.seconds)
+        backward = ({target: 0.0}, {target: None}, [(-potential(target), target)], set(), -1.0,
+                    self.rev_offsets, self.rev_targets, self.rev_seconds)
+        forward_queue, backward_queue = forward[2], backward[2]
+        best = inf
+        meeting = None
+        while forward_queue and backward_queue:
+            if forward_queue[0][0] + backward_queue[0][0] >= best:
+                break
+            if len(forward_queue) <= len(backward_queue):
+                side, other_distances = forward, backward[0]
+            else:
+                side, other_distances = backward, forward[0]
+            distances, parents, queue, settled, sign, offsets, targets, seconds = side
+            node = heappop(queue)[1]
+            if node in settled:
+                continue
+            settled.add(node)
+            base = distances[node]
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                distance = base + seconds[edge]
+                if distance < distances.get(neighbor, inf):
+                    distances[neighbor] = distance
+                    parents[neighbor] = (node, edge)
+                    value = potentials.get(neighbor)
+                    if value is None:
+                        value = potential(neighbor)
+                    heappush(queue, (distance + sign * value, neighbor))
+                    other = other_distances.get(neighbor)
+                    if other is not None and distance + other < best:
+                        best = distance + other
+                        meeting = neighbor
+        if meeting is None:
+            raise RouteNotFound("The road graph does not connect these points.")
+
+        nodes = []
+        meters = 0.0
+        node = meeting
+        while forward[1][node] is not None:
+            nodes.append(node)
+            node, edge = forward[1][node]
+            meters += self.meters[edge]
+        nodes.append(node)
+        nodes.reverse()
+        node = meeting
+        while backward[1][node] is not None:
+            node, edge = backward[1][node]
+            meters += self.rev_meters[edge]
+            nodes.append(node)
+        return best, meters, nodes
+
+    def _legs(self, route_coords, max_snap_meters):
+        snapped = [self.nearest_node(lng, lat, max_snap_meters)[0] for lng, lat in route_coords]
+        return [self.shortest_path(a, b) for a, b in zip(snapped, snapped[1:])]
+
+    def _geometry(self, legs):
+        points = []
+        for _, _, nodes in legs:
+            points.extend([self.lng[node], self.lat[node]] for node in nodes[1 if points else 0:])
+        return encode_polyline(points)
+
+    def route_summary(self, route_coords, profile=None, with_geometry=False, max_snap_meters=None):
+        """Same contract as views.get_route_summary; raises RouteNotFound."""
+        legs = self._legs(route_coords, max_snap_meters or settings.ROAD_GRAPH_MAX_SNAP_METERS)
+        summary = {
+            "distance": sum(meters for _, meters, _ in legs),
+            "duration": sum(seconds for seconds, _, _ in legs),
+        }
+        if with_geometry:
+            summary["geometry"] = self._geometry(legs)
+        return summary
+
+    def directions(self, route_coords, profile=None, max_snap_meters=None):
+        """Same payload shape as the ORS directions response read by views.get_directions callers."""
+        legs = self._legs(route_coords, max_snap_meters or settings.ROAD_GRAPH_MAX_SNAP_METERS)
+        way_points = [0]
+        for _, _, nodes in legs:
+            way_points.append(way_points[-1] + len(nodes) - 1)
+        return {
+            "routes": [{
+                "summary": {
+                    "distance": sum(meters for _, meters, _ in legs),
+                    "duration": sum(seconds for seconds, _, _ in legs),
+                },
+                "segments": [{"distance": meters, "duration": seconds} for seconds, meters, _ in legs],
+                "geometry": self._geometry(legs),
+                "way_points": way_points,
+            }],
+        }
+
+
+_road_graph = None
+_road_graph_lock = threading.Lock()
+
+
+def get_offline_router():
+    """Returns the RoadGraph at ROAD_GRAPH_PATH when ROUTING_PROVIDER is "offline", else None."""
+    global _road_graph
+    if settings.ROUTING_PROVIDER != "offline":
+        return None
+    if _road_graph is None:
+        with _road_graph_lock:
+            if _road_graph is None:
+                _road_graph = RoadGraph(settings.ROAD_GRAPH_PATH)
+    return _road_graph
+
+
+@receiver(setting_changed)
+def _reset_road_graph(setting, **kwargs):
+    global _road_graph
+    if setting.startswith(("ROUTING_", "ROAD_GRAPH_")):
+        _road_graph = None
@@ -0,0 +1,230 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import LRUCache, prune_table
+from .models import CacheGeneration, RouteCacheEntry
+
+_KEY_MAX_LENGTH = RouteCacheEntry._meta.get_field("key").max_length
+
+# ORS routing profile used for all trip directions.
+DIRECTIONS_PROFILE = "driving-car"
+
+
+def route_cache_key(route_coords, profile, precision=4):
+    """
+    Builds a cache key from the routing profile and the coordinates rounded
+    to `precision` decimal places, so that the same lane geocoded a few
+    meters apart maps to the same entry.
+    """
+    points = ";".join(f"{lng:.{precision}f},{lat:.{precision}f}" for lng, lat in route_coords)
+    key = f"{profile}|{points}"
+    if len(key) > _KEY_MAX_LENGTH:
+        key = f"{profile}|sha1:{hashlib.sha1(points.encode()).hexdigest()}"
+    return key
+
+
+class RouteCache:
+    """
+    Two-tier cache for directions summaries: an in-process LRU in front of
+    the RouteCacheEntry table. Values are dicts with "distance" (meters),
+    "duration" (seconds) and, when requested, "geometry" (encoded polyline).
+    A cached summary without geometry does not satisfy a request that
+    needs it.
+
+    invalidate() bumps the cache's CacheGeneration row. get() and
+    get_many() read that row at most every generation_check_seconds and
+    clear the in-process tier when it has changed, so an invalidation
+    reaches every worker within that interval.
+    """
+    GENERATION_NAME = "route_cache"
+
+    def __init__(self, max_entries=1024, db_max_entries=20000, ttl=7 * 24 * 3600,
+                 precision=4, prune_interval=100, generation_check_seconds=5.0):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.generation_check_seconds = generation_check_seconds
+        self._generation = None
+        self._generation_checked_at = None
+        self.db_max_entries = db_max_entries
+        self.ttl = ttl
+        self.precision = precision
+        self.prune_interval = prune_interval
+        self.db_hits = 0
+        self.db_misses = 0
+        self._writes = 0
+
+    def key(self, route_coords, profile):
+        return route_cache_key(route_coords, profile, self.precision)
+
+    def _read_generation(self):
+        row = CacheGeneration.objects.filter(name=self.GENERATION_NAME).values_list("value", flat=True).first()
+        return row or 0
+
+    def sync_generation(self):
+        """Clears the in-process tier if another process invalidated the cache since the last check."""
+        now = time.monotonic()
+        if (self._generation_checked_at is not None
+                and now - self._generation_checked_at < self.generation_check_seconds):
+            return
+        generation = self._read_generation()
+        if self._generation is not None and generation != self._generation:
+            self.memory.clear()
+        self._generation, self._generation_checked_at = generation, now
+
+    def get(self, route_coords, profile, with_geometry=False):
+        self.sync_generation()
+        key = self.key(route_coords, profile)
+        summary = self.memory.get(key)
+        if summary is not None and (not with_geometry or summary.get("geometry")):
+            return summary
+
+        entry = RouteCacheEntry.objects.filter(key=key).first()
+        if entry is None or (with_geometry and not entry.geometry):
+            self.db_misses += 1
+            return None
+        if self.ttl is not None and entry.created_at < timezone.now() - timedelta(seconds=self.ttl):
+            entry.delete()
+            self.db_misses += 1
+            return None
+
+        RouteCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=timezone.now())
+        self.db_hits += 1
+        summary = {"distance": entry.distance, "duration": entry.duration}
+        if entry.geometry:
+            summary["geometry"] = entry.geometry
+        self.memory.set(key, summary)
+        return summary
+
+    def recall(self, route_coords, profile, with_geometry=False):
+        """
+        Looks the route up in the in-process tier only. It does not check
+        the generation (no database access); callers reach it after get().
+        """
+        summary = self.memory.get(self.key(route_coords, profile))
+        if summary is not None and (not with_geometry or summary.get("geometry")):
+            return summary
+        return None
+
+    def remember(self, route_coords, profile, summary):
+        """Stores summary in the in-process tier only (no database access)."""
+        self.memory.set(self.key(route_coords, profile), summary)
+
+    def set(self, route_coords, profile, summary):
+        key = self.key(route_coords, profile)
+        self.memory.set(key, summary)
+        RouteCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "profile": profile,
+                "distance": summary["distance"],
+                "duration": summary["duration"],
+                "geometry": summary.get("geometry"),
+                "created_at": timezone.now(),
+            },
+        )
+        self._count_writes(1)
+
+    def _count_writes(self, count):
+        # Prune once every prune_interval rows written, however they were batched.
+        previous = self._writes
+        self._writes += count
+        if self._writes // self.prune_interval > previous // self.prune_interval:
+            self.prune()
+
+    def get_many(self, keys):
+        """
+        Looks up several cache keys (see key()) with at most one database
+        query. Returns {key: summary} for the keys found; geometry is not
+        loaded.
+        """
+        self.sync_generation()
+        found = {}
+        missing = []
+        for key in keys:
+            summary = self.memory.get(key)
+            if summary is not None:
+                found[key] = summary
+            else:
+                missing.append(key)
+        if missing:
+            entries = RouteCacheEntry.objects.filter(key__in=missing).only("key", "distance", "duration", "created_at")
+            if self.ttl is not None:
+                entries = entries.filter(created_at__gte=timezone.now() - timedelta(seconds=self.ttl))
+            db_keys = []
+            for entry in entries:
+                summary = {"distance": entry.distance, "duration": entry.duration}
+                self.memory.set(entry.key, summary)
+                found[entry.key] = summary
+                db_keys.append(entry.key)
+            if db_keys:
+                RouteCacheEntry.objects.filter(key__in=db_keys).update(last_used_at=timezone.now())
+            self.db_hits += len(found) - (len(keys) - len(missing))
+            self.db_misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, profile, summaries):
+        """
+        Stores {key: summary} pairs with a single bulk upsert. Like set(),
+        it replaces the stored geometry, so a summary without one (e.g.
+        from the matrix API) clears it.
+        """
+        now = timezone.now()
+        for key, summary in summaries.items():
+            self.memory.set(key, summary)
+        RouteCacheEntry.objects.bulk_create(
+            [
+                RouteCacheEntry(key=key, profile=profile, distance=summary["distance"],
+                                duration=summary["duration"], geometry=summary.get("geometry"),
+                                created_at=now, last_used_at=now)
+                for key, summary in summaries.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=["distance", "duration", "geometry", "created_at", "last_used_at"],
+        )
+        self._count_writes(len(summaries))
+
+    def prune(self):
+        prune_table(RouteCacheEntry, ttl=self.ttl, max_entries=self.db_max_entries)
+
+    def invalidate(self, profile=None, older_than=None):
+        """
+        Removes cached routes, optionally only for one profile and/or only
+        entries created more than older_than seconds ago. Returns the number
+        of rows deleted from the database tier.
+        """
+        entries = RouteCacheEntry.objects.all()
+        if profile:
+            entries = entries.filter(profile=profile)
+        if older_than is not None:
+            entries = entries.filter(created_at__lt=timezone.now() - timedelta(seconds=older_than))
+        deleted, _ = entries.delete()
+        generation, _ = CacheGeneration.objects.get_or_create(name=self.GENERATION_NAME)
+        CacheGeneration.objects.filter(pk=generation.pk).update(value=F("value") + 1)
+        self.memory.clear()
+        self._generation_checked_at = None
+        return deleted
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {
+            "memory": memory,
+            "db_hits": self.db_hits,
+            "db_misses": self.db_misses,
+            "hits": memory["hits"] + self.db_hits,
+            "misses": self.db_misses,
+        }
+
+
+_config = getattr(settings, "ROUTE_CACHE", {})
+route_cache = RouteCache(
+    max_entries=_config.get("MAX_ENTRIES", 1024),
+    db_max_entries=_config.get("DB_MAX_ENTRIES", 20000),
+    ttl=_config.get("TTL", 7 * 24 * 3600),
+    precision=_config.get("PRECISION", 4),
+    generation_check_seconds=_config.get("GENERATION_CHECK_SECONDS", 5.0),
+)
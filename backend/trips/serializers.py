@@ -21,11 +21,15 @@
 
 
 from rest_framework import serializers
-from .models import Trip, Driver
+from .models import Trip, TripJob, Driver
 
 class TripSerializer(serializers.ModelSerializer):
     # eldFormData is computed from the logs on the backend.
     eldFormData = serializers.JSONField(read_only=True)
+    # Stored compressed in TripDetail (see Trip.artifacts).
+    route = serializers.JSONField(required=False, allow_null=True)
+    logs = serializers.JSONField(required=False, allow_null=True)
+    fuel_stops = serializers.JSONField(required=False, allow_null=True)
     
     class Meta:
         model = Trip
@@ -43,3 +47,54 @@ class TripSerializer(serializers.ModelSerializer):
             'eldFormData'
         ]
 
+
+class PlannedTripSerializer(TripSerializer):
+    # Validates batch-planned trips; the driver is assigned when they are saved.
+    class Meta(TripSerializer.Meta):
+        extra_kwargs = {"driver": {"required": False}}
+
+
+class TripJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripJob
+        fields = ['id', 'status', 'status_code', 'result', 'trip', 'created_at', 'started_at', 'finished_at']
+
+
+# Large JSON documents kept in TripDetail; history listings only load them
+# when asked to (?include=route,logs).
+HEAVY_TRIP_FIELDS = Trip.ARTIFACT_FIELDS
+
+
+class TripHistorySerializer(serializers.ModelSerializer):
+    route = serializers.JSONField(read_only=True)
+    logs = serializers.JSONField(read_only=True)
+    fuel_stops = serializers.JSONField(read_only=True)
+
+    def __init__(self, *args, include=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in HEAVY_TRIP_FIELDS:
+            if name not in include:
+                self.fields.pop(name)
+
+    class Meta:
+        model = Trip
+        fields = [
+            'id',
+            'driver',
+            'current_location',
+            'pickup_location',
+            'dropoff_location',
+            'cycle_hours_used',
+            'distance',
+            'days',
+            'on_duty_hours',
+            'fuel_stop_count',
+            'created_at',
+            *HEAVY_TRIP_FIELDS,
+        ]
+
+
+class DriverSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Driver
+        fields = ['id', 'name', 'current_cycle_hours_used', 'cycle_start_date']
@@ -1,3 +1,1105 @@
-from django.test import TestCase
+import asyncio
+import heapq
+import io
+import json
+import math
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .cache import LRUCache
+from .coalesce import SingleFlight
+from .eld import (
+    build_eld_log_form, day_timeline, eld_form_from_packed, expand_timeline, pack_eld, runs_to_timeline,
+)
+from .fake_ors import FakeORSServer, directions_payload, fake_coordinates, road_meters
+from .fleet import FleetEldGrid, np
+from .geocoding import GeocodeCache, geocode_cache, normalize_address
+from .geo import RouteLine, simplify_points
+from .gazetteer import gazetteer, load_entries
+from .hos import AVERAGE_SPEED, duty_hours, simulate_hos
+from .hos_reference import simulate_hos_stepwise
+from .jobs import JobRunner
+from .ledger import cycle_hours_by_driver, cycle_hours_used, record_trip_duty
+from .ors import ORSClient, ORSError, ORSRateLimited, get_async_client, get_client, ors_executor, rate_limit_max_wait
+from .matrix import MatrixDistanceService
+from .models import (
+    Driver, DutyLedgerEntry, GazetteerEntry, GeocodeCacheEntry, RouteCacheEntry, Trip, TripDetail, TripJob,
+)
+from .planner import plan_trip
+from .polyline import decode_polyline, encode_polyline
+from .ratelimit import RateLimitExceeded, TokenBucketLimiter
+from .roadgraph import RoadGraph, RouteNotFound, build_road_graph, read_osm
+from .routing import DIRECTIONS_PROFILE, RouteCache, route_cache
+from .views import geocode_address, geocode_addresses, get_route_summary, job_runner, store_geocode, trip_job_events
+
+
+def merge_driving(daily_logs):
+    """
+    Collapses back-to-back "Driving" events of the stepwise simulator into
+    one event, the way simulate_hos reports them. Driving descriptions are
+    dropped because the stepwise one describes each 1-hour step.
+    """
+    merged = []
+    for day in daily_logs:
+        events = []
+        for event in day["events"]:
+            previous = events[-1] if events else None
+            if (event["status"] == "Driving" and previous and previous["status"] == "Driving"
+                    and previous["end"] == event["start"]):
+                previous["end"] = event["end"]
+            else:
+                events.append(dict(event))
+        for event in events:
+            if event["status"] == "Driving":
+                event["description"] = None
+        merged.append({"dayIndex": day["dayIndex"], "events": events})
+    return merged
+
+
+class SimulateHosDifferentialTests(SimpleTestCase):
+    """Checks the closed-form simulate_hos against the hour-by-hour reference."""
+
+    DISTANCES = [0.01, 1, 49.99, 50, 399.99, 400, 450, 999.99, 1000, 1000.01,
+                 1549.5, 2000, 2999.99, 3000, 4321.12, 6000]
+    CYCLES = [0, 10, 33.33, 55, 56, 56.5, 59.9, 60, 65, 69, 69.99, 70, 75]
+
+    def assertEquivalent(self, distance_miles, cycle_used):
+        driving_hours = distance_miles / AVERAGE_SPEED
+        expected_fuel, expected_logs = simulate_hos_stepwise(driving_hours, cycle_used)
+        fuel_stops, daily_logs = simulate_hos(driving_hours, cycle_used)
+        case = f"distance={distance_miles} cycle_used={cycle_used}"
+
+        self.assertEqual(fuel_stops, expected_fuel, case)
+        self.assertEqual(merge_driving(daily_logs), merge_driving(expected_logs), case)
+        self.assertEqual(build_eld_log_form(daily_logs), build_eld_log_form(expected_logs), case)
+        self.assertAlmostEqual(duty_hours(daily_logs), duty_hours(expected_logs), places=6, msg=case)
+        for day in daily_logs:
+            statuses = [event["status"] for event in day["events"]]
+            self.assertNotIn(("Driving", "Driving"), list(zip(statuses, statuses[1:])), case)
+
+    def test_boundary_grid(self):
+        for distance_miles in self.DISTANCES:
+            for cycle_used in self.CYCLES:
+                self.assertEquivalent(distance_miles, cycle_used)
+
+    def test_random_scenarios(self):
+        rng = random.Random(20250317)
+        for _ in range(2000):
+            distance_miles = round(rng.uniform(0, 6000), 2)
+            cycle_used = rng.choice([rng.randint(0, 70), round(rng.uniform(0, 70), 2), rng.uniform(0, 75)])
+            self.assertEquivalent(distance_miles, cycle_used)
+
+    def test_contiguous_driving_is_one_event(self):
+        _, daily_logs = simulate_hos(300 / AVERAGE_SPEED, 0)
+        self.assertEqual(daily_logs[0]["events"][1], {
+            "status": "Driving",
+            "start": "07:00",
+            "end": "13:00",
+            "description": "Driving segment for 6.0 hour(s)",
+        })
+
+
+class PlannerTests(SimpleTestCase):
+
+    def test_plan_matches_simulated_logs(self):
+        for distance_miles, cycle_used in [(120, 0), (1234.56, 20), (2800, 50), (3000, 68.5)]:
+            plan = plan_trip(distance_miles, cycle_used)
+            fuel_stops, daily_logs = simulate_hos(distance_miles / AVERAGE_SPEED, cycle_used)
+            self.assertEqual(plan.daily_logs(), daily_logs)
+            self.assertEqual(plan.fuel_stop_dicts(), fuel_stops)
+            self.assertAlmostEqual(plan.on_duty_hours, duty_hours(daily_logs))
+
+    def test_cycle_exhaustion_marks_plan_incomplete(self):
+        self.assertTrue(plan_trip(500, 0).completed)
+        plan = plan_trip(500, 65)
+        self.assertFalse(plan.completed)
+        self.assertEqual(plan.days[-1].events[-1].status, "Cycle Limit Reached")
+
+    def test_stops_are_placed_along_the_route(self):
+        # A bent line: 1000 miles east along the equator, then 1500 north.
+        degrees_per_mile = 1 / 69.093
+        points = [[0.0, 0.0], [1000 * degrees_per_mile, 0.0], [1000 * degrees_per_mile, 1500 * degrees_per_mile]]
+        line = RouteLine(points, total_miles=2500)
+        self.assertAlmostEqual(line.miles, 2500)
+        self.assertEqual(line.point_at(-5), points[0])
+        self.assertEqual(line.point_at(3000), points[-1])
+        self.assertEqual(line.point_at(500), [round(500 * degrees_per_mile, 5), 0.0])
+
+        plan = plan_trip(2500, 0)
+        fuel_stops = plan.fuel_stop_dicts(line)
+        self.assertEqual([stop["mile"] for stop in fuel_stops], [1000, 2000])
+        self.assertEqual(fuel_stops[1]["coordinates"], line.point_at(2000))
+        logs = plan.daily_logs(line)
+        events = [event for day in logs for event in day["events"]]
+        self.assertTrue(all(("coordinates" in event) != (event["status"] == "Driving") for event in events))
+        self.assertEqual(events[0]["coordinates"], points[0])
+        self.assertEqual(events[-1]["coordinates"], points[-1])
+        fueling = [event["coordinates"] for event in events if event["description"] == "Fueling Stop"]
+        for placed, stop in zip(fueling, fuel_stops):
+            self.assertAlmostEqual(placed[0], stop["coordinates"][0], delta=0.1)
+            self.assertAlmostEqual(placed[1], stop["coordinates"][1], delta=0.1)
+
+        pickup = [3.0, 4.0]
+        events = [event for day in plan.daily_logs(line, pickup=pickup) for event in day["events"]]
+        self.assertEqual([event["coordinates"] for event in events if event["description"] == "Pickup"], [pickup])
+
+    def test_simplified_routes_stay_within_tolerance(self):
+        rng = random.Random(5)
+        points = [[i / 1000, math.sin(i / 150) + rng.uniform(-0.00005, 0.00005)] for i in range(5000)]
+        simplified = simplify_points(points, 0.001)
+        self.assertLess(len(simplified), len(points) / 20)
+        self.assertEqual((simplified[0], simplified[-1]), (points[0], points[-1]))
+        # Every dropped vertex lies within the tolerance of the segment that replaced it.
+        kept = iter(simplified[1:])
+        start, end = simplified[0], next(kept)
+        for point in points[1:]:
+            if point is end:
+                start, end = end, next(kept, end)
+                continue
+            dx, dy = end[0] - start[0], end[1] - start[1]
+            t = ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / (dx * dx + dy * dy)
+            t = min(1.0, max(0.0, t))
+            offset = math.hypot(start[0] + t * dx - point[0], start[1] + t * dy - point[1])
+            self.assertLessEqual(offset, 0.001)
+        self.assertEqual(RouteLine(points).simplified(0), points)
+
+
+class EldLogFormTests(SimpleTestCase):
+
+    def test_compact_form_expands_to_timeline(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            _, daily_logs = simulate_hos(rng.uniform(0, 120), rng.uniform(0, 75))
+            expanded = build_eld_log_form(daily_logs)
+            compact = build_eld_log_form(daily_logs, compact=True)
+            self.assertEqual(
+                [{"dayIndex": day["dayIndex"], "timeline": expand_timeline(runs_to_timeline(day["runs"]))}
+                 for day in compact],
+                expanded,
+            )
+            packed = pack_eld(daily_logs)
+            self.assertEqual(eld_form_from_packed(packed), expanded)
+            self.assertEqual(eld_form_from_packed(packed, compact=True), compact)
+
+    def test_short_event_fills_its_start_slot(self):
+        daily_logs = [{"dayIndex": 0, "events": [
+            {"status": "Driving", "start": "06:00", "end": "06:05", "description": None},
+        ]}]
+        self.assertEqual(build_eld_log_form(daily_logs, compact=True), [
+            {"dayIndex": 0, "runs": [[0, 0, 24], [2, 24, 25], [0, 25, 96]]},
+        ])
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class FleetEldGridTests(SimpleTestCase):
+
+    def event(self, status, start, end):
+        return {"status": status, "start": start, "end": end, "description": None}
+
+    def test_grid_rows_match_day_timelines(self):
+        rng = random.Random(11)
+        trips = []
+        for trip_id in range(300):
+            _, daily_logs = simulate_hos(rng.uniform(0, 80), rng.uniform(0, 75))
+            trips.append((trip_id, trip_id % 7, date(2026, 9, 1), daily_logs))
+        fleet = FleetEldGrid.from_trips(trips)
+        days = [day["events"] for trip in trips for day in trip[3]]
+        self.assertEqual(len(fleet), len(days))
+        for row, events in zip(fleet.grid, days):
+            self.assertEqual(bytes(row), bytes(day_timeline(events)))
+
+    def test_driver_days_merge_trips_and_count_violations(self):
+        morning = [{"dayIndex": 1, "events": [self.event("Driving", "06:00", "12:00")]}]
+        afternoon = [{"dayIndex": 1, "events": [self.event("Driving", "12:00", "18:30")]}]
+        other_driver = [{"dayIndex": 1, "events": [self.event("On Duty", "08:00", "09:00")]}]
+        fleet = FleetEldGrid.from_trips([
+            (1, 5, date(2026, 9, 1), morning),
+            (2, 5, date(2026, 9, 1), afternoon),
+            (3, 6, date(2026, 9, 1), other_driver),
+        ])
+        self.assertEqual(fleet.driver_on_duty_minutes(), {
+            (5, date(2026, 9, 1)): 750,
+            (6, date(2026, 9, 1)): 60,
+        })
+        # 12.5 hours of driving: 17:00-18:30 is over the 11-hour limit.
+        violations = fleet.violations_per_slot()
+        self.assertEqual(violations.sum(), 6)
+        self.assertEqual(violations[68:74].tolist(), [1] * 6)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_threads_and_tasks_share_one_call(self):
+        flights = SingleFlight("test")
+        calls = []
+        started = threading.Event()
+
+        def lookup(value):
+            calls.append(value)
+            started.set()
+            time.sleep(0.2)
+            return value * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do("key", lookup, 21))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+
+        async def waiters():
+            return await asyncio.gather(*[flights.ado("key", lookup, 21) for _ in range(3)])
+
+        self.assertEqual(asyncio.run(waiters()), [42] * 3)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [42] * 4)
+        self.assertEqual(calls, [21])
+        self.assertEqual(flights.stats(), {"calls": 1, "coalesced": 6, "in_flight": 0})
+
+    def test_waiters_share_the_error_and_cancelled_leaders_hand_over(self):
+        flights = SingleFlight("test")
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError("no route")
+
+        async def slow(value):
+            await asyncio.sleep(0.05)
+            return value
+
+        async def scenario():
+            errors = await asyncio.gather(*[flights.ado("bad", failing) for _ in range(3)], return_exceptions=True)
+            leader = asyncio.ensure_future(flights.ado("lane", slow, 7))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flights.ado("lane", slow, 7))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return errors, await waiter
+
+        errors, value = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(value, 7)
+        self.assertEqual(flights.stats()["in_flight"], 0)
+
+
+class DutyLedgerTests(TestCase):
+
+    def test_hours_roll_off_after_eight_days(self):
+        driver = Driver.objects.create(name="Ann")
+        plan = plan_trip(1200, 0)
+        start = date(2026, 9, 1)
+        record_trip_duty(driver.id, plan.daily_logs(), start)
+        record_trip_duty(driver.id, plan.daily_logs(), start)
+
+        last_day = start + timedelta(days=len(plan.days) - 1)
+        self.assertAlmostEqual(cycle_hours_used(driver.id, last_day), 2 * plan.on_duty_hours)
+        self.assertAlmostEqual(
+            cycle_hours_used(driver.id, start + timedelta(days=8)),
+            2 * sum(day.on_duty_hours for day in plan.days[1:]),
+        )
+        self.assertEqual(cycle_hours_used(driver.id, last_day + timedelta(days=8)), 0)
+        self.assertEqual(cycle_hours_by_driver([driver.id, 0], last_day), {
+            driver.id: cycle_hours_used(driver.id, last_day),
+            0: 0.0,
+        })
+
+
+class ConcurrentTripUpdateTests(TransactionTestCase):
+    """Many parallel calculate-trip requests for one driver must not lose cycle hours."""
+
+    REQUESTS = 24
+
+    def test_parallel_trips_for_one_driver(self):
+        driver = Driver.objects.create(name="Ann")
+        plan = plan_trip(60, 0)
+        trip_hours = round(plan.on_duty_hours, 2)
+
+        def slow_simulation(current_loc, pickup_loc, dropoff_loc, cycle_used):
+            time.sleep(0.05)  # stands in for the ORS calls
+            return [[0, 0], [1, 1], [2, 2]], 60, plan.fuel_stop_dicts(), plan.daily_logs()
+
+        barrier = threading.Barrier(self.REQUESTS)
+        statuses = []
+
+        def post_trip():
+            try:
+                barrier.wait()
+                response = Client().post("/api/calculate-trip/", {
+                    "driverId": str(driver.id),
+                    "currentLocation": "A",
+                    "pickupLocation": "B",
+                    "dropoffLocation": "C",
+                }, content_type="application/json")
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        with mock.patch("trips.views.real_simulate_trip", slow_simulation):
+            threads = [threading.Thread(target=post_trip) for _ in range(self.REQUESTS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses, [201] * self.REQUESTS)
+        driver.refresh_from_db()
+        self.assertEqual(driver.current_cycle_hours_used, Decimal(str(trip_hours)) * self.REQUESTS)
+        self.assertEqual(Trip.objects.filter(driver=driver).count(), self.REQUESTS)
+        ledger_minutes = sum(DutyLedgerEntry.objects.filter(driver=driver).values_list("on_duty_minutes", flat=True))
+        self.assertEqual(ledger_minutes, round(plan.on_duty_hours * 60) * self.REQUESTS)
+
+
+class TripJobTests(TestCase):
+
+    def simulation(self, current_loc, pickup_loc, dropoff_loc, cycle_used):
+        plan = plan_trip(120, cycle_used)
+        return [[0, 0], [1, 1], [2, 2]], 120, plan.fuel_stop_dicts(), plan.daily_logs()
+
+    def test_submit_then_poll(self):
+        client = Client()
+        with mock.patch.object(job_runner, "workers", 0), \
+                mock.patch("trips.views.real_simulate_trip", self.simulation):
+            submitted = client.post("/api/trip-jobs/", {
+                "driverName": "Ann", "currentLocation": "A", "pickupLocation": "B", "dropoffLocation": "C",
+            }, content_type="application/json")
+            missing_driver = client.post("/api/trip-jobs/", {"driverId": "999"}, content_type="application/json")
+            self.assertEqual(submitted.status_code, 202)
+            self.assertEqual(submitted.json()["status"], TripJob.QUEUED)
+            self.assertEqual(job_runner.run_pending(), 2)
+
+        job = client.get(f"/api/trip-jobs/{submitted.json()['id']}/").json()
+        self.assertEqual((job["status"], job["status_code"]), (TripJob.SUCCEEDED, 201))
+        self.assertEqual(job["result"]["id"], job["trip"])
+        self.assertEqual(len(job["result"]["eldFormData"]), len(Trip.objects.get().logs))
+
+        job = client.get(f"/api/trip-jobs/{missing_driver.json()['id']}/").json()
+        self.assertEqual((job["status"], job["status_code"]), (TripJob.FAILED, 404))
+
+        events = b"".join(client.get(f"/api/trip-jobs/{submitted.json()['id']}/events/").streaming_content)
+        self.assertTrue(events.startswith(b"retry: 1000\n\nevent: succeeded\nid: succeeded\n"))
+
+    def test_non_object_bodies_are_not_queued(self):
+        for url in ("/api/trip-jobs/", "/api/calculate-trips/batch/"):
+            response = Client().post(url, [{"driverName": "Ann"}], content_type="application/json")
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json(), {"error": "The request body must be a JSON object."})
+        self.assertFalse(TripJob.objects.exists())
+
+    def test_requeued_job_saves_one_trip(self):
+        with mock.patch.object(job_runner, "workers", 0), \
+                mock.patch("trips.views.real_simulate_trip", self.simulation):
+            job_id = Client().post("/api/trip-jobs/", {
+                "driverName": "Ann", "currentLocation": "A", "pickupLocation": "B", "dropoffLocation": "C",
+            }, content_type="application/json").json()["id"]
+            self.assertEqual(job_runner.run_pending(), 1)
+            # The job looks abandoned to the next sweep and runs again.
+            TripJob.objects.filter(pk=job_id).update(
+                status=TripJob.RUNNING, started_at=timezone.now() - timedelta(seconds=job_runner.stale_timeout + 1)
+            )
+            job_runner._swept_at = None
+            self.assertEqual(job_runner.run_pending(), 1)
+
+        trip = Trip.objects.get()
+        job = TripJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.trip_id, job.result["id"]), (TripJob.SUCCEEDED, trip.id, trip.id))
+        self.assertEqual(Driver.objects.get().current_cycle_hours_used, trip.cycle_hours_used)
+
+    def test_stale_jobs_are_swept_periodically(self):
+        runner = JobRunner(lambda job: (201, {}, None), workers=0, stale_timeout=60, sweep_interval=30)
+        stale = timezone.now() - timedelta(seconds=61)
+        first = TripJob.objects.create(request={}, status=TripJob.RUNNING, started_at=stale)
+        self.assertEqual(runner.run_pending(), 1)
+        second = TripJob.objects.create(request={}, status=TripJob.RUNNING, started_at=stale)
+        self.assertEqual(runner.run_pending(), 0)
+        with mock.patch("trips.jobs.time.monotonic", return_value=time.monotonic() + 31):
+            self.assertEqual(runner.run_pending(), 1)
+        self.assertEqual(set(TripJob.objects.values_list("status", flat=True)), {TripJob.SUCCEEDED})
+        self.assertEqual(TripJob.objects.filter(pk__in=[first.pk, second.pk]).count(), 2)
+
+    def test_events_stream_closes_after_its_timeout(self):
+        job = TripJob.objects.create(request={})
+        events = "".join(trip_job_events(job.id, poll_interval=0, timeout=0))
+        self.assertEqual(events.count("event: "), 2)
+        self.assertIn("event: queued\nid: queued\n", events)
+        self.assertTrue(events.endswith(f'event: timeout\ndata: {{"id": {job.id}}}\n\n'))
+
+        # A reconnecting client is not told about the status it already saw.
+        events = "".join(trip_job_events(job.id, poll_interval=0, timeout=0, last_event_id=TripJob.QUEUED))
+        self.assertNotIn("event: queued", events)
+        self.assertIn("event: timeout", events)
+
+
+class TripDetailTests(TestCase):
+
+    def make_trip(self, driver, **artifacts):
+        return Trip(driver=driver, current_location="A", pickup_location="B", dropoff_location="C",
+                    cycle_hours_used=1, **artifacts)
+
+    def test_summary_columns(self):
+        plan = plan_trip(1500, 0)
+        logs, fuel_stops = plan.daily_logs(), plan.fuel_stop_dicts()
+        driver = Driver.objects.create(name="Ann")
+        saved = self.make_trip(driver, route=[[0, 0], [1, 1]], logs=logs, fuel_stops=fuel_stops)
+        saved.save()
+        created, = Trip.objects.bulk_create([self.make_trip(driver, route=[], logs=logs, fuel_stops=fuel_stops)])
+        expected = (len(logs), round(duty_hours(logs), 2), len(fuel_stops))
+        self.assertGreater(expected[2], 0)
+        for trip in Trip.objects.filter(pk__in=[saved.pk, created.pk]):
+            self.assertEqual((trip.days, trip.on_duty_hours, trip.fuel_stop_count), expected)
+            self.assertEqual((trip.logs, trip.fuel_stops), (logs, fuel_stops))
+
+    def test_trip_without_detail_row(self):
+        trip = self.make_trip(Driver.objects.create(name="Ann"))
+        trip.save()
+        trip = Trip.objects.get(pk=trip.pk)
+        self.assertFalse(TripDetail.objects.exists())
+        self.assertEqual((trip.route, trip.logs, trip.fuel_stops, trip.eld), (None, None, None, b""))
+        self.assertEqual((trip.days, trip.on_duty_hours, trip.fuel_stop_count), (0, 0, 0))
+
+    def test_backfill_copies_legacy_columns(self):
+        trip = self.make_trip(Driver.objects.create(name="Ann"))
+        trip.save()
+        plan = plan_trip(900, 0)
+        legacy = {"route": [[0, 0], [2, 2]], "logs": plan.daily_logs(), "fuel_stops": plan.fuel_stop_dicts()}
+        with connection.cursor() as cursor:
+            for field, value in legacy.items():
+                cursor.execute(f"ALTER TABLE trips_trip ADD COLUMN {field} text NULL")
+                cursor.execute(f"UPDATE trips_trip SET {field} = %s WHERE id = %s", [json.dumps(value), trip.pk])
+
+        out = io.StringIO()
+        call_command("backfill_trip_details", stdout=out)
+        call_command("backfill_trip_details", stdout=out)
+        self.assertIn("Backfilled 1 trip detail(s).", out.getvalue())
+        self.assertIn("Backfilled 0 trip detail(s).", out.getvalue())
+        trip = Trip.objects.get(pk=trip.pk)
+        self.assertEqual((trip.route, trip.logs, trip.fuel_stops), tuple(legacy.values()))
+        self.assertEqual(trip.eld, pack_eld(legacy["logs"]))
+        self.assertEqual((trip.days, trip.fuel_stop_count), (len(legacy["logs"]), len(legacy["fuel_stops"])))
+
+
+class TripHistoryTests(TestCase):
+
+    def test_cursor_pages_skip_heavy_fields(self):
+        driver, other = Driver.objects.create(name="Ann"), Driver.objects.create(name="Bo")
+        Trip.objects.bulk_create([
+            Trip(driver=driver if i % 3 else other, current_location="A", pickup_location="B",
+                 dropoff_location="C", cycle_hours_used=1, route=[[0, 0]], logs=[], fuel_stops=[])
+            for i in range(45)
+        ])
+        client = Client()
+        seen = []
+        url = f"/api/drivers/{driver.id}/trips/?page_size=7"
+        while url:
+            page = client.get(url).json()
+            self.assertNotIn("route", page["results"][0])
+            seen.extend(trip["id"] for trip in page["results"])
+            url = page["next"]
+        self.assertCountEqual(seen, Trip.objects.filter(driver=driver).values_list("id", flat=True))
+
+        page = client.get(f"/api/trips/?driver={other.id}&include=route,logs").json()
+        self.assertEqual(page["results"][0]["route"], [[0, 0]])
+        self.assertNotIn("fuel_stops", page["results"][0])
+        self.assertEqual(client.get("/api/trips/?until=2000-01-01").json()["results"], [])
+
+    def saved_trip(self):
+        plan = plan_trip(900, 0)
+        trip = Trip(driver=Driver.objects.create(name="Ann"), current_location="A", pickup_location="B",
+                    dropoff_location="C", cycle_hours_used=1, route=[[0, 0], [1, 1]],
+                    logs=plan.daily_logs(), fuel_stops=plan.fuel_stop_dicts())
+        trip.save()
+        return trip
+
+    def test_trip_detail_is_revalidated_with_its_etag(self):
+        trip = self.saved_trip()
+        client = Client()
+        response = client.get(f"/api/trips/{trip.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["route"], [[0, 0], [1, 1]])
+        self.assertEqual(response.json()["eldFormData"], build_eld_log_form(trip.logs))
+        etag = response["ETag"]
+
+        self.assertEqual(client.get(f"/api/trips/{trip.id}/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        compact = client.get(f"/api/trips/{trip.id}/?eld=compact", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(compact.status_code, 200)
+        self.assertNotEqual(compact["ETag"], etag)
+        self.assertEqual(compact.json()["eldFormData"], build_eld_log_form(trip.logs, compact=True))
+        self.assertEqual(client.get("/api/trips/999999/").status_code, 404)
+
+    def test_trip_eld(self):
+        trip = self.saved_trip()
+        client = Client()
+        response = client.get(f"/api/trips/{trip.id}/eld/?eld=compact")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "id": trip.id,
+            "eldStatuses": ["Off Duty", "Sleeper Berth", "Driving", "On Duty", "Cycle Limit Reached"],
+            "eldFormData": build_eld_log_form(trip.logs, compact=True),
+        })
+        etag = response["ETag"]
+        self.assertEqual(client.get(f"/api/trips/{trip.id}/eld/?eld=compact", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        expanded = client.get(f"/api/trips/{trip.id}/eld/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(expanded.status_code, 200)
+        self.assertEqual(expanded.json()["eldFormData"], build_eld_log_form(trip.logs))
+        self.assertEqual(client.get("/api/trips/999999/eld/").status_code, 404)
+
+    def test_unknown_eld_formats_get_the_expanded_etag(self):
+        trip = self.saved_trip()
+        client = Client()
+        for url in (f"/api/trips/{trip.id}/", f"/api/trips/{trip.id}/eld/"):
+            expanded = client.get(url)
+            for value in ("\nfoo", 'a"b', "EXPANDED"):
+                response = client.get(url, {"eld": value})
+                self.assertEqual(response.status_code, 200, value)
+                self.assertEqual(response["ETag"], expanded["ETag"])
+                self.assertEqual(response.json(), expanded.json())
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_fleet_grid_reads_the_stored_eld(self):
+        trips = [self.saved_trip(), self.saved_trip()]
+        fleet = FleetEldGrid.from_queryset(Trip.objects.order_by("id"))
+        expected = FleetEldGrid.from_trips(
+            (trip.id, trip.driver_id, timezone.localdate(trip.created_at), trip.logs) for trip in trips
+        )
+        self.assertEqual(fleet.grid.tolist(), expected.grid.tolist())
+        self.assertEqual(fleet.trip_ids.tolist(), expected.trip_ids.tolist())
+        self.assertEqual(fleet.dates.tolist(), expected.dates.tolist())
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    @override_settings(TIME_ZONE="America/Chicago")
+    def test_fleet_grid_and_ledger_agree_on_local_days(self):
+        trip = self.saved_trip()
+        # 22:00 in Chicago, already the next day in UTC.
+        Trip.objects.filter(pk=trip.pk).update(created_at=datetime(2026, 9, 2, 3, 0, tzinfo=dt_timezone.utc))
+        call_command("rebuild_duty_ledger", stdout=io.StringIO())
+        fleet = FleetEldGrid.from_queryset(Trip.objects.all())
+        self.assertEqual(fleet.dates.tolist()[0], date(2026, 9, 1))
+        ledger = {(entry.driver_id, entry.date): entry.on_duty_minutes for entry in DutyLedgerEntry.objects.all()}
+        self.assertEqual(fleet.driver_on_duty_minutes(), ledger)
+
+
+class GeocodeCacheTests(TestCase):
+
+    def test_lru_evicts_least_recently_used_and_expires(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        with mock.patch("trips.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"size": 1, "max_entries": 2, "hits": 3, "misses": 2, "evictions": 1})
+
+    def test_database_tier_backs_the_memory_tier(self):
+        cache = GeocodeCache(max_entries=10, ttl=60)
+        cache.set("Wichita, KS", [-97.33, 37.69])
+        self.assertEqual(cache.get(" wichita, ks."), [-97.33, 37.69])
+        cache.memory.clear()
+        self.assertEqual(cache.get("Wichita, KS"), [-97.33, 37.69])
+        self.assertEqual(cache.get("Wichita, KS"), [-97.33, 37.69])
+        self.assertIsNone(cache.get("Topeka, KS"))
+        self.assertEqual(cache.stats()["db_hits"], 1)
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (3, 1))
+
+        # Expired in memory: answered by the (still fresh) database row.
+        with mock.patch("trips.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(cache.get("Wichita, KS"), [-97.33, 37.69])
+        self.assertEqual(cache.stats()["db_hits"], 2)
+
+        # Expired in the database: the row is dropped.
+        GeocodeCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        cache.memory.clear()
+        self.assertIsNone(cache.get("Wichita, KS"))
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+        self.assertEqual(cache.stats()["db_misses"], 2)
+
+    def test_prune_drops_expired_then_least_recently_used_rows(self):
+        cache = GeocodeCache(db_max_entries=2, ttl=3600, prune_interval=4)
+        for n, address in enumerate(["A St", "B St", "C St"]):
+            cache.set(address, [n, n])
+            GeocodeCacheEntry.objects.filter(address=normalize_address(address)).update(
+                last_used_at=timezone.now() - timedelta(minutes=10 - n)
+            )
+        GeocodeCacheEntry.objects.filter(address="c st").update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 3)
+        # The fourth write prunes: "c st" has expired and "a st" is the least recently used.
+        cache.set("D St", [3, 3])
+        self.assertCountEqual(GeocodeCacheEntry.objects.values_list("address", flat=True), ["b st", "d st"])
+
+
+class RouteCacheTests(TestCase):
+
+    def test_invalidate_command_reaches_other_workers(self):
+        coords = [[-96.797, 32.7767], [-95.3698, 29.7604]]
+        summary = {"distance": 385000.0, "duration": 13000.0}
+        route_cache.set(coords, DIRECTIONS_PROFILE, summary)
+        # Another process with the route in its in-memory tier.
+        worker = RouteCache(generation_check_seconds=0)
+        self.assertEqual(worker.get(coords, DIRECTIONS_PROFILE), summary)
+
+        out = io.StringIO()
+        call_command("invalidate_route_cache", "--profile", "driving-hgv", stdout=out)
+        self.assertIn("Invalidated 0 cached route(s).", out.getvalue())
+        call_command("invalidate_route_cache", stdout=out)
+        self.assertIn("Invalidated 1 cached route(s).", out.getvalue())
+        self.assertIsNone(worker.get(coords, DIRECTIONS_PROFILE))
+        self.assertIsNone(route_cache.get(coords, DIRECTIONS_PROFILE))
+
+
+    def test_set_many_replaces_geometry_and_prunes_like_set(self):
+        cache = RouteCache(prune_interval=4, generation_check_seconds=0)
+        coords = [[-96.797, 32.7767], [-95.3698, 29.7604]]
+        key = cache.key(coords, DIRECTIONS_PROFILE)
+        cache.set(coords, DIRECTIONS_PROFILE, {"distance": 385000.0, "duration": 13000.0, "geometry": "abc"})
+        cache.set_many(DIRECTIONS_PROFILE, {key: {"distance": 390000.0, "duration": 13500.0}})
+        self.assertIsNone(RouteCacheEntry.objects.get(key=key).geometry)
+        cache.memory.clear()
+        self.assertIsNone(cache.get(coords, DIRECTIONS_PROFILE, with_geometry=True))
+        self.assertEqual(cache.get(coords, DIRECTIONS_PROFILE)["distance"], 390000.0)
+
+        with mock.patch.object(cache, "prune") as prune:
+            cache.set_many(DIRECTIONS_PROFILE, {f"lane-{n}": {"distance": 1.0, "duration": 1.0} for n in range(5)})
+            self.assertEqual(prune.call_count, 1)  # writes 3-7 cross 4
+            cache.set(coords, DIRECTIONS_PROFILE, {"distance": 1.0, "duration": 1.0})
+            self.assertEqual(prune.call_count, 2)  # write 8
+
+
+class FakeORSTripTests(TestCase):
+
+    def setUp(self):
+        self.server = FakeORSServer(seed=1).start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.override(
+            ORS_BASE_URL=self.server.url,
+            ORS_BACKOFF_MAX=0,
+            ORS_RATE_LIMIT_PATH=os.path.join(directory.name, "ratelimit.sqlite3"),
+            ORS_RATE_LIMITS={},
+        )
+
+    def override(self, **overrides):
+        overrides = override_settings(**overrides)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_calculate_trip_end_to_end(self):
+        stops = ["Fake Origin, KS", "Fake Pickup, NE", "Fake Dropoff, CO"]
+        response = Client().post("/api/calculate-trip/", {
+            "driverName": "Ann", "currentLocation": stops[0], "pickupLocation": stops[1], "dropoffLocation": stops[2],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        coords = [fake_coordinates(stop) for stop in stops]
+        geometry = directions_payload(coords, "driving-hgv")["routes"][0]["geometry"]
+        points = decode_polyline(geometry)
+        trip = Trip.objects.get()
+        self.assertEqual(trip.route, simplify_points(points, settings.ROUTE_SIMPLIFY_TOLERANCE))
+        self.assertLess(len(trip.route), len(points))
+        events = [event for day in trip.logs for event in day["events"]]
+        self.assertEqual(events[0]["description"], "Pickup")
+        self.assertEqual(events[0]["coordinates"], coords[1])
+        self.assertEqual(events[-1]["coordinates"], trip.route[-1])
+        meters = road_meters(coords[0], coords[1]) + road_meters(coords[1], coords[2])
+        self.assertAlmostEqual(float(Trip.objects.get().distance), meters / 1609.34, delta=0.1)
+        self.assertEqual(self.server.counts, {"geocode": 3, "directions": 1})
+
+        self.server.error_rate = 1.0
+        response = Client().post("/api/calculate-trip/", {
+            "driverName": "Bo", "currentLocation": "Fake Elsewhere, TX",
+            "pickupLocation": stops[1], "dropoffLocation": stops[2],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.server.errors["geocode"], 1 + settings.ORS_MAX_RETRIES)
+        self.assertFalse(Driver.objects.filter(name="Bo").exists())
+
+    def test_polyline_round_trip(self):
+        points = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+        self.assertEqual(encode_polyline(points), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        self.assertEqual(decode_polyline(encode_polyline(points)), points)
+
+    def test_saturated_rate_limit_answers_503(self):
+        self.override(ORS_RATE_LIMITS={"geocode": 1}, ORS_RATE_LIMIT_BURST=1, ORS_RATE_LIMIT_MAX_WAIT=0)
+        response = Client().post("/api/calculate-trip/", {
+            "driverName": "Ann", "currentLocation": "Limited A", "pickupLocation": "Limited B",
+            "dropoffLocation": "Limited C",
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertLessEqual(self.server.counts.get("geocode", 0), 1)
+
+    def drain_ors_pool(self):
+        # Returns once every pool thread is free, i.e. lookups in flight have finished.
+        barrier = threading.Barrier(settings.ORS_MAX_WORKERS)
+        for future in [ors_executor.submit(barrier.wait, 5) for _ in range(settings.ORS_MAX_WORKERS)]:
+            future.result()
+
+    def test_geocode_fan_out_stores_every_result(self):
+        addresses = [f"Fan-out stop {n}, KS" for n in range(12)]
+        self.server.latency = 0.05
+        self.assertEqual(geocode_addresses(addresses + addresses[:3]),
+                         [fake_coordinates(address) for address in addresses + addresses[:3]])
+        self.assertEqual(self.server.counts, {"geocode": 12})
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 12)
+
+        self.override(ORS_MAX_RETRIES=0)
+        self.server.fail_next(1, 503)
+        results = geocode_addresses([f"Partial stop {n}, KS" for n in range(4)], return_exceptions=True)
+        self.assertEqual(sum(isinstance(result, Exception) for result in results), 1)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 15)
+
+    def test_first_geocode_failure_cancels_the_rest(self):
+        self.override(ORS_MAX_RETRIES=0)
+        self.server.latency = 0.2
+        self.server.fail_next(1, 503)
+        addresses = [f"Cancelled stop {n}, KS" for n in range(settings.ORS_MAX_WORKERS * 3)]
+        with self.assertRaisesRegex(Exception, "Geocoding failed for address: Cancelled stop"):
+            geocode_addresses(addresses)
+        self.drain_ors_pool()
+        # Only lookups already running (or picked up as the first one failed) reached ORS.
+        self.assertLessEqual(self.server.counts["geocode"], settings.ORS_MAX_WORKERS * 2)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_geocode_batch_timeout_cancels_the_rest(self):
+        self.server.latency = 0.3
+        addresses = [f"Slow stop {n}, KS" for n in range(settings.ORS_MAX_WORKERS * 3)]
+        started = time.monotonic()
+        with self.assertRaisesRegex(Exception, "Geocoding timed out for address: Slow stop"):
+            geocode_addresses(addresses, timeout=0.05)
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.drain_ors_pool()
+        self.assertEqual(self.server.counts["geocode"], settings.ORS_MAX_WORKERS)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_repeated_trip_is_geocoded_from_the_cache(self):
+        stops = {"driverName": "Ann", "currentLocation": "Cached Origin, KS", "pickupLocation": "Cached Pickup, NE",
+                 "dropoffLocation": "Cached Dropoff, CO"}
+        for _ in range(2):
+            self.assertEqual(Client().post("/api/calculate-trip/", stops, content_type="application/json").status_code, 201)
+        self.assertEqual(self.server.counts, {"geocode": 3, "directions": 1})
+        # Another worker (empty memory tier) is answered by the database tier.
+        geocode_cache.memory.clear()
+        self.assertEqual(Client().post("/api/calculate-trip/", stops, content_type="application/json").status_code, 201)
+        self.assertEqual(self.server.counts, {"geocode": 3, "directions": 1})
+
+    async def test_async_calculate_trip(self):
+        stops = ["Async Origin, KS", "Async Pickup, NE", "Async Dropoff, CO"]
+        response = await AsyncClient().post("/api/async/calculate-trip/", {
+            "driverName": "Ann", "currentLocation": stops[0], "pickupLocation": stops[1], "dropoffLocation": stops[2],
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        trip = await Trip.objects.select_related("driver", "detail").aget(id=response.json()["id"])
+        self.assertEqual(trip.driver.name, "Ann")
+        geometry = directions_payload([fake_coordinates(stop) for stop in stops], "driving-hgv")["routes"][0]["geometry"]
+        self.assertEqual(trip.route, simplify_points(decode_polyline(geometry), settings.ROUTE_SIMPLIFY_TOLERANCE))
+        self.assertEqual(self.server.counts, {"geocode": 3, "directions": 1})
+
+    async def test_async_calculate_trip_rejects_invalid_requests(self):
+        client = AsyncClient()
+        for body in ('{"currentLocation": ', '["Async Origin"]', json.dumps({"currentLocation": "Async Origin"})):
+            response = await client.post("/api/async/calculate-trip/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.json())
+        self.assertFalse(await Trip.objects.aexists())
+        self.assertEqual(self.server.counts, {})
+
+    async def test_async_calculate_trip_answers_503_when_rate_limited(self):
+        self.override(ORS_RATE_LIMITS={"geocode": 1}, ORS_RATE_LIMIT_BURST=1, ORS_RATE_LIMIT_MAX_WAIT=0)
+        response = await AsyncClient().post("/api/async/calculate-trip/", {
+            "driverName": "Ann", "currentLocation": "Async Limited A", "pickupLocation": "Async Limited B",
+            "dropoffLocation": "Async Limited C",
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "60")
+        self.assertLessEqual(self.server.counts.get("geocode", 0), 1)
+        self.assertFalse(await Trip.objects.aexists())
+
+    def test_calculate_trip_rejects_a_non_object_body(self):
+        response = Client().post("/api/calculate-trip/", ["Fake Origin"], content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "The request body must be a JSON object."})
+
+    def post_batch(self, trips):
+        response = Client().post("/api/calculate-trips/batch/", {"trips": trips}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        return {line["index"]: line for line in lines}
+
+    def test_batch_streams_one_line_per_trip(self):
+        stops = {"currentLocation": "Batch Origin", "pickupLocation": "Batch Pickup", "dropoffLocation": "Batch Dropoff"}
+        lines = self.post_batch([
+            {"driverName": "Ann", **stops},
+            {"driverName": "Ann", **stops, "pickupLocation": ""},
+            "not a trip",
+            {"driverId": "999999", **stops},
+            {"driverName": "Ann", **stops, "dropoffLocation": "Batch Elsewhere"},
+        ])
+        self.assertEqual({index: line["status"] for index, line in lines.items()},
+                         {0: 201, 1: 400, 2: 400, 3: 404, 4: 201})
+        self.assertEqual(lines[1]["error"], "pickupLocation is required.")
+        self.assertEqual(lines[3]["error"], "Driver not found.")
+        self.assertEqual(set(lines[0]["trip"]) >= {"id", "route", "logs", "fuel_stops", "eldFormData"}, True)
+        # One driver is created for both of Ann's trips, and the second starts
+        # from the cycle hours left by the first.
+        trips = Trip.objects.order_by("id")
+        self.assertEqual([trip.pk for trip in trips], [lines[0]["trip"]["id"], lines[4]["trip"]["id"]])
+        self.assertEqual(len({trip.driver_id for trip in trips}), 1)
+        # Both lanes start at the same two stops: one matrix request sizes them.
+        self.assertEqual(self.server.counts, {"geocode": 4, "matrix": 1})
+        self.assertEqual(lines[4]["trip"]["route"], [fake_coordinates(address) for address in (
+            "Batch Origin", "Batch Pickup", "Batch Elsewhere")])
+
+    def test_batch_with_many_unique_addresses_is_paced(self):
+        # 120 distinct addresses through a limiter that lets 100/s through:
+        # an interactive caller would be rejected, and the lookups take longer
+        # than ORS_TIMEOUT, which used to be the deadline for all of them.
+        self.override(ORS_RATE_LIMITS={"geocode": 6000, "directions": 6000}, ORS_RATE_LIMIT_BURST=5,
+                      ORS_RATE_LIMIT_MAX_WAIT=0, ORS_TIMEOUT=0.5)
+        lines = self.post_batch([
+            {"driverName": f"Driver {n}", "currentLocation": f"Paced {n} A", "pickupLocation": f"Paced {n} B",
+             "dropoffLocation": f"Paced {n} C"}
+            for n in range(40)
+        ])
+        self.assertEqual(sorted(lines), list(range(40)))
+        self.assertEqual({line["status"] for line in lines.values()}, {201})
+        self.assertEqual(self.server.counts["geocode"], 120)
+
+    def test_matrix_grid_is_chunked_and_cached(self):
+        origins = [fake_coordinates(f"Matrix origin {n}") for n in range(5)]
+        destinations = [fake_coordinates(f"Matrix destination {n}") for n in range(4)]
+        # At most 8 cells per request: 3 chunks of 2 origins x 4 destinations.
+        service = MatrixDistanceService(max_locations=6, max_elements=8)
+        self.assertEqual(service.request_count(5, 4), 3)
+        grid = service.lookup(origins, destinations)
+        self.assertEqual(self.server.counts, {"matrix": 3})
+        self.assertAlmostEqual(grid[4][3]["distance"], road_meters(origins[4], destinations[3]), delta=0.1)
+
+        self.assertEqual(MatrixDistanceService().lookup(origins, destinations), grid)
+        self.assertEqual(self.server.counts, {"matrix": 3})
+
+    def test_bulk_callers_queue_for_the_rate_limit(self):
+        self.override(ORS_RATE_LIMITS={"geocode": 600}, ORS_RATE_LIMIT_BURST=1, ORS_RATE_LIMIT_MAX_WAIT=0)
+        get_client().geocode("Queued A")
+        with self.assertRaises(ORSRateLimited):
+            get_client().geocode("Queued B")
+        # Lookups submitted to the ORS pool inside the block inherit its wait.
+        with rate_limit_max_wait(1):
+            futures = [ors_executor.submit(get_client().geocode, f"Queued {n}") for n in range(3)]
+        self.assertEqual([future.result().status_code for future in futures], [200, 200, 200])
+
+        async def geocode():
+            with rate_limit_max_wait(1):
+                return await get_async_client().geocode("Queued async")
+        self.assertEqual(asyncio.run(geocode()).status_code, 200)
+        self.assertEqual(self.server.counts["geocode"], 5)
+
+
+class ORSClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = FakeORSServer().start()
+        self.addCleanup(self.server.stop)
+        self.sleeps = []
+        patcher = mock.patch("trips.ors.time.sleep", self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ors_client(self, base_url=None, **options):
+        return ORSClient("key", base_url=base_url or self.server.url, max_retries=2, backoff_max=4, **options)
+
+    def test_retries_429_and_5xx_until_success(self):
+        client = self.ors_client()
+        self.server.fail_next(1, 429)
+        self.server.fail_next(1, 503)
+        response = client.geocode("Retry Town, KS")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.counts, {"geocode": 3})
+        self.assertEqual(len(self.sleeps), 2)
+        metrics = client.metrics()["geocode"]
+        self.assertEqual((metrics["count"], metrics["errors"], metrics["retries"]), (3, 2, 2))
+
+        client.directions([fake_coordinates("A"), fake_coordinates("B")], "driving-hgv")
+        self.assertEqual(client.metrics()["directions"]["count"], 1)
+        self.assertEqual(client.metrics()["geocode"]["count"], 3)
+
+    def test_gives_up_after_max_retries(self):
+        client = self.ors_client()
+        self.server.fail_next(3, 503)
+        self.assertEqual(client.geocode("Retry Town, KS").status_code, 503)
+        self.assertEqual(self.server.counts, {"geocode": 3})
+        metrics = client.metrics()["geocode"]
+        self.assertEqual((metrics["count"], metrics["errors"], metrics["retries"]), (3, 3, 2))
+        # 4xx answers are the caller's to interpret, not retried.
+        self.assertEqual(self.ors_client().request("geocode", "GET", "/missing").status_code, 404)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_retry_after_is_honored_up_to_backoff_max(self):
+        self.server.retry_after = 2
+        self.server.fail_next(1, 429)
+        self.ors_client().geocode("Retry Town, KS")
+        self.server.retry_after = 30
+        self.server.fail_next(1, 429)
+        self.ors_client().geocode("Retry Town, KS")
+        self.assertEqual(self.sleeps, [2.0, 4.0])
+
+    def test_connection_errors_are_retried_then_raised(self):
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            port = closed.getsockname()[1]
+        client = self.ors_client(base_url=f"http://127.0.0.1:{port}", backoff_base=0.5)
+        with self.assertRaisesRegex(ORSError, "ORS geocode request failed"):
+            client.geocode("Nowhere, KS")
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 <= seconds <= 4 for seconds in self.sleeps))
+        metrics = client.metrics()["geocode"]
+        self.assertEqual((metrics["count"], metrics["errors"], metrics["retries"]), (3, 3, 2))
+
+
+class GazetteerTests(TestCase):
+
+    def setUp(self):
+        for name, lng, lat, weight in [
+            ("Dallas, TX", -96.797, 32.7767, 1300000),
+            ("Springfield, IL", -89.6501, 39.7817, 114000),
+            ("Springfield, MO", -93.2923, 37.2089, 169000),
+        ]:
+            GazetteerEntry.objects.create(name=name, normalized=name.lower(), longitude=lng, latitude=lat, weight=weight)
+        gazetteer.reload()
+        self.addCleanup(gazetteer.clear)
+
+    def test_autocomplete_matches_prefixes_and_typos(self):
+        response = Client().get("/api/geocode/autocomplete/", {"q": "spring"})
+        self.assertEqual([result["label"] for result in response.json()["results"]],
+                         ["Springfield, MO", "Springfield, IL"])
+        response = Client().get("/api/geocode/autocomplete/", {"q": "Dalas"})
+        self.assertEqual(response.json()["results"][0]["label"], "Dallas, TX")
+        self.assertEqual(response.json()["results"][0]["coordinates"], [-96.797, 32.7767])
+        self.assertEqual(Client().get("/api/geocode/autocomplete/", {"q": "d"}).json(), {"results": []})
+
+    def test_exact_matches_resolve_without_ors(self):
+        with mock.patch("trips.views.fetch_geocode", side_effect=AssertionError("ORS called")):
+            self.assertEqual(geocode_address(" dallas, tx."), [-96.797, 32.7767])
+        with mock.patch("trips.views.fetch_geocode", return_value=[-97.33, 37.69]):
+            geocode_address("Wichita, KS")
+        self.assertEqual(gazetteer.suggest("wichta")[0][0][0], "Wichita, KS")
+        gazetteer.reload()
+        self.assertEqual(gazetteer.suggest("wichta")[0][0][0], "Wichita, KS")
+
+    def test_addresses_geocoded_during_a_rebuild_are_kept(self):
+        entries = load_entries
+
+        def load_while_geocoding():
+            # Geocoded after the rebuild has read the database.
+            rows = list(entries())
+            store_geocode("Topeka, KS", [-95.68, 39.05])
+            return rows
+
+        with mock.patch("trips.gazetteer.load_entries", load_while_geocoding):
+            gazetteer.reload()
+        self.assertEqual(gazetteer.lookup("topeka, ks"), [-95.68, 39.05])
+        self.assertEqual(gazetteer.suggest("Topeka")[0][0][0], "Topeka, KS")
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+
+    def test_processes_share_the_bucket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ratelimit.sqlite3")
+            # Two limiters on one file stand in for two worker processes.
+            first = TokenBucketLimiter(path, {"geocode": 600}, burst=2, max_wait=0.25)
+            second = TokenBucketLimiter(path, {"geocode": 600}, burst=2, max_wait=0.25)
+            self.assertEqual([first.reserve("geocode"), second.reserve("geocode")], [0.0, 0.0])
+            waits = [first.reserve("geocode"), second.reserve("geocode")]
+            self.assertAlmostEqual(waits[0], 0.1, delta=0.02)
+            self.assertAlmostEqual(waits[1], 0.2, delta=0.02)
+            with self.assertRaises(RateLimitExceeded):
+                first.reserve("geocode")
+            self.assertEqual(first.reserve("directions"), 0.0)
+
+
+class RoadGraphTests(SimpleTestCase):
+    # A 12 x 12 grid of residential streets with a primary road every
+    # fourth row; row 4 is one-way eastbound and a footway is left out.
+    SIZE = 12
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        size = cls.SIZE
+        rows = ['<osm version="0.6">']
+        for r in range(size):
+            for c in range(size):
+                rows.append(f'<node id="{r * size + c + 1}" lat="{39 + r * 0.01}" lon="{-95 + c * 0.01}"/>')
+        for r in range(size):
+            tags = f'<tag k="highway" v="{"primary" if r % 4 == 0 else "residential"}"/>'
+            if r == 4:
+                tags += '<tag k="oneway" v="yes"/>'
+            refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for c in range(size))
+            rows.append(f'<way id="{r + 1}">{refs}{tags}</way>')
+        for c in range(size):
+            refs = "".join(f'<nd ref="{r * size + c + 1}"/>' for r in range(size))
+            rows.append(f'<way id="{100 + c}">{refs}<tag k="highway" v="residential"/></way>')
+        rows.append('<way id="999"><nd ref="1"/><nd ref="2"/><tag k="highway" v="footway"/></way></osm>')
+        coords, ways = read_osm(io.BytesIO("".join(rows).encode()))
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "graph.bin")
+        build_road_graph(coords, ways, cls.path)
+        cls.graph = RoadGraph(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def dijkstra(self, source, target):
+        graph = self.graph
+        distances = {source: 0.0}
+        queue = [(0.0, source)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if node == target:
+                return distance
+            if distance > distances[node]:
+                continue
+            for edge in range(graph.offsets[node], graph.offsets[node + 1]):
+                neighbor, candidate = graph.targets[edge], distance + graph.seconds[edge]
+                if candidate < distances.get(neighbor, float("inf")):
+                    distances[neighbor] = candidate
+                    heapq.heappush(queue, (candidate, neighbor))
+
+    def test_bidirectional_astar_matches_dijkstra(self):
+        self.assertEqual(self.graph.node_count, self.SIZE * self.SIZE)
+        rng = random.Random(7)
+        for _ in range(50):
+            source, target = rng.randrange(self.graph.node_count), rng.randrange(self.graph.node_count)
+            seconds, meters, nodes = self.graph.shortest_path(source, target)
+            self.assertAlmostEqual(seconds, self.dijkstra(source, target), places=3)
+            self.assertEqual((nodes[0], nodes[-1]), (source, target))
+
+        west, east = [-95, 39.04], [-94.89, 39.04]
+        self.assertLess(self.graph.route_summary([west, east])["duration"],
+                        self.graph.route_summary([east, west])["duration"])
+        with self.assertRaises(RouteNotFound):
+            self.graph.route_summary([[-80, 30], east])
+
+    def test_offline_provider_answers_route_summaries(self):
+        stops = [[-95, 39], [-94.9, 39.1]]
+        with override_settings(ROUTING_PROVIDER="offline", ROAD_GRAPH_PATH=self.path):
+            summary = get_route_summary(stops, with_geometry=True)
+        self.assertEqual(summary, self.graph.route_summary(stops, with_geometry=True))
+        self.assertEqual(decode_polyline(summary["geometry"])[-1], stops[-1])
@@ -1,13 +1,41 @@
 import os
-import requests
+import json
+import math
+import time
+import asyncio
+from functools import lru_cache
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from concurrent.futures import ALL_COMPLETED, FIRST_EXCEPTION, as_completed, wait
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import TripSerializer
-from .models import Trip, Driver
+from .serializers import PlannedTripSerializer, TripJobSerializer, TripSerializer
+from .models import Trip, TripJob, Driver
+from .coalesce import SingleFlight
+from .geo import RouteLine
+from .gazetteer import gazetteer
+from .geocoding import geocode_cache, normalize_address
+from .ors import ORSRateLimited, get_async_client, get_client, ors_executor, rate_limit_max_wait
+from .roadgraph import RouteNotFound, get_offline_router
+from .routing import DIRECTIONS_PROFILE, route_cache
+from .eld import eld_form_response
+from .hos import duty_hours
+from .jobs import JobRunner, commit_job_trip
+from .ledger import cycle_hours_by_driver, cycle_hours_used, duty_minutes_by_date, record_duty_minutes, record_trip_duty
+from .matrix import MatrixDistanceService
+from .planner import plan_trip
+from .polyline import decode_polyline
 
 load_dotenv()
 
@@ -16,298 +44,814 @@ ORS_API_KEY = os.environ.get("ORS_API_KEY")
 if not ORS_API_KEY:
     raise Exception("ORS_API_KEY not set in environment variables.")
 
-# Constants for HOS rules and cycle limits
-MAX_CYCLE_HOURS = 70.0        # Maximum allowed cycle hours per cycle
-PICKUP_DURATION = 1.0         # 1-hour pickup event
-DROPOFF_DURATION = 1.0        # 1-hour dropoff event
-DRIVING_LIMIT = 11.0          # Maximum 11 hours driving per day
-ONDUTY_LIMIT = 14.0           # Maximum 14 hours on-duty per day
-BREAK_AFTER_DRIVING = 8.0     # 30-minute break after 8 hours driving
-BREAK_DURATION = 0.5          # 0.5 hours (30 minutes)
-REST_DURATION = 10.0          # 10-hour mandatory off-duty rest
-FUEL_MILE_INTERVAL = 1000.0   # Fueling stop every 1000 miles
-AVERAGE_SPEED = 50.0          # Average speed in mph
+# Identical geocode / directions lookups in flight at the same time (e.g.
+# many dispatchers planning out of one yard) share a single ORS request.
+geocode_flights = SingleFlight("geocode")
+directions_flights = SingleFlight("directions")
 
-def geocode_address(address):
-    geocode_url = "https://api.openrouteservice.org/geocode/search"
-    params = {
-        "api_key": ORS_API_KEY,
-        "text": address,
-        "size": 1
-    }
-    response = requests.get(geocode_url, params=params)
+def fetch_geocode(address):
+    """
+    Geocodes address with ORS. Concurrent lookups of the same address share
+    one request, whose result is put in the in-process cache before the
+    waiters are released (callers still persist it with store_geocode).
+    """
+    return geocode_flights.do(normalize_address(address), _fetch_geocode, address)
+
+def _fetch_geocode(address):
+    # A flight that just landed may have answered this already.
+    cached = geocode_cache.recall(address)
+    if cached is not None:
+        return cached
+    response = get_client().geocode(address)
     if response.status_code == 200:
         data = response.json()
         if data.get("features"):
-            return data["features"][0]["geometry"]["coordinates"]
+            coords = data["features"][0]["geometry"]["coordinates"]
+            geocode_cache.remember(address, coords)
+            return coords
     raise Exception(f"Geocoding failed for address: {address}")
 
-def get_directions(route_coords):
-    directions_url = "https://api.openrouteservice.org/v2/directions/driving-car"
-    headers = {
-        "Authorization": ORS_API_KEY,
-        "Content-Type": "application/json"
-    }
-    body = {
-        "coordinates": route_coords
-    }
-    dir_resp = requests.post(directions_url, json=body, headers=headers)
+def lookup_geocode(address):
+    """
+    Coordinates for address without calling ORS: the geocode cache first,
+    then an exact match in the local gazetteer. None when neither knows it.
+    """
+    cached = geocode_cache.get(address)
+    if cached is None:
+        cached = gazetteer.lookup(address)
+    return cached
+
+def store_geocode(address, coords):
+    geocode_cache.set(address, coords)
+    gazetteer.add(address, coords)
+
+def geocode_address(address):
+    cached = lookup_geocode(address)
+    if cached is not None:
+        return cached
+    coords = fetch_geocode(address)
+    store_geocode(address, coords)
+    return coords
+
+def bulk_lookup_timeout(count, endpoint):
+    """
+    Deadline for count ORS lookups fanned out on the shared pool:
+    ORS_TIMEOUT for every round of ORS_MAX_WORKERS lookups, plus the time
+    the shared rate limit for endpoint needs to let count requests through.
+    """
+    rounds = max(1, math.ceil(count / settings.ORS_MAX_WORKERS))
+    rate = settings.ORS_RATE_LIMITS.get(endpoint) or 0
+    return settings.ORS_TIMEOUT * rounds + (count * 60.0 / rate if rate else 0.0)
+
+def geocode_addresses(addresses, timeout=None, return_exceptions=False, bulk=False):
+    """
+    Geocodes several addresses at once. Cache and gazetteer hits are answered inline;
+    the misses are fetched concurrently on the shared ORS thread pool.
+    If any lookup fails or the whole batch exceeds the timeout, the
+    remaining lookups are cancelled and the error is raised; with
+    return_exceptions the failed addresses get the exception in their
+    slot instead and the other lookups carry on. The timeout defaults to
+    ORS_TIMEOUT, or with bulk to bulk_lookup_timeout() for the misses.
+    Returns coordinates in the same order as addresses.
+    """
+    resolved = {}
+    for address in addresses:
+        if address not in resolved:
+            resolved[address] = lookup_geocode(address)
+
+    misses = [address for address, coords in resolved.items() if coords is None]
+    if timeout is None:
+        timeout = bulk_lookup_timeout(len(misses), "geocode") if bulk else settings.ORS_TIMEOUT
+    futures = {ors_executor.submit(fetch_geocode, address): address for address in misses}
+    if futures:
+        return_when = ALL_COMPLETED if return_exceptions else FIRST_EXCEPTION
+        done, not_done = wait(futures, timeout=timeout, return_when=return_when)
+        for future in not_done:
+            future.cancel()
+        if not return_exceptions:
+            failed = next((f for f in done if f.exception() is not None), None)
+            if failed is not None:
+                raise failed.exception()
+            if not_done:
+                pending = ", ".join(address for f, address in futures.items() if f in not_done)
+                raise Exception(f"Geocoding timed out for address: {pending}")
+        for future, address in futures.items():
+            if future in not_done:
+                resolved[address] = Exception(f"Geocoding timed out for address: {address}")
+            elif future.exception() is not None:
+                resolved[address] = future.exception()
+            else:
+                coords = future.result()
+                store_geocode(address, coords)
+                resolved[address] = coords
+
+    return [resolved[address] for address in addresses]
+
+def offline_route(route_coords, method, *args):
+    """
+    Calls method ("directions" or "route_summary") of the local road graph
+    when ROUTING_PROVIDER is "offline". Returns None when the graph is not
+    in use, or cannot route the stops and ROUTING_FALLBACK_TO_ORS is set.
+    """
+    router = get_offline_router()
+    if router is None:
+        return None
+    try:
+        return getattr(router, method)(route_coords, *args)
+    except RouteNotFound as e:
+        if settings.ROUTING_FALLBACK_TO_ORS:
+            return None
+        raise Exception(f"Directions API error: {e}")
+
+def get_directions(route_coords, profile=DIRECTIONS_PROFILE):
+    offline = offline_route(route_coords, "directions", profile)
+    if offline is not None:
+        return offline
+    dir_resp = get_client().directions(route_coords, profile=profile)
     if dir_resp.status_code != 200:
         raise Exception("Directions API error: " + dir_resp.text)
     return dir_resp.json()
 
-def real_simulate_trip(current_loc, pickup_loc, dropoff_loc, cycle_used):
-    # --- Step 1: Geocode Addresses ---
-    current_coords = geocode_address(current_loc)
-    pickup_coords = geocode_address(pickup_loc)
-    dropoff_coords = geocode_address(dropoff_loc)
-    route_coords = [current_coords, pickup_coords, dropoff_coords]
-
-    # --- Step 2: Get Directions and Calculate Distance ---
-    directions_data = get_directions(route_coords)
-    summary = directions_data["routes"][0]["summary"]
-    distance_meters = summary["distance"]
-    distance_miles = distance_meters / 1609.34
-    distance_miles = round(distance_miles, 2)
-    total_driving_hours = distance_miles / AVERAGE_SPEED
-
-    # --- Step 3: Initialize Simulation Variables ---
-    def format_time(time_obj):
-        return time_obj.strftime("%H:%M")
-
-    daily_logs = []
-    day_index = 1
-    current_day_events = []
-    day_start = datetime.strptime("06:00", "%H:%M")
-    current_time = day_start
-    on_duty_hours = 0.0
-    driving_hours_today = 0.0
-    remaining_driving = total_driving_hours
-    remaining_cycle_hours = MAX_CYCLE_HOURS - cycle_used
-    cumulative_miles = 0.0
-    next_fuel_mile = FUEL_MILE_INTERVAL
-    fuel_stops = []
-
-    # --- Add Pickup Event (1 hour) ---
-    pickup_event = {
-        "status": "On Duty",
-        "start": format_time(current_time),
-        "end": format_time(current_time + timedelta(hours=PICKUP_DURATION)),
-        "description": "Pickup"
+def parse_route_summary(directions_data, with_geometry=False):
+    route = directions_data["routes"][0]
+    summary = {
+        "distance": route["summary"].get("distance", 0.0),
+        "duration": route["summary"].get("duration", 0.0),
     }
-    current_day_events.append(pickup_event)
-    current_time += timedelta(hours=PICKUP_DURATION)
-    on_duty_hours += PICKUP_DURATION
-
-    # --- Simulate Driving with HOS and Cycle Limit Integration ---
-    while remaining_driving > 0:
-        daily_available = min(DRIVING_LIMIT - driving_hours_today, ONDUTY_LIMIT - on_duty_hours)
-        available_cycle_hours = remaining_cycle_hours - on_duty_hours
-
-        if available_cycle_hours <= 0 or daily_available <= 0:
-            cycle_event = {
-                "status": "Cycle Limit Reached",
-                "start": format_time(current_time),
-                "end": format_time(current_time),
-                "description": "Driver has reached the maximum cycle hours."
-            }
-            current_day_events.append(cycle_event)
-            daily_logs.append({
-                "dayIndex": day_index,
-                "events": current_day_events
-            })
-            break
-
-        drive_segment = min(1.0, remaining_driving, daily_available, available_cycle_hours)
-        if drive_segment <= 0:
-            off_duty_event = {
-                "status": "Off Duty",
-                "start": format_time(current_time),
-                "end": format_time(current_time + timedelta(hours=REST_DURATION)),
-                "description": "End of day rest"
-            }
-            current_day_events.append(off_duty_event)
-            daily_logs.append({
-                "dayIndex": day_index,
-                "events": current_day_events
-            })
-            day_index += 1
-            current_day_events = []
-            current_time = day_start + timedelta(days=day_index - 1)
-            on_duty_hours = 0.0
-            driving_hours_today = 0.0
-            continue
-
-        start_time = current_time
-        end_time = current_time + timedelta(hours=drive_segment)
-        driving_event = {
-            "status": "Driving",
-            "start": format_time(start_time),
-            "end": format_time(end_time),
-            "description": f"Driving segment for {drive_segment:.1f} hour(s)"
-        }
-        current_day_events.append(driving_event)
-        driving_hours_today += drive_segment
-        on_duty_hours += drive_segment
-        remaining_driving -= drive_segment
-        current_time = end_time
-
-        segment_miles = AVERAGE_SPEED * drive_segment
-        cumulative_miles += segment_miles
-
-        if cumulative_miles >= next_fuel_mile:
-            fuel_event = {
-                "status": "On Duty",
-                "start": format_time(current_time),
-                "end": format_time(current_time + timedelta(minutes=15)),
-                "description": "Fueling Stop"
-            }
-            current_day_events.append(fuel_event)
-            fuel_stops.append({
-                "mile": next_fuel_mile,
-                "location": f"Fuel Stop at mile {next_fuel_mile}"
-            })
-            on_duty_hours += 0.25
-            current_time += timedelta(minutes=15)
-            next_fuel_mile += FUEL_MILE_INTERVAL
-
-        if driving_hours_today >= BREAK_AFTER_DRIVING and remaining_driving > 0:
-            break_event = {
-                "status": "On Duty",
-                "start": format_time(current_time),
-                "end": format_time(current_time + timedelta(minutes=30)),
-                "description": "30-minute Break"
-            }
-            current_day_events.append(break_event)
-            on_duty_hours += BREAK_DURATION
-            current_time += timedelta(minutes=30)
-
-        if driving_hours_today >= DRIVING_LIMIT or on_duty_hours >= ONDUTY_LIMIT:
-            off_duty_event = {
-                "status": "Off Duty",
-                "start": format_time(current_time),
-                "end": format_time(current_time + timedelta(hours=REST_DURATION)),
-                "description": "End of day rest"
-            }
-            current_day_events.append(off_duty_event)
-            daily_logs.append({
-                "dayIndex": day_index,
-                "events": current_day_events
-            })
-            day_index += 1
-            current_day_events = []
-            current_time = day_start + timedelta(days=day_index - 1)
-            on_duty_hours = 0.0
-            driving_hours_today = 0.0
-
-    if remaining_driving <= 0:
-        dropoff_event = {
-            "status": "On Duty",
-            "start": format_time(current_time),
-            "end": format_time(current_time + timedelta(hours=DROPOFF_DURATION)),
-            "description": "Dropoff"
-        }
-        current_day_events.append(dropoff_event)
-        on_duty_hours += DROPOFF_DURATION
-        daily_logs.append({
-            "dayIndex": day_index,
-            "events": current_day_events
-        })
+    if with_geometry and route.get("geometry"):
+        summary["geometry"] = route["geometry"]
+    return summary
+
+def fetch_route_summary(route_coords, profile=DIRECTIONS_PROFILE, with_geometry=False):
+    """Looks the route up with ORS; concurrent lookups of the same lane share one request (see fetch_geocode)."""
+    key = (route_cache.key(route_coords, profile), with_geometry)
+    return directions_flights.do(key, _fetch_route_summary, route_coords, profile, with_geometry)
+
+def _fetch_route_summary(route_coords, profile, with_geometry):
+    cached = route_cache.recall(route_coords, profile, with_geometry)
+    if cached is not None:
+        return cached
+    summary = parse_route_summary(get_directions(route_coords, profile), with_geometry)
+    route_cache.remember(route_coords, profile, summary)
+    return summary
+
+def get_route_summary(route_coords, profile=DIRECTIONS_PROFILE, with_geometry=False):
+    """
+    Returns {"distance": meters, "duration": seconds} for the route, plus
+    "geometry" (encoded polyline) when with_geometry is set. Lanes already
+    planned are served from the route cache without calling ORS. With the
+    offline provider, the local road graph answers without the cache.
+    """
+    offline = offline_route(route_coords, "route_summary", profile, with_geometry)
+    if offline is not None:
+        return offline
+    cached = route_cache.get(route_coords, profile, with_geometry)
+    if cached is not None:
+        return cached
+    summary = fetch_route_summary(route_coords, profile, with_geometry)
+    route_cache.set(route_coords, profile, summary)
+    return summary
+
+# Decoded route lines kept per process. A long-haul geometry can have tens
+# of thousands of vertices (a few MB as Python lists), so keep this small.
+ROUTE_LINE_CACHE_SIZE = 32
+
+@lru_cache(maxsize=ROUTE_LINE_CACHE_SIZE)
+def _geometry_route_line(geometry, distance_miles):
+    return RouteLine(decode_polyline(geometry), distance_miles)
+
+def trip_route_line(route_coords, summary, distance_miles):
+    """
+    RouteLine along the directions geometry of summary, or along the
+    straight legs between route_coords when the summary has none (e.g. one
+    built from the matrix API). Lines decoded from a geometry are kept for
+    the next trip on the same lane.
+    """
+    if summary.get("geometry"):
+        return _geometry_route_line(summary["geometry"], distance_miles)
+    return RouteLine(route_coords, distance_miles)
+
+def stored_route(route_line):
+    """The route vertices saved on Trip.route: route_line simplified to ROUTE_SIMPLIFY_TOLERANCE."""
+    return route_line.simplified(settings.ROUTE_SIMPLIFY_TOLERANCE)
+
+def resolve_trip_route(current_loc, pickup_loc, dropoff_loc, router=None):
+    """
+    Geocodes the three stops and looks up the driving route between them.
+    router is any callable with the get_route_summary contract (e.g.
+    MatrixDistanceService.route_summary); it defaults to get_route_summary
+    with the route geometry.
+    Returns (route_coords, distance_miles, route_line).
+    """
+    route_coords = geocode_addresses([current_loc, pickup_loc, dropoff_loc])
+    summary = router(route_coords) if router else get_route_summary(route_coords, with_geometry=True)
+    distance_miles = round(summary["distance"] / 1609.34, 2)
+    return route_coords, distance_miles, trip_route_line(route_coords, summary, distance_miles)
+
+def real_simulate_trip(current_loc, pickup_loc, dropoff_loc, cycle_used, router=None):
+    # --- Step 1: Geocode Addresses and Get Directions ---
+    route_coords, distance_miles, route_line = resolve_trip_route(current_loc, pickup_loc, dropoff_loc, router)
+
+    # --- Step 2: Plan HOS Events, placed along the route ---
+    plan = plan_trip(distance_miles, cycle_used)
+
+    return (stored_route(route_line), distance_miles, plan.fuel_stop_dicts(route_line),
+            plan.daily_logs(route_line, pickup=route_coords[1]))
+
+async def afetch_geocode(address):
+    return await geocode_flights.ado(normalize_address(address), _afetch_geocode, address)
+
+async def _afetch_geocode(address):
+    cached = geocode_cache.recall(address)
+    if cached is not None:
+        return cached
+    response = await get_async_client().geocode(address)
+    if response.status_code == 200:
+        data = response.json()
+        if data.get("features"):
+            coords = data["features"][0]["geometry"]["coordinates"]
+            geocode_cache.remember(address, coords)
+            return coords
+    raise Exception(f"Geocoding failed for address: {address}")
+
+async def ageocode_addresses(addresses, timeout=None):
+    """
+    Async counterpart of geocode_addresses: cache misses are fetched
+    concurrently on the event loop, and the other lookups are cancelled as
+    soon as one fails or the timeout expires.
+    """
+    timeout = settings.ORS_TIMEOUT if timeout is None else timeout
+    unique = list(dict.fromkeys(addresses))
+    cached = await sync_to_async(lambda: [lookup_geocode(address) for address in unique])()
+    resolved = dict(zip(unique, cached))
+
+    misses = [address for address, coords in resolved.items() if coords is None]
+    if misses:
+        tasks = [asyncio.ensure_future(afetch_geocode(address)) for address in misses]
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+        except asyncio.TimeoutError:
+            pending = ", ".join(address for address, task in zip(misses, tasks) if task.cancelled())
+            raise Exception(f"Geocoding timed out for address: {pending}")
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        resolved.update(zip(misses, results))
+        await sync_to_async(lambda: [store_geocode(address, resolved[address]) for address in misses])()
+
+    return [resolved[address] for address in addresses]
+
+async def aget_route_summary(route_coords, profile=DIRECTIONS_PROFILE, with_geometry=False):
+    # Offline routing is pure CPU work and fast enough to run on the loop.
+    offline = offline_route(route_coords, "route_summary", profile, with_geometry)
+    if offline is not None:
+        return offline
+    cached = await sync_to_async(route_cache.get)(route_coords, profile, with_geometry)
+    if cached is not None:
+        return cached
+    summary = await directions_flights.ado(
+        (route_cache.key(route_coords, profile), with_geometry), _afetch_route_summary,
+        route_coords, profile, with_geometry,
+    )
+    await sync_to_async(route_cache.set)(route_coords, profile, summary)
+    return summary
+
+async def _afetch_route_summary(route_coords, profile, with_geometry):
+    cached = route_cache.recall(route_coords, profile, with_geometry)
+    if cached is not None:
+        return cached
+    dir_resp = await get_async_client().directions(route_coords, profile=profile)
+    if dir_resp.status_code != 200:
+        raise Exception("Directions API error: " + dir_resp.text)
+    summary = parse_route_summary(dir_resp.json(), with_geometry)
+    route_cache.remember(route_coords, profile, summary)
+    return summary
+
+async def areal_simulate_trip(current_loc, pickup_loc, dropoff_loc, cycle_used):
+    """Non-blocking version of real_simulate_trip for async views."""
+    route_coords = await ageocode_addresses([current_loc, pickup_loc, dropoff_loc])
+    summary = await aget_route_summary(route_coords, with_geometry=True)
+    distance_miles = round(summary["distance"] / 1609.34, 2)
+    route_line = trip_route_line(route_coords, summary, distance_miles)
+    plan = plan_trip(distance_miles, cycle_used)
+    return (stored_route(route_line), distance_miles, plan.fuel_stop_dicts(route_line),
+            plan.daily_logs(route_line, pickup=route_coords[1]))
+
+class TripRequestError(Exception):
+    """A calculate-trip request that cannot be planned; detail is a message or serializer errors."""
+    def __init__(self, detail, status_code=status.HTTP_400_BAD_REQUEST, headers=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.headers = headers
+
+    @classmethod
+    def from_lookup_error(cls, error):
+        """An ORS lookup failure: 503 with Retry-After when the rate limit is saturated, 400 otherwise."""
+        if isinstance(error, ORSRateLimited):
+            return cls(str(error), status.HTTP_503_SERVICE_UNAVAILABLE,
+                       {"Retry-After": str(math.ceil(error.retry_after))})
+        return cls(str(error))
+
+    def response_data(self):
+        return self.detail if isinstance(self.detail, dict) else {"error": self.detail}
+
+
+class PreparedTrip:
+    """
+    Result of the first phase of a trip calculation: a validated, planned
+    trip that has not touched the database yet. driver is None when the
+    driver will be created from driver_name on commit.
+    """
+    def __init__(self, driver, driver_name, trip_data, trip_cycle_hours_used):
+        self.driver = driver
+        self.driver_name = driver_name
+        self.trip_data = trip_data
+        self.trip_cycle_hours_used = trip_cycle_hours_used
+
+    @property
+    def daily_logs(self):
+        return self.trip_data["logs"]
+
+
+def trip_request_fields(data):
+    """
+    Returns (current, pickup, dropoff, driver_id, driver_name) from a
+    calculate-trip request body. Raises TripRequestError unless the body is
+    a JSON object.
+    """
+    if not isinstance(data, dict):
+        raise TripRequestError("The request body must be a JSON object.")
+    return (
+        data.get('currentLocation'),
+        data.get('pickupLocation'),
+        data.get('dropoffLocation'),
+        str(data.get('driverId') or '').strip(),
+        str(data.get('driverName') or '').strip(),
+    )
+
+
+def _planned_trip(driver, driver_name, current_loc, pickup_loc, dropoff_loc, simulated):
+    route, distance, fuel_stops, daily_logs = simulated
+    # Calculate the on-duty hours consumed during this trip.
+    trip_cycle_hours_used = round(duty_hours(daily_logs), 2)
+    serializer = PlannedTripSerializer(data={
+        "current_location": current_loc,
+        "pickup_location": pickup_loc,
+        "dropoff_location": dropoff_loc,
+        "cycle_hours_used": trip_cycle_hours_used,
+        "route": route,
+        "logs": daily_logs,
+        "distance": distance,
+        "fuel_stops": fuel_stops,
+    })
+    if not serializer.is_valid():
+        raise TripRequestError(serializer.errors)
+    return PreparedTrip(driver, driver_name, serializer.validated_data, trip_cycle_hours_used)
+
+
+def _find_driver(driver_id, driver_name):
+    if driver_id:
+        driver = Driver.objects.filter(id=driver_id).first() if driver_id.isdigit() else None
+        if driver is None:
+            raise TripRequestError("Driver not found.", status.HTTP_404_NOT_FOUND)
+        return driver
+    if not driver_name:
+        raise TripRequestError("Driver name is required if no driver ID is provided.")
+    return None
+
+
+def prepare_trip(data):
+    """
+    Phase 1: looks up the driver, resolves the route through ORS and plans
+    the trip. Only reads from the database, so a failure here leaves
+    nothing behind. Raises TripRequestError.
+    """
+    current_loc, pickup_loc, dropoff_loc, driver_id, driver_name = trip_request_fields(data)
+    driver = _find_driver(driver_id, driver_name)
+    # Start from the hours used in the driver's rolling 8-day window.
+    cycle_used = cycle_hours_used(driver.id) if driver else 0.0
+    try:
+        simulated = real_simulate_trip(current_loc, pickup_loc, dropoff_loc, cycle_used)
+    except Exception as e:
+        raise TripRequestError.from_lookup_error(e)
+    return _planned_trip(driver, driver_name, current_loc, pickup_loc, dropoff_loc, simulated)
+
+
+async def aprepare_trip(data):
+    """prepare_trip for async views: ORS calls run on the event loop."""
+    current_loc, pickup_loc, dropoff_loc, driver_id, driver_name = trip_request_fields(data)
+    driver = await sync_to_async(_find_driver)(driver_id, driver_name)
+    cycle_used = await sync_to_async(cycle_hours_used)(driver.id) if driver else 0.0
+    try:
+        simulated = await areal_simulate_trip(current_loc, pickup_loc, dropoff_loc, cycle_used)
+    except Exception as e:
+        raise TripRequestError.from_lookup_error(e)
+    return _planned_trip(driver, driver_name, current_loc, pickup_loc, dropoff_loc, simulated)
+
+
+@transaction.atomic
+def commit_trip(prepared):
+    """
+    Phase 2: in one short transaction, creates the driver if needed, saves
+    the trip and adds its hours to the driver's counter and duty ledger.
+    The counter is incremented in the database with F(), so concurrent
+    trips for the same driver cannot lose updates. Returns the Trip.
+    """
+    driver = prepared.driver or Driver.objects.create(name=prepared.driver_name)
+    trip = Trip.objects.create(driver=driver, **prepared.trip_data)
+    Driver.objects.filter(pk=driver.pk).update(
+        current_cycle_hours_used=F("current_cycle_hours_used") + prepared.trip_cycle_hours_used
+    )
+    record_trip_duty(driver.id, trip.logs)
+    return trip
+
+
+def trip_response_data(trip, eld_format=None):
+    # eld_format "compact" returns the ELD grid as run-length segments.
+    response_data = dict(TripSerializer(trip).data)
+    response_data.update(eld_form_response(trip.eld, eld_format))
+    return response_data
 
-    return route_coords, distance_miles, fuel_stops, daily_logs
-
-def build_eld_log_form(daily_logs):
-    SLOTS_PER_DAY = 96
-    MINUTES_PER_SLOT = 15
-
-    def time_to_slot(t_str):
-        hh, mm = map(int, t_str.split(":"))
-        total_minutes = hh * 60 + mm
-        slot_index = total_minutes // MINUTES_PER_SLOT
-        return max(0, min(slot_index, SLOTS_PER_DAY - 1))
-
-    DEFAULT_STATUS = "Off Duty"
-
-    form_data = []
-    for day_log in daily_logs:
-        day_index = day_log["dayIndex"]
-        events = day_log["events"]
-        day_timeline = [DEFAULT_STATUS for _ in range(SLOTS_PER_DAY)]
-        for event in events:
-            status = event["status"]
-            start_slot = time_to_slot(event["start"])
-            end_slot = time_to_slot(event["end"])
-            if end_slot <= start_slot:
-                end_slot = start_slot + 1
-            for slot_idx in range(start_slot, min(end_slot, SLOTS_PER_DAY)):
-                day_timeline[slot_idx] = status
-        form_data.append({
-            "dayIndex": day_index,
-            "timeline": day_timeline
-        })
-    return form_data
 
 class CalculateTripView(APIView):
+    """
+    Plans and saves one trip. The route and HOS plan are computed before
+    anything is written; the driver (when only driverName is given), the
+    trip and the driver's hours are then saved in one short transaction.
+    """
     def post(self, request, format=None):
-        data = request.data
-        current_loc = data.get('currentLocation')
-        pickup_loc = data.get('pickupLocation')
-        dropoff_loc = data.get('dropoffLocation')
-        
-        # Retrieve driver using driverId (if provided) or create a new driver with driverName.
-        driver_id = data.get('driverId', '').strip()
-        driver_name = data.get('driverName', '').strip()
+        try:
+            prepared = prepare_trip(request.data)
+        except TripRequestError as e:
+            return Response(e.response_data(), status=e.status_code, headers=e.headers)
+        trip = commit_trip(prepared)
+        return Response(trip_response_data(trip, request.query_params.get("eld")), status=status.HTTP_201_CREATED)
 
-        if driver_id:
-            try:
-                driver = Driver.objects.get(id=driver_id)
-            except Driver.DoesNotExist:
-                return Response({"error": "Driver not found."}, status=status.HTTP_404_NOT_FOUND)
+
+def run_trip_job(job):
+    """JobRunner handler: both phases of a calculate-trip request, off the request thread."""
+    try:
+        # Nobody is waiting on the response: queue for the ORS quota rather than failing.
+        with rate_limit_max_wait(settings.ORS_RATE_LIMIT_BULK_MAX_WAIT):
+            prepared = prepare_trip(job.request)
+    except TripRequestError as e:
+        return e.status_code, e.response_data(), None
+    # A requeued job may run twice; only the first run saves a trip.
+    trip = commit_job_trip(job, lambda: commit_trip(prepared))
+    return status.HTTP_201_CREATED, trip_response_data(trip, job.eld_format), trip
+
+
+job_runner = JobRunner(
+    run_trip_job,
+    workers=settings.TRIP_JOB_WORKERS,
+    poll_interval=settings.TRIP_JOB_POLL_INTERVAL,
+    stale_timeout=settings.TRIP_JOB_STALE_TIMEOUT,
+)
+
+
+class TripJobView(APIView):
+    """
+    Submit-then-poll mode of CalculateTripView: takes the same body, queues
+    the calculation and answers 202 with the job right away. The result
+    (the CalculateTripView response body and status) is available from
+    TripJobDetailView or streamed by TripJobEventsView.
+    """
+    def post(self, request, format=None):
+        # Reject bodies that could never be planned before queuing them.
+        try:
+            trip_request_fields(request.data)
+        except TripRequestError as e:
+            return Response(e.response_data(), status=e.status_code, headers=e.headers)
+        job = job_runner.submit(request.data, request.query_params.get("eld", ""))
+        response = Response(TripJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        response["Location"] = f"{request.path.rstrip('/')}/{job.id}/"
+        return response
+
+
+class TripJobDetailView(APIView):
+    def get(self, request, job_id, format=None):
+        try:
+            job = TripJob.objects.get(pk=job_id)
+        except TripJob.DoesNotExist:
+            return Response({"error": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(TripJobSerializer(job).data)
+
+
+# How long an EventSource waits before reconnecting to a closed events stream.
+TRIP_JOB_EVENTS_RETRY_MS = 1000
+
+
+def _sse(event, data, event_id=None):
+    lines = f"event: {event}\n"
+    if event_id is not None:
+        lines += f"id: {event_id}\n"
+    return f"{lines}data: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def trip_job_events(job_id, poll_interval=0.5, timeout=None, last_event_id=None):
+    """
+    Server-sent events for a job: one event named after the job's status
+    each time it changes, ending after "succeeded"/"failed". A stream holds
+    a worker thread, so it closes with a "timeout" event after
+    TRIP_JOB_EVENTS_TIMEOUT seconds and the client reconnects; each event's
+    id is the status, so a reconnecting client (Last-Event-ID) only hears
+    about changes.
+    """
+    deadline = time.monotonic() + (settings.TRIP_JOB_EVENTS_TIMEOUT if timeout is None else timeout)
+    last_status = last_event_id
+    yield f"retry: {TRIP_JOB_EVENTS_RETRY_MS}\n\n"
+    while True:
+        job = TripJob.objects.get(pk=job_id)
+        if job.status != last_status:
+            last_status = job.status
+            yield _sse(job.status, TripJobSerializer(job).data, event_id=job.status)
         else:
-            if not driver_name:
-                return Response({"error": "Driver name is required if no driver ID is provided."}, status=status.HTTP_400_BAD_REQUEST)
-            driver = Driver.objects.create(name=driver_name)
-        
-        # Use the driver's current cycle hours as the starting point.
+            yield ": waiting\n\n"
+        if job.finished:
+            return
+        if time.monotonic() >= deadline:
+            yield _sse("timeout", {"id": job.id})
+            return
+        time.sleep(poll_interval)
+
+
+def trip_job_events_view(request, job_id):
+    if not TripJob.objects.filter(pk=job_id).exists():
+        raise Http404("Job not found.")
+    events = trip_job_events(job_id, last_event_id=request.headers.get("Last-Event-ID"))
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncCalculateTripView(View):
+    """
+    Async variant of CalculateTripView for ASGI deployments: ORS calls use
+    the non-blocking client and the database work runs through
+    sync_to_async, so a worker can hold many trip calculations while they
+    wait on the network. Accepts the same JSON body and returns the same
+    response.
+    """
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            cycle_used = float(driver.current_cycle_hours_used)
-        except (ValueError, TypeError):
-            cycle_used = 0.0
+            prepared = await aprepare_trip(data)
+        except TripRequestError as e:
+            return JsonResponse(e.response_data(), status=e.status_code, headers=e.headers)
+        trip = await sync_to_async(commit_trip)(prepared)
+        response_data = await sync_to_async(trip_response_data)(trip, request.GET.get("eld"))
+        return JsonResponse(response_data, status=status.HTTP_201_CREATED)
 
+
+class BatchTripRun:
+    """
+    Plans a list of trips in one pass for BatchCalculateTripView.
+
+    Addresses are geocoded once per distinct string and routes looked up
+    once per distinct lane, with cache misses fanned out on the shared ORS
+    pool. When the uncached lanes share enough stops, their distances come
+    from a few ORS matrix requests instead of one directions call each. Trips are planned as their lane's route arrives; trips for the
+    same driver are planned in input order so each one starts from the
+    cycle hours left by the previous one. Planned trips are saved with
+    bulk_create every BATCH_FLUSH_SIZE trips (or FLUSH_INTERVAL seconds)
+    and stream() yields one JSON line per trip as soon as it is saved.
+    """
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, trips, flush_size=None, eld_format=None):
+        self.trips = trips
+        self.eld_format = eld_format
+        self.flush_size = flush_size or settings.BATCH_FLUSH_SIZE
+        self.lanes = {}
+        self.lane_of_trip = {}
+        self.summaries = {}
+        self.driver_queues = {}
+        self.driver_cursor = {}
+        self.driver_cycle = {}
+        self.drivers = {}
+        self.pending = []
+
+    def stream(self):
+        lines = []
+        valid = []
+        for index, trip in enumerate(self.trips):
+            error = self._validate(trip)
+            if error:
+                lines.append(self._error_line(index, error, status.HTTP_400_BAD_REQUEST))
+            else:
+                valid.append(index)
+        yield from lines
+
+        if valid:
+            self._load_drivers(valid)
+            yield from self._resolve_lanes(valid)
+
+        uncached = {}
+        for key, coords in self.lanes.items():
+            cached = route_cache.get(coords, DIRECTIONS_PROFILE, with_geometry=True)
+            if cached is not None:
+                self.summaries[key] = cached
+            else:
+                uncached[key] = coords
+
+        futures = {}
+        with rate_limit_max_wait(settings.ORS_RATE_LIMIT_BULK_MAX_WAIT):
+            matrix_summaries = self._matrix_summaries(uncached)
+            if matrix_summaries is not None:
+                self.summaries.update(matrix_summaries)
+            else:
+                for key, coords in uncached.items():
+                    futures[ors_executor.submit(fetch_route_summary, coords, with_geometry=True)] = key
+
+        yield from self._plan_ready()
+        last_flush = time.monotonic()
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                summary = future.result()
+                route_cache.set(self.lanes[key], DIRECTIONS_PROFILE, summary)
+                self.summaries[key] = summary
+            except Exception as e:
+                self.summaries[key] = e
+            yield from self._plan_ready()
+            if len(self.pending) >= self.flush_size or time.monotonic() - last_flush > self.FLUSH_INTERVAL:
+                yield from self._flush()
+                last_flush = time.monotonic()
+        yield from self._flush()
+
+    def _matrix_summaries(self, lanes):
+        """
+        Distances for the uncached lanes from the ORS matrix API (see
+        MatrixDistanceService.lane_summaries), or None when that would take
+        at least as many requests as one directions call per lane. Matrix
+        cells carry no road geometry, so these trips' stops are placed
+        along the straight legs between their three stops.
+        """
+        if not settings.BATCH_USE_MATRIX or len(lanes) < 2:
+            return None
+        service = MatrixDistanceService()
+        origins = {tuple(point) for coords in lanes.values() for point in coords[:-1]}
+        destinations = {tuple(point) for coords in lanes.values() for point in coords[1:]}
+        if service.request_count(len(origins), len(destinations)) >= len(lanes):
+            return None
         try:
-            route, distance, fuel_stops, daily_logs = real_simulate_trip(
-                current_loc, pickup_loc, dropoff_loc, cycle_used
-            )
+            return service.lane_summaries(lanes)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-        eld_form_data = build_eld_log_form(daily_logs)
-        
-        # Calculate the on-duty hours consumed during this trip.
-        trip_cycle_hours_used = sum(
-            1.0 for day in daily_logs for event in day.get("events", [])
-            if event["status"] != "Off Duty"
-        )
-        # Update the driver's cumulative cycle hours.
-        driver.current_cycle_hours_used += trip_cycle_hours_used
-        driver.save()
-
-        trip_data = {
-            "driver": driver.id,
-            "current_location": current_loc,
-            "pickup_location": pickup_loc,
-            "dropoff_location": dropoff_loc,
+            return {key: e for key in lanes}
+
+    def _validate(self, trip):
+        if not isinstance(trip, dict):
+            return "Each trip must be an object."
+        for field in ("currentLocation", "pickupLocation", "dropoffLocation"):
+            value = trip.get(field)
+            if not isinstance(value, str) or not value.strip():
+                return f"{field} is required."
+        driver_id = str(trip.get("driverId") or "").strip()
+        if driver_id and not driver_id.isdigit():
+            return "Driver not found."
+        if not driver_id and not str(trip.get("driverName") or "").strip():
+            return "Driver name is required if no driver ID is provided."
+        return None
+
+    def _driver_key(self, trip):
+        driver_id = str(trip.get("driverId") or "").strip()
+        if driver_id:
+            return ("id", int(driver_id))
+        return ("name", trip["driverName"].strip())
+
+    def _load_drivers(self, valid):
+        ids = {self._driver_key(self.trips[i])[1] for i in valid if self._driver_key(self.trips[i])[0] == "id"}
+        for driver in Driver.objects.filter(id__in=ids):
+            self.drivers[("id", driver.id)] = driver
+        cycle_hours = cycle_hours_by_driver([driver.id for driver in self.drivers.values()])
+        for key, driver in self.drivers.items():
+            self.driver_cycle[key] = cycle_hours[driver.id]
+
+    def _resolve_lanes(self, valid):
+        addresses = []
+        for index in valid:
+            trip = self.trips[index]
+            addresses.extend([trip["currentLocation"], trip["pickupLocation"], trip["dropoffLocation"]])
+        unique = list(dict.fromkeys(addresses))
+        with rate_limit_max_wait(settings.ORS_RATE_LIMIT_BULK_MAX_WAIT):
+            coords_by_address = dict(zip(unique, geocode_addresses(unique, return_exceptions=True, bulk=True)))
+
+        for index in valid:
+            trip = self.trips[index]
+            key = self._driver_key(trip)
+            if key[0] == "id" and key not in self.drivers:
+                yield self._error_line(index, "Driver not found.", status.HTTP_404_NOT_FOUND)
+                continue
+            coords = [coords_by_address[trip[field]]
+                      for field in ("currentLocation", "pickupLocation", "dropoffLocation")]
+            failed = next((c for c in coords if isinstance(c, Exception)), None)
+            if failed is not None:
+                yield self._lookup_error_line(index, failed)
+                continue
+            lane = route_cache.key(coords, DIRECTIONS_PROFILE)
+            self.lanes.setdefault(lane, coords)
+            self.lane_of_trip[index] = lane
+            self.driver_queues.setdefault(key, []).append(index)
+            self.driver_cursor.setdefault(key, 0)
+            self.driver_cycle.setdefault(key, 0.0)
+
+    def _plan_ready(self):
+        for key, queue in self.driver_queues.items():
+            cursor = self.driver_cursor[key]
+            while cursor < len(queue) and self.lane_of_trip[queue[cursor]] in self.summaries:
+                index = queue[cursor]
+                cursor += 1
+                summary = self.summaries[self.lane_of_trip[index]]
+                if isinstance(summary, Exception):
+                    yield self._lookup_error_line(index, summary)
+                    continue
+                error = self._plan(index, key, summary)
+                if error:
+                    yield error
+            self.driver_cursor[key] = cursor
+
+    def _plan(self, index, key, summary):
+        trip = self.trips[index]
+        distance_miles = round(summary["distance"] / 1609.34, 2)
+        plan = plan_trip(distance_miles, self.driver_cycle[key])
+        route_coords = self.lanes[self.lane_of_trip[index]]
+        route_line = trip_route_line(route_coords, summary, distance_miles)
+        trip_cycle_hours_used = round(plan.on_duty_hours, 2)
+        serializer = PlannedTripSerializer(data={
+            "current_location": trip["currentLocation"],
+            "pickup_location": trip["pickupLocation"],
+            "dropoff_location": trip["dropoffLocation"],
             "cycle_hours_used": trip_cycle_hours_used,
-            "route": route,
-            "logs": daily_logs,
-            "distance": distance,
-            "fuel_stops": fuel_stops,
-            "eldFormData": eld_form_data,
-        }
-
-        serializer = TripSerializer(data=trip_data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            "route": stored_route(route_line),
+            "logs": plan.daily_logs(route_line, pickup=route_coords[1]),
+            "distance": distance_miles,
+            "fuel_stops": plan.fuel_stop_dicts(route_line),
+        })
+        if not serializer.is_valid():
+            return self._error_line(index, serializer.errors, status.HTTP_400_BAD_REQUEST)
+        self.driver_cycle[key] += trip_cycle_hours_used
+        self.pending.append((index, key, Trip(**serializer.validated_data)))
+        return None
+
+    def _flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        added_hours = {}
+        duty_minutes = {}
+        with transaction.atomic():
+            for _, key, trip in pending:
+                if key not in self.drivers:
+                    self.drivers[key] = Driver.objects.create(name=key[1])
+                trip.driver = self.drivers[key]
+                added_hours[key] = added_hours.get(key, 0) + trip.cycle_hours_used
+                for date, minutes in duty_minutes_by_date(trip.logs).items():
+                    ledger_key = (trip.driver.id, date)
+                    duty_minutes[ledger_key] = duty_minutes.get(ledger_key, 0) + minutes
+            Trip.objects.bulk_create([trip for _, _, trip in pending])
+            record_duty_minutes(duty_minutes)
+            for key, hours in added_hours.items():
+                Driver.objects.filter(pk=self.drivers[key].pk).update(
+                    current_cycle_hours_used=F("current_cycle_hours_used") + hours
+                )
+        for index, _, trip in pending:
+            data = trip_response_data(trip, self.eld_format)
+            yield json.dumps({"index": index, "status": status.HTTP_201_CREATED, "trip": data}) + "\n"
+
+    def _error_line(self, index, error, status_code):
+        return json.dumps({"index": index, "status": status_code, "error": error}) + "\n"
+
+    def _lookup_error_line(self, index, error):
+        error = TripRequestError.from_lookup_error(error)
+        return self._error_line(index, error.detail, error.status_code)
+
+
+class BatchCalculateTripView(APIView):
+    """
+    Plans many trips in one request. Expects {"trips": [...]} where each
+    trip has the same fields as a CalculateTripView request, and streams
+    back newline-delimited JSON, one line per trip in completion order:
+    {"index": i, "status": 201, "trip": {...}} or
+    {"index": i, "status": 400|404, "error": "..."}.
+    Like CalculateTripView, ?eld=compact selects the run-length ELD form.
+    """
+    def post(self, request, format=None):
+        if not isinstance(request.data, dict):
+            return Response({"error": "The request body must be a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
+        trips = request.data.get("trips")
+        if not isinstance(trips, list) or not trips:
+            return Response({"error": "trips must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(trips) > settings.BATCH_MAX_TRIPS:
+            return Response(
+                {"error": f"A batch may contain at most {settings.BATCH_MAX_TRIPS} trips."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        run = BatchTripRun(trips, eld_format=request.query_params.get("eld"))
+        return StreamingHttpResponse(run.stream(), content_type="application/x-ndjson")
@@ -2,6 +2,10 @@
 ASGI config for trucking project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server to get non-blocking trip calculations from
+/api/async/calculate-trip/, e.g.::
+
+    uvicorn trucking.asgi:application --workers 4
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -82,12 +83,63 @@ WSGI_APPLICATION = "trucking.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE selects the backend: "sqlite" (default) or "postgres".
+#
+# SQLite runs in WAL mode so readers do not block the writer, waits up to
+# SQLITE_BUSY_TIMEOUT seconds for a lock instead of failing with "database
+# is locked", and starts transactions with BEGIN IMMEDIATE so concurrent
+# writers queue on the busy timeout rather than deadlocking when a read
+# transaction tries to upgrade to a write.
+#
+# Postgres (requires psycopg) keeps connections open for DB_CONN_MAX_AGE
+# seconds, or, with DB_POOL=1 (requires psycopg_pool), uses Django's
+# connection pool sized by DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE.
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "trucking"),
+            "USER": os.environ.get("DB_USER", "trucking"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("DB_POOL") == "1":
+        # Pooled connections are returned to the pool after each request.
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 20)),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                "timeout": float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20)),
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')};"
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA cache_size=-20000;"
+                ),
+            },
+            # A file-backed test database (instead of in-memory) lets the
+            # concurrency tests write from several threads; SQLite then waits
+            # for locks instead of failing.
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
     }
-}
 
 
 # Password validation
@@ -130,3 +182,119 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Geocoding cache (in-process LRU in front of the GeocodeCacheEntry table).
+# TTL is in seconds and applies to both tiers.
+
+GEOCODE_CACHE = {
+    "MAX_ENTRIES": int(os.environ.get("GEOCODE_CACHE_MAX_ENTRIES", 1024)),
+    "DB_MAX_ENTRIES": int(os.environ.get("GEOCODE_CACHE_DB_MAX_ENTRIES", 50000)),
+    "TTL": int(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 3600)),
+}
+
+
+# Local gazetteer (trips.gazetteer): imported places plus every address
+# geocoded so far, indexed in memory. Exact matches are resolved without
+# calling ORS, and /api/geocode/autocomplete/ suggests names whose share of
+# matching trigrams is at least MIN_SIMILARITY. Each process rebuilds its
+# index every REFRESH_SECONDS to pick up imports and other workers' lookups.
+
+GAZETTEER = {
+    "ENABLED": os.environ.get("GAZETTEER_ENABLED", "1") == "1",
+    "REFRESH_SECONDS": int(os.environ.get("GAZETTEER_REFRESH_SECONDS", 300)),
+    "MIN_SIMILARITY": float(os.environ.get("GAZETTEER_MIN_SIMILARITY", 0.5)),
+    "MAX_RESULTS": int(os.environ.get("GAZETTEER_MAX_RESULTS", 10)),
+}
+
+
+# OpenRouteService client (trips.ors). Connect/read timeouts apply to each
+# HTTP attempt; 429/5xx responses are retried ORS_MAX_RETRIES times with
+# jittered exponential backoff. ORS_TIMEOUT bounds a whole batch of
+# concurrent lookups and ORS_MAX_WORKERS sizes both the shared thread pool
+# and the keep-alive connection pool.
+
+ORS_BASE_URL = os.environ.get("ORS_BASE_URL", "https://api.openrouteservice.org")
+ORS_CONNECT_TIMEOUT = float(os.environ.get("ORS_CONNECT_TIMEOUT", 3.05))
+ORS_READ_TIMEOUT = float(os.environ.get("ORS_READ_TIMEOUT", 10))
+ORS_MAX_RETRIES = int(os.environ.get("ORS_MAX_RETRIES", 2))
+ORS_BACKOFF_BASE = float(os.environ.get("ORS_BACKOFF_BASE", 0.25))
+ORS_BACKOFF_MAX = float(os.environ.get("ORS_BACKOFF_MAX", 4))
+ORS_TIMEOUT = float(os.environ.get("ORS_TIMEOUT", 30))
+ORS_MAX_WORKERS = int(os.environ.get("ORS_MAX_WORKERS", 8))
+
+# Outbound ORS rate limit (trips.ratelimit), shared by every process on the
+# host through a small SQLite file. Rates are requests per minute per
+# endpoint (0 disables; the defaults are the free plan's quotas). Up to
+# ORS_RATE_LIMIT_BURST requests go out back to back; beyond that callers
+# queue for their slot for at most ORS_RATE_LIMIT_MAX_WAIT seconds, and are
+# answered 503 when the queue is longer than that. Batch requests and
+# background jobs wait up to ORS_RATE_LIMIT_BULK_MAX_WAIT instead, so they
+# are paced at the quota rather than rejected.
+
+ORS_RATE_LIMIT_PATH = os.environ.get("ORS_RATE_LIMIT_PATH", BASE_DIR / "ors_ratelimit.sqlite3")
+ORS_RATE_LIMITS = {
+    "geocode": int(os.environ.get("ORS_RATE_LIMIT_GEOCODE", 100)),
+    "directions": int(os.environ.get("ORS_RATE_LIMIT_DIRECTIONS", 40)),
+    "matrix": int(os.environ.get("ORS_RATE_LIMIT_MATRIX", 40)),
+}
+ORS_RATE_LIMIT_BURST = int(os.environ.get("ORS_RATE_LIMIT_BURST", 5))
+ORS_RATE_LIMIT_MAX_WAIT = float(os.environ.get("ORS_RATE_LIMIT_MAX_WAIT", 5))
+ORS_RATE_LIMIT_BULK_MAX_WAIT = float(os.environ.get("ORS_RATE_LIMIT_BULK_MAX_WAIT", 120))
+
+# Directions cache (trips.routing). Coordinates are rounded to
+# PRECISION decimal places (4 ~ 11 m) before being used as a cache key.
+# `manage.py invalidate_route_cache` reaches the in-process tier of every
+# worker within GENERATION_CHECK_SECONDS.
+
+ROUTE_CACHE = {
+    "MAX_ENTRIES": int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", 1024)),
+    "DB_MAX_ENTRIES": int(os.environ.get("ROUTE_CACHE_DB_MAX_ENTRIES", 20000)),
+    "TTL": int(os.environ.get("ROUTE_CACHE_TTL", 7 * 24 * 3600)),
+    "PRECISION": int(os.environ.get("ROUTE_CACHE_PRECISION", 4)),
+    "GENERATION_CHECK_SECONDS": float(os.environ.get("ROUTE_CACHE_GENERATION_CHECK_SECONDS", 5)),
+}
+
+# Saved trip routes are simplified (Douglas-Peucker) to within this many
+# degrees of the road geometry (0.0002 ~ 20 m); 0 keeps every vertex. Stops
+# and log events are placed on the full geometry before simplifying.
+
+ROUTE_SIMPLIFY_TOLERANCE = float(os.environ.get("ROUTE_SIMPLIFY_TOLERANCE", 0.0002))
+
+# Routing provider: "ors" (default) or "offline", which routes on the local
+# road graph at ROAD_GRAPH_PATH (built with `manage.py build_road_graph`).
+# Offline routing snaps each stop to the nearest road within
+# ROAD_GRAPH_MAX_SNAP_METERS; stops it cannot route are sent to ORS when
+# ROUTING_FALLBACK_TO_ORS is set.
+
+ROUTING_PROVIDER = os.environ.get("ROUTING_PROVIDER", "ors")
+ROAD_GRAPH_PATH = os.environ.get("ROAD_GRAPH_PATH", BASE_DIR / "road_graph.bin")
+ROAD_GRAPH_MAX_SNAP_METERS = float(os.environ.get("ROAD_GRAPH_MAX_SNAP_METERS", 5000))
+ROUTING_FALLBACK_TO_ORS = os.environ.get("ROUTING_FALLBACK_TO_ORS", "1") == "1"
+
+# Batch trip planning: maximum trips per request and how many planned trips
+# are saved per bulk_create. With BATCH_USE_MATRIX, uncached lanes are sized
+# with the ORS matrix API when that takes fewer requests than one directions
+# call per lane; such trips are mapped along straight legs instead of the
+# road geometry.
+
+BATCH_MAX_TRIPS = int(os.environ.get("BATCH_MAX_TRIPS", 5000))
+BATCH_FLUSH_SIZE = int(os.environ.get("BATCH_FLUSH_SIZE", 100))
+BATCH_USE_MATRIX = os.environ.get("BATCH_USE_MATRIX", "1") == "1"
+
+# ORS matrix request limits; larger lookups are split into chunks that
+# respect both.
+
+ORS_MATRIX_MAX_LOCATIONS = int(os.environ.get("ORS_MATRIX_MAX_LOCATIONS", 50))
+ORS_MATRIX_MAX_ELEMENTS = int(os.environ.get("ORS_MATRIX_MAX_ELEMENTS", 2500))
+
+# Trip job queue (/api/trip-jobs/): worker threads per process (0 leaves
+# the jobs to `manage.py run_trip_jobs`), how often idle workers poll the
+# database for jobs from other processes, after how long a running job is
+# considered abandoned, and how long an events stream stays open before
+# the client has to reconnect (each open stream holds a worker thread).
+
+TRIP_JOB_WORKERS = int(os.environ.get("TRIP_JOB_WORKERS", 2))
+TRIP_JOB_POLL_INTERVAL = float(os.environ.get("TRIP_JOB_POLL_INTERVAL", 1.0))
+TRIP_JOB_STALE_TIMEOUT = int(os.environ.get("TRIP_JOB_STALE_TIMEOUT", 300))
+TRIP_JOB_EVENTS_TIMEOUT = int(os.environ.get("TRIP_JOB_EVENTS_TIMEOUT", 15))
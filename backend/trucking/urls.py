@@ -1,8 +1,28 @@
 from django.contrib import admin
 from django.urls import path
-from trips.views import CalculateTripView
+from trips.gazetteer import GeocodeAutocompleteView
+from trips.history import DriverListView, TripDetailView, TripEldView, TripHistoryView
+from trips.views import (
+    AsyncCalculateTripView,
+    BatchCalculateTripView,
+    CalculateTripView,
+    TripJobDetailView,
+    TripJobView,
+    trip_job_events_view,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/calculate-trip/', CalculateTripView.as_view(), name='calculate_trip'),
+    path('api/async/calculate-trip/', AsyncCalculateTripView.as_view(), name='calculate_trip_async'),
+    path('api/calculate-trips/batch/', BatchCalculateTripView.as_view(), name='calculate_trips_batch'),
+    path('api/trips/', TripHistoryView.as_view(), name='trip_history'),
+    path('api/trips/<int:trip_id>/', TripDetailView.as_view(), name='trip_detail'),
+    path('api/trips/<int:trip_id>/eld/', TripEldView.as_view(), name='trip_eld'),
+    path('api/geocode/autocomplete/', GeocodeAutocompleteView.as_view(), name='geocode_autocomplete'),
+    path('api/drivers/', DriverListView.as_view(), name='drivers'),
+    path('api/drivers/<int:driver_id>/trips/', TripHistoryView.as_view(), name='driver_trip_history'),
+    path('api/trip-jobs/', TripJobView.as_view(), name='trip_jobs'),
+    path('api/trip-jobs/<int:job_id>/', TripJobDetailView.as_view(), name='trip_job_detail'),
+    path('api/trip-jobs/<int:job_id>/events/', trip_job_events_view, name='trip_job_events'),
 ]
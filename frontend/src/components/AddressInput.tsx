@@ -0,0 +1,72 @@
+// src/components/AddressInput.tsx
+import React, { useEffect, useId, useState } from 'react';
+import axios from 'axios';
+import { API_ROOT } from '../config';
+
+interface AddressInputProps {
+  value: string;
+  onChange: (value: string) => void;
+  placeholder?: string;
+}
+
+interface Suggestion {
+  label: string;
+  coordinates: [number, number];
+  kind: string;
+}
+
+// Wait this long after the last keystroke before asking for suggestions.
+const DEBOUNCE_MS = 150;
+
+// Text input with suggestions from the backend gazetteer (/api/geocode/autocomplete/).
+const AddressInput: React.FC<AddressInputProps> = ({ value, onChange, placeholder }) => {
+  const listId = useId();
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
+
+  useEffect(() => {
+    if (value.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get<{ results: Suggestion[] }>(`${API_ROOT}/api/geocode/autocomplete/`, {
+          params: { q: value },
+          signal: controller.signal,
+        });
+        setSuggestions(response.data.results);
+      } catch (err: any) {
+        if (!axios.isCancel(err)) {
+          setSuggestions([]);
+        }
+      }
+    }, DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [value]);
+
+  return (
+    <>
+      <input
+        type="text"
+        value={value}
+        onChange={(e) => onChange(e.target.value)}
+        className="w-full p-2 border rounded"
+        placeholder={placeholder}
+        list={listId}
+        autoComplete="off"
+        required
+      />
+      <datalist id={listId}>
+        {suggestions.map((suggestion) => (
+          <option key={suggestion.label} value={suggestion.label} />
+        ))}
+      </datalist>
+    </>
+  );
+};
+
+export default AddressInput;
@@ -56,6 +56,17 @@ interface TripDetailsProps {
 }
 
 const TripDetails: React.FC<TripDetailsProps> = ({ tripData }) => {
+  // Stops, breaks and rests placed along the route by the backend.
+  const markers = tripData.logs.flatMap((dayLog) =>
+    dayLog.events
+      .filter((event) => event.coordinates)
+      .map((event) => ({
+        coordinate: event.coordinates as [number, number],
+        description: `Day ${dayLog.dayIndex}, ${event.start}-${event.end}: ${event.description}`,
+        status: event.status,
+      }))
+  );
+
   return (
     <div className="bg-white shadow rounded p-6">
       <h2 className="text-2xl font-semibold mb-4">Trip Details</h2>
@@ -81,7 +92,7 @@ const TripDetails: React.FC<TripDetailsProps> = ({ tripData }) => {
       </div>
       <div className="mb-6">
         <h3 className="text-xl font-semibold mb-2">Route Map</h3>
-        <MapDisplay route={tripData.route} />
+        <MapDisplay route={tripData.route} markers={markers} />
       </div>
       <div>
         <h3 className="text-xl font-semibold mb-2">Daily Logs</h3>
@@ -103,6 +103,7 @@ import React, { useState, FormEvent } from 'react';
 import axios from 'axios';
 import { TripData } from '../types';
 import { API_ROOT } from '../config';
+import AddressInput from './AddressInput';
 
 interface TripFormProps {
   setTripData: React.Dispatch<React.SetStateAction<TripData | null>>;
@@ -171,36 +172,15 @@ const TripForm: React.FC<TripFormProps> = ({ setTripData }) => {
         </div>
         <div>
           <label className="block text-gray-700">Current Location</label>
-          <input
-            type="text"
-            value={currentLocation}
-            onChange={(e) => setCurrentLocation(e.target.value)}
-            className="w-full p-2 border rounded"
-            placeholder="e.g. San Francisco, CA"
-            required
-          />
+          <AddressInput value={currentLocation} onChange={setCurrentLocation} placeholder="e.g. San Francisco, CA" />
         </div>
         <div>
           <label className="block text-gray-700">Pickup Location</label>
-          <input
-            type="text"
-            value={pickupLocation}
-            onChange={(e) => setPickupLocation(e.target.value)}
-            className="w-full p-2 border rounded"
-            placeholder="e.g. Sacramento, CA"
-            required
-          />
+          <AddressInput value={pickupLocation} onChange={setPickupLocation} placeholder="e.g. Sacramento, CA" />
         </div>
         <div>
           <label className="block text-gray-700">Dropoff Location</label>
-          <input
-            type="text"
-            value={dropoffLocation}
-            onChange={(e) => setDropoffLocation(e.target.value)}
-            className="w-full p-2 border rounded"
-            placeholder="e.g. Los Angeles, CA"
-            required
-          />
+          <AddressInput value={dropoffLocation} onChange={setDropoffLocation} placeholder="e.g. Los Angeles, CA" />
         </div>
         <div>
           <label className="block text-gray-700">Current Cycle Hours Used</label>
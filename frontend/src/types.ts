@@ -4,6 +4,8 @@ export interface Event {
   start: string;
   end: string;
   description: string;
+  // [lng, lat] where a non-driving event happens along the route.
+  coordinates?: [number, number];
 }
 
 export interface DayLog {
@@ -14,6 +16,7 @@ export interface DayLog {
 export interface FuelStop {
   mile: number;
   location: string;
+  coordinates?: [number, number];
 }
 
 export interface EldFormData {